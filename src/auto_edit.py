@@ -1,72 +1,339 @@
 import asyncio
+import os
 import tempfile
 from pathlib import Path
+from typing import Any, Dict, List, Optional
 
-from .lrc_client import LightroomMCPClient
+from .lrc_client import APPLY_FAILED, LightroomMCPClient
+from .providers.base import ProviderBase
 from .providers.gemini_api_provider import GeminiAPIProvider
+from .providers.cached_provider import with_cache
+from .providers.prompts import MAX_BATCH_SIZE
+from .core.bursts import DEFAULT_BURST_GAP, cluster_images, representative
+from .core.inputs import InputFile
+from .core.preprocess import DEFAULT_IMAGE_SPEC, ImageSpec, make_image_spec
+from .core.pipeline import MicroBatcher, Pipeline, PipelineResult, PipelineStage
+from .core.ratelimit import limiter_stats
+from .core.scoring import CullThresholds, score_frame, score_frames, shutdown_pool
 import typer
 import logging
 
 app = typer.Typer(help="Lightroom MCP Auto-Editor Workflow")
 logger = logging.getLogger(__name__)
 
-async def auto_edit_workflow(provider_name: str = "gemini"):
+def _build_provider(
+    provider_name: str, cache_dir: Optional[Path] = None, image_spec: Optional[ImageSpec] = DEFAULT_IMAGE_SPEC
+) -> ProviderBase:
+    if provider_name.lower() == "openai":
+        from .providers.openai_provider import OpenAIProvider
+        provider = OpenAIProvider(image_spec=image_spec)
+    elif provider_name.lower() == "histogram":
+        from .providers.histogram_provider import HistogramProvider
+        provider = HistogramProvider()
+    elif provider_name.lower() == "tiered":
+        from .providers.routing_provider import TieredProvider
+        provider = TieredProvider([
+            GeminiAPIProvider(model="gemini-2.5-flash-lite", image_spec=image_spec),
+            GeminiAPIProvider(model="gemini-2.5-pro", image_spec=image_spec),
+        ])
+    elif provider_name.lower() == "hedged":
+        from .providers.hedged_provider import HedgedProvider
+        from .providers.openai_provider import OpenAIProvider
+        provider = HedgedProvider([GeminiAPIProvider(image_spec=image_spec), OpenAIProvider(image_spec=image_spec)])
+    else:
+        provider = GeminiAPIProvider(image_spec=image_spec)
+    return with_cache(provider, cache_dir)
+
+async def auto_edit_workflow(
+    provider_name: str = "gemini",
+    cache_dir: Optional[Path] = None,
+    cull: Optional[CullThresholds] = None,
+    image_spec: Optional[ImageSpec] = DEFAULT_IMAGE_SPEC,
+):
     """
     End-to-end workflow:
     1. Connect to Lightroom via MCP Broker
     2. Get currently selected photo preview
-    3. Run it through the chosen AI Provider
-    4. Automatically apply settings in Lightroom
+    3. Optionally score it locally and stop if it is a reject (`cull`)
+    4. Run it through the chosen AI Provider
+    5. Automatically apply settings in Lightroom
     """
-    lrc = LightroomMCPClient()
-    
-    typer.echo("Fetching selected photos from Lightroom...")
-    photos = await lrc.get_selected_photos()
-    if not photos:
-        typer.echo("No photos selected in Lightroom.")
-        return
-
-    photo = photos[0]
-    typer.echo(f"Processing photo: {photo.get('filename')}")
-    
-    typer.echo("Fetching photo preview...")
-    preview_bytes = await lrc.get_photo_preview(photo.get("localId"))
-    
-    if not preview_bytes:
-        typer.echo("Failed to get photo preview from Lightroom.")
-        return
-
-    # Initialize the provider
-    if provider_name.lower() == "openai":
-        from .providers.openai_provider import OpenAIProvider
-        provider = OpenAIProvider()
-    else:
-        provider = GeminiAPIProvider()
-
-    with tempfile.TemporaryDirectory() as tmpdir:
-        tmp_path = Path(tmpdir) / "preview.jpg"
-        tmp_path.write_bytes(preview_bytes)
-        
-        typer.echo(f"Invoking {provider.__class__.__name__} to calculate settings...")
-        
-        # We can also fetch existing settings from LRC to pass as context via get_all_metadata,
-        # but for now we'll do cold generation.
-        settings = await provider.process(tmp_path)
-        
-    typer.echo("Suggested Settings:")
-    typer.echo(settings.model_dump_json(indent=2))
-    
-    typer.echo("Applying settings back to Lightroom...")
-    result = await lrc.apply_develop_settings(settings)
-    typer.echo(f"Lightroom response: {result}")
-    
-    typer.echo("Auto-edit complete!")
+    async with LightroomMCPClient() as lrc:
+        typer.echo("Fetching selected photos from Lightroom...")
+        photos = await lrc.get_selected_photos()
+        if not photos:
+            typer.echo("No photos selected in Lightroom.")
+            return
+
+        photo = photos[0]
+        typer.echo(f"Processing photo: {photo.get('filename')}")
+
+        typer.echo("Fetching photo preview...")
+        preview_bytes = await lrc.get_photo_preview(photo.get("localId"))
+
+        if not preview_bytes:
+            typer.echo("Failed to get photo preview from Lightroom.")
+            return
+
+        if cull is not None:
+            score = await score_frame(InputFile(data=preview_bytes, name="preview.jpg"), cull, use_pool=False)
+            typer.echo(f"Local score: {score.to_dict()}")
+            if score.rejected:
+                typer.echo(f"Rejected ({', '.join(score.reasons)}); not sending it to the provider.")
+                return
+
+        # Initialize the provider
+        provider = _build_provider(provider_name, cache_dir, image_spec)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp_path = Path(tmpdir) / "preview.jpg"
+            tmp_path.write_bytes(preview_bytes)
+
+            typer.echo(f"Invoking {provider.__class__.__name__} to calculate settings...")
+
+            # We can also fetch existing settings from LRC to pass as context via get_all_metadata,
+            # but for now we'll do cold generation.
+            settings = await provider.process(tmp_path)
+
+        typer.echo("Suggested Settings:")
+        typer.echo(settings.model_dump_json(indent=2))
+
+        typer.echo("Applying settings back to Lightroom...")
+        result = await lrc.apply_develop_settings(settings)
+        typer.echo(f"Lightroom response: {result}")
+
+        typer.echo("Auto-edit complete!")
+
+async def batch_auto_edit_workflow(
+    provider_name: str = "gemini",
+    preview_concurrency: int = 4,
+    inference_concurrency: int = 4,
+    apply_concurrency: int = 2,
+    cache_dir: Optional[Path] = None,
+    burst_threshold: Optional[int] = None,
+    burst_gap: float = DEFAULT_BURST_GAP,
+    cull: Optional[CullThresholds] = None,
+    apply_batch_size: int = 50,
+    apply_batch_delay: float = 0.2,
+    image_spec: Optional[ImageSpec] = DEFAULT_IMAGE_SPEC,
+    batch_size: int = MAX_BATCH_SIZE,
+    batch_delay: float = 0.2,
+):
+    """
+    Batch variant of `auto_edit_workflow` that processes the whole selection.
+
+    Preview fetch, provider inference and settings apply run as overlapping stages,
+    each with its own in-flight limit. Failures are reported per photo and do not
+    stop the batch; a throughput summary is printed at the end.
+
+    With `burst_threshold`, all previews are fetched first and near-identical
+    frames are grouped into bursts (see `src/core/bursts.py`); only one frame per
+    burst goes through inference and its settings are applied to the whole burst.
+
+    With `cull`, previews are scored locally (in a process pool) and rejects skip
+    inference and apply; they are reported with the reasons.
+
+    Previews leaving the preview stage are collected for up to `batch_delay`
+    seconds (or `batch_size` photos, 1-4) and analyzed in one provider request,
+    with at most `inference_concurrency` requests in flight. If a batch fails,
+    its photos are retried one by one so a bad preview fails on its own.
+
+    Settings are applied in JSON-RPC batches: results leaving inference are
+    collected for up to `apply_batch_delay` seconds (or `apply_batch_size`
+    photos) and sent with one `apply_develop_settings_bulk` call, with at most
+    `apply_concurrency` of those calls in flight.
+    """
+    async with LightroomMCPClient() as lrc:
+        typer.echo("Fetching selected photos from Lightroom...")
+        photos = await lrc.get_selected_photos()
+        if not photos:
+            typer.echo("No photos selected in Lightroom.")
+            return []
+
+        provider = _build_provider(provider_name, cache_dir, image_spec)
+        typer.echo(f"Processing {len(photos)} photo(s) with {provider.__class__.__name__}...")
+
+        # Current develop values let the apply stage send only changed keys and skip
+        # photos that are already up to date
+        current = await lrc.get_develop_settings_bulk([photo.get("localId") for photo in photos])
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp_dir = Path(tmpdir)
+            prefetched: Dict[Any, Path] = {}
+            members: Dict[Any, List[Dict[str, Any]]] = {}
+            scores: Dict[Any, Any] = {}
+            items = photos
+
+            if burst_threshold is not None:
+                typer.echo("Fetching previews for burst detection...")
+                photo_ids = [photo.get("localId") for photo in photos]
+                async for photo_id, preview_bytes in lrc.iter_photo_previews(photo_ids, concurrency=preview_concurrency):
+                    if preview_bytes:
+                        prefetched[photo_id] = tmp_dir / f"preview_{photo_id}.jpg"
+                        prefetched[photo_id].write_bytes(preview_bytes)
+
+                fetched = [photo for photo in photos if photo.get("localId") in prefetched]
+                if cull is not None:
+                    frame_scores = await score_frames([prefetched[photo.get("localId")] for photo in fetched], cull)
+                    scores = {photo.get("localId"): score for photo, score in zip(fetched, frame_scores)}
+                    # Rejects stay out of the bursts so they can't become a burst's representative
+                    fetched = [photo for photo in fetched if not scores[photo.get("localId")].rejected]
+                clusters = await asyncio.to_thread(
+                    cluster_images, [prefetched[photo.get("localId")] for photo in fetched], burst_threshold, burst_gap
+                )
+                for cluster in clusters:
+                    lead = fetched[representative(cluster)]
+                    members[lead.get("localId")] = [fetched[i] for i in cluster]
+                # One pipeline item per burst; rejects and photos without a preview go through on their own
+                items = [
+                    photo for photo in photos
+                    if photo.get("localId") in members
+                    or photo.get("localId") not in prefetched
+                    or photo.get("localId") in scores and scores[photo.get("localId")].rejected
+                ]
+                typer.echo(f"Grouped {len(fetched)} preview(s) into {len(clusters)} burst(s)")
+
+            async def fetch_preview(photo: Dict[str, Any]) -> Dict[str, Any]:
+                photo_id = photo.get("localId")
+                if photo_id in prefetched:
+                    return {"photo": photo, "preview_path": prefetched[photo_id]}
+                preview_bytes = await lrc.get_photo_preview(photo_id)
+                if not preview_bytes:
+                    raise RuntimeError("Failed to get photo preview from Lightroom.")
+                preview_path = tmp_dir / f"preview_{photo_id}.jpg"
+                preview_path.write_bytes(preview_bytes)
+                return {"photo": photo, "preview_path": preview_path}
+
+            async def score(job: Dict[str, Any]) -> Dict[str, Any]:
+                photo_id = job["photo"].get("localId")
+                job["score"] = scores.get(photo_id) or await score_frame(job["preview_path"], cull)
+                return job
+
+            async def infer_batch(jobs: List[Dict[str, Any]]) -> List[Any]:
+                preview_paths = [job["preview_path"] for job in jobs]
+                try:
+                    try:
+                        return await provider.process_batch(preview_paths, batch_size=len(jobs), concurrency=1)
+                    except Exception as e:
+                        if len(jobs) == 1:
+                            raise
+                        logger.warning(f"Inference for {len(jobs)} previews failed, retrying one by one: {e}")
+                        return await asyncio.gather(*(provider.process(path) for path in preview_paths), return_exceptions=True)
+                finally:
+                    for path in preview_paths:
+                        path.unlink(missing_ok=True)
+
+            inferrer = MicroBatcher(infer_batch, batch_size, batch_delay, inference_concurrency)
+
+            async def infer(job: Dict[str, Any]) -> Dict[str, Any]:
+                if job.get("score") and job["score"].rejected:
+                    return job
+                settings = await inferrer.submit(job)
+                if isinstance(settings, BaseException):
+                    raise settings
+                job["settings"] = settings
+                return job
+
+            async def apply_batch(jobs: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+                bursts = [members.get(job["photo"].get("localId"), [job["photo"]]) for job in jobs]
+                outcome = await lrc.apply_develop_settings_bulk(
+                    [(member.get("localId"), job["settings"]) for job, burst in zip(jobs, bursts) for member in burst],
+                    current=current,
+                )
+                return [{member.get("localId"): outcome[member.get("localId")] for member in burst} for burst in bursts]
+
+            applier = MicroBatcher(apply_batch, apply_batch_size, apply_batch_delay, apply_concurrency)
+
+            async def apply(job: Dict[str, Any]) -> Dict[str, Any]:
+                photo_id = job["photo"].get("localId")
+                if job.get("score") and job["score"].rejected:
+                    job["lrc_result"] = "rejected"
+                    return job
+                outcome = await applier.submit(job)
+                job["lrc_result"] = outcome[photo_id]
+                job["burst_results"] = outcome
+                if outcome[photo_id].startswith(APPLY_FAILED):
+                    raise RuntimeError(f"Lightroom did not apply the settings: {outcome[photo_id][len(APPLY_FAILED):]}")
+                return job
+
+            def report(result: PipelineResult, done: int, total: int):
+                name = result.item.get("filename") or result.item.get("localId")
+                burst_size = len(members.get(result.item.get("localId"), [result.item]))
+                if burst_size > 1:
+                    name = f"{name} (+{burst_size - 1} burst frame(s))"
+                if result.ok and result.value["lrc_result"] == "rejected":
+                    typer.echo(f"[{done}/{total}] {name}: rejected ({', '.join(result.value['score'].reasons)})")
+                elif result.ok:
+                    status = "unchanged" if result.value["lrc_result"] == "unchanged" else "applied"
+                    failed = [
+                        photo_id for photo_id, outcome in result.value["burst_results"].items()
+                        if outcome.startswith(APPLY_FAILED)
+                    ]
+                    if failed:
+                        typer.echo(f"[{done}/{total}] {name}: {status}, FAILED for burst frame(s) {', '.join(failed)}", err=True)
+                    else:
+                        typer.echo(f"[{done}/{total}] {name}: {status}")
+                else:
+                    typer.echo(f"[{done}/{total}] {name}: FAILED in {result.failed_stage}: {result.error}", err=True)
+
+            stages = [PipelineStage("preview", fetch_preview, preview_concurrency)]
+            if cull is not None:
+                stages.append(PipelineStage("score", score, os.cpu_count() or 1))
+            stages += [
+                # Enough inference workers to fill whole provider batches
+                PipelineStage("inference", infer, batch_size * inference_concurrency),
+                # Enough apply workers to fill whole batches; the batcher bounds the calls
+                PipelineStage("apply", apply, apply_batch_size * apply_concurrency),
+            ]
+            pipeline = Pipeline(stages, on_result=report)
+            try:
+                results = await pipeline.run(items)
+            finally:
+                shutdown_pool()
+
+        for line in pipeline.stats.summary_lines():
+            typer.echo(line)
+        typer.echo(f"  inference: {inferrer.batches} provider request(s)")
+        typer.echo(f"  apply: {applier.batches} batch call(s) to Lightroom")
+        for name, stats in limiter_stats().items():
+            typer.echo(f"  {name}: limit={stats['limit']} throttled={stats['throttled']} ok={stats['succeeded']}")
+
+        return results
 
 @app.command()
-def auto_edit(provider: str = typer.Option("gemini", help="Provider to use (gemini or openai)")):
+def auto_edit(
+    provider: str = typer.Option("gemini", help="Provider to use (gemini, openai, histogram for local auto-tone, tiered for flash-lite escalating to pro, or hedged for Gemini hedged with OpenAI)"),
+    all_photos: bool = typer.Option(False, "--all", help="Process the whole selection instead of the first photo."),
+    preview_concurrency: int = typer.Option(4, help="Max previews fetched concurrently (with --all)."),
+    inference_concurrency: int = typer.Option(4, help="Max provider calls in flight (with --all)."),
+    batch_size: int = typer.Option(MAX_BATCH_SIZE, "--batch-size", min=1, max=MAX_BATCH_SIZE, help=f"Previews sent per provider request (1-{MAX_BATCH_SIZE}; 1 sends each preview on its own; with --all)."),
+    apply_concurrency: int = typer.Option(2, help="Max concurrent apply calls to Lightroom (with --all)."),
+    apply_batch_size: int = typer.Option(50, help="Max photos per batched apply call (with --all)."),
+    apply_batch_delay: float = typer.Option(0.2, help="Seconds to collect results for one apply call (with --all)."),
+    cache_dir: Optional[Path] = typer.Option(None, "--cache-dir", envvar="LIGHTROOM_CACHE_DIR", help="Directory for the provider result cache (disabled if unset)."),
+    burst_threshold: Optional[int] = typer.Option(None, "--burst-threshold", help="Group near-identical frames (max differing hash bits, e.g. 10) and analyze each burst once (with --all)."),
+    burst_gap: float = typer.Option(DEFAULT_BURST_GAP, "--burst-gap", help="Max seconds between frames of one burst (with --burst-threshold)."),
+    cull: bool = typer.Option(False, "--cull", help="Score previews locally first and skip rejects."),
+    min_focus: float = typer.Option(CullThresholds.min_focus, help="Reject frames with a lower focus score (with --cull)."),
+    max_motion_blur: float = typer.Option(CullThresholds.max_motion_blur, help="Reject frames with more motion blur, 0-1 (with --cull)."),
+    max_clipped_highlights: float = typer.Option(CullThresholds.max_clipped_highlights, help="Reject frames with a larger share of blown highlights (with --cull)."),
+    max_clipped_shadows: float = typer.Option(CullThresholds.max_clipped_shadows, help="Reject frames with a larger share of crushed shadows (with --cull)."),
+    max_edge: int = typer.Option(ImageSpec.max_edge, "--max-edge", help="Long edge (px) previews are downscaled to before upload; 0 uploads them as-is."),
+    jpeg_quality: int = typer.Option(ImageSpec.quality, "--jpeg-quality", help="JPEG quality of downscaled uploads."),
+):
     """Run the auto-editor on the active Lightroom selection."""
     logging.basicConfig(level=logging.INFO)
-    asyncio.run(auto_edit_workflow(provider))
+    thresholds = None
+    if cull:
+        thresholds = CullThresholds(min_focus, max_motion_blur, max_clipped_highlights, max_clipped_shadows)
+    image_spec = make_image_spec(max_edge, jpeg_quality)
+    if all_photos:
+        asyncio.run(batch_auto_edit_workflow(
+            provider, preview_concurrency, inference_concurrency, apply_concurrency, cache_dir,
+            burst_threshold, burst_gap, thresholds, apply_batch_size, apply_batch_delay, image_spec, batch_size,
+        ))
+    else:
+        asyncio.run(auto_edit_workflow(provider, cache_dir, thresholds, image_spec))
 
 if __name__ == "__main__":
     app()
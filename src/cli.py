@@ -1,10 +1,21 @@
 import asyncio
 import json
+import re
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 import typer
 
 from .providers.gemini_cli import GeminiCLIProvider
+from .providers.cached_provider import with_cache
+from .providers.prompts import MAX_BATCH_SIZE
+from .core.bursts import DEFAULT_BURST_GAP, plan_batch, process_clusters
+from .core.file_index import FileIndex, ScannedFile, scan_images
+from .core.inputs import InputFile
+from .core.pipeline import Pipeline, PipelineResult, PipelineStage
+from .core.sidecar_catalog import OPERATORS, SidecarCatalog, row_to_dict
+from .core.preprocess import ImageSpec, make_image_spec
+from .core.scoring import CullThresholds, shutdown_pool
+from .core.xmp_writer import rewrite_sidecar
 from .xmp_utils import generate_xmp
 
 app = typer.Typer(help="Lightroom AI Settings CLI Service")
@@ -14,7 +25,10 @@ def process(
     image_path: Path = typer.Argument(..., help="Path to the image you want to analyze."),
     xmp_path: Optional[Path] = typer.Option(None, "--xmp", "-x", help="Path to an existing XMP sidecar."),
     output_xmp: Optional[Path] = typer.Option(None, "--output-xmp", "-o", help="A file path to output the generated XMP."),
-    gemini_bin: str = typer.Option("gemini", help="Path to the gemini CLI executable.")
+    gemini_bin: str = typer.Option("gemini", help="Path to the gemini CLI executable."),
+    max_edge: int = typer.Option(ImageSpec.max_edge, "--max-edge", help="Long edge (px) images are downscaled to before upload; 0 uploads them as-is."),
+    jpeg_quality: int = typer.Option(ImageSpec.quality, "--jpeg-quality", help="JPEG quality of downscaled uploads."),
+    cache_dir: Optional[Path] = typer.Option(None, "--cache-dir", envvar="LIGHTROOM_CACHE_DIR", help="Directory for the provider result cache (disabled if unset).")
 ):
     """
     Process an image and generate suggested Lightroom settings via the configured AI model.
@@ -23,7 +37,7 @@ def process(
         typer.echo(f"Error: Image {image_path} does not exist.", err=True)
         raise typer.Exit(code=1)
 
-    provider = GeminiCLIProvider(cli_path=gemini_bin)
+    provider = with_cache(GeminiCLIProvider(cli_path=gemini_bin, image_spec=make_image_spec(max_edge, jpeg_quality)), cache_dir)
     
     # Run async function in a sync wrapper
     settings = asyncio.run(provider.process(image_path, xmp_path))
@@ -42,5 +56,196 @@ def process(
         # Just output the JSON to stdout
         typer.echo(settings.model_dump_json(indent=2))
 
+@app.command("process-batch")
+def process_batch(
+    image_paths: List[Path] = typer.Argument(..., help="Images to analyze, ideally in shooting order."),
+    output_dir: Optional[Path] = typer.Option(None, "--output-dir", "-o", help="Directory to write one XMP per image into."),
+    burst_threshold: Optional[int] = typer.Option(None, "--burst-threshold", help="Group near-identical frames (max differing hash bits, e.g. 10) and analyze each burst once."),
+    burst_gap: float = typer.Option(DEFAULT_BURST_GAP, "--burst-gap", help="Max seconds between frames of one burst (when capture times are known)."),
+    cull: bool = typer.Option(False, "--cull", help="Score frames locally first and skip rejects."),
+    min_focus: float = typer.Option(CullThresholds.min_focus, help="Reject frames with a lower focus score (with --cull)."),
+    max_motion_blur: float = typer.Option(CullThresholds.max_motion_blur, help="Reject frames with more motion blur, 0-1 (with --cull)."),
+    max_clipped_highlights: float = typer.Option(CullThresholds.max_clipped_highlights, help="Reject frames with a larger share of blown highlights (with --cull)."),
+    max_clipped_shadows: float = typer.Option(CullThresholds.max_clipped_shadows, help="Reject frames with a larger share of crushed shadows (with --cull)."),
+    concurrency: int = typer.Option(4, help="Max provider calls in flight."),
+    batch_size: int = typer.Option(MAX_BATCH_SIZE, "--batch-size", min=1, max=MAX_BATCH_SIZE, help=f"Images sent per provider request (1-{MAX_BATCH_SIZE}; 1 sends each image on its own)."),
+    gemini_bin: str = typer.Option("gemini", help="Path to the gemini CLI executable."),
+    max_edge: int = typer.Option(ImageSpec.max_edge, "--max-edge", help="Long edge (px) images are downscaled to before upload; 0 uploads them as-is."),
+    jpeg_quality: int = typer.Option(ImageSpec.quality, "--jpeg-quality", help="JPEG quality of downscaled uploads."),
+    cache_dir: Optional[Path] = typer.Option(None, "--cache-dir", envvar="LIGHTROOM_CACHE_DIR", help="Directory for the provider result cache (disabled if unset).")
+):
+    """
+    Process several images. Sidecars next to the images (same name, .xmp) are used as context.
+    Images are sent --batch-size at a time in one provider request each.
+    With --cull, rejected frames get no settings; their scores are still reported.
+    """
+    missing = [p for p in image_paths if not p.exists()]
+    if missing:
+        typer.echo(f"Error: Image {missing[0]} does not exist.", err=True)
+        raise typer.Exit(code=1)
+
+    provider = with_cache(GeminiCLIProvider(cli_path=gemini_bin, image_spec=make_image_spec(max_edge, jpeg_quality)), cache_dir)
+    xmp_paths = [p.with_suffix(".xmp") if p.with_suffix(".xmp").exists() else None for p in image_paths]
+
+    thresholds = None
+    if cull:
+        thresholds = CullThresholds(min_focus, max_motion_blur, max_clipped_highlights, max_clipped_shadows)
+
+    async def run():
+        try:
+            scores, clusters = await plan_batch(image_paths, thresholds, burst_threshold, burst_gap)
+            return scores, await process_clusters(provider, image_paths, xmp_paths, clusters, concurrency, batch_size)
+        finally:
+            shutdown_pool()
+
+    scores, results = asyncio.run(run())
+
+    for image_path, xmp_path, score, settings in zip(image_paths, xmp_paths, scores, results):
+        if settings is None and output_dir:
+            typer.echo(f"Rejected {image_path}: {', '.join(score.reasons)}")
+        elif settings is None:
+            typer.echo(json.dumps({"image": str(image_path), "rejected": True, "score": score.to_dict()}))
+        elif output_dir:
+            output_dir.mkdir(parents=True, exist_ok=True)
+            original_xmp_content = xmp_path.read_text(encoding="utf-8") if xmp_path else None
+            out_path = output_dir / f"{image_path.stem}.xmp"
+            out_path.write_text(generate_xmp(settings, original_xmp_content), encoding="utf-8")
+            typer.echo(f"Saved generated XMP to {out_path}")
+        else:
+            entry = {"image": str(image_path), "settings": settings.model_dump()}
+            if score is not None:
+                entry["score"] = score.to_dict()
+            typer.echo(json.dumps(entry))
+
+@app.command("process-dir")
+def process_dir(
+    root: Path = typer.Argument(..., help="Folder to scan recursively for images."),
+    output_dir: Optional[Path] = typer.Option(None, "--output-dir", "-o", help="Write XMPs into this folder (mirroring the tree) instead of next to the images."),
+    index_path: Optional[Path] = typer.Option(None, "--index", help="Resume index (default: <root>/.lightroom-index.sqlite)."),
+    force: bool = typer.Option(False, "--force", help="Process every image, even those the index marks as done."),
+    concurrency: int = typer.Option(4, help="Max provider calls in flight."),
+    gemini_bin: str = typer.Option("gemini", help="Path to the gemini CLI executable."),
+    max_edge: int = typer.Option(ImageSpec.max_edge, "--max-edge", help="Long edge (px) images are downscaled to before upload; 0 uploads them as-is."),
+    jpeg_quality: int = typer.Option(ImageSpec.quality, "--jpeg-quality", help="JPEG quality of downscaled uploads."),
+    cache_dir: Optional[Path] = typer.Option(None, "--cache-dir", envvar="LIGHTROOM_CACHE_DIR", help="Directory for the provider result cache (disabled if unset).")
+):
+    """
+    Process every image under a folder and write an XMP per image. Existing sidecars
+    are used as context and updated in place (or copied to --output-dir).
+
+    Results are recorded in an index as they finish, so re-running the command
+    skips unchanged images that are done and resumes an interrupted run.
+    """
+    if not root.is_dir():
+        typer.echo(f"Error: {root} is not a directory.", err=True)
+        raise typer.Exit(code=1)
+
+    # Index keys are absolute paths, however the folder is named on the command line
+    root = root.resolve()
+    provider = with_cache(GeminiCLIProvider(cli_path=gemini_bin, image_spec=make_image_spec(max_edge, jpeg_quality)), cache_dir)
+    index = FileIndex(index_path or root / ".lightroom-index.sqlite")
+
+    files = list(scan_images(root))
+    pending = files if force else [f for f in files if not index.is_done(f)]
+    typer.echo(f"Found {len(files)} image(s), {len(pending)} to process")
+
+    def output_path(file: ScannedFile) -> Path:
+        if output_dir:
+            return output_dir / file.path.relative_to(root).with_suffix(".xmp")
+        return file.xmp_path or file.path.with_suffix(".xmp")
+
+    async def digest(file: ScannedFile):
+        return file, await asyncio.to_thread(InputFile(path=file.path).sha256)
+
+    async def infer(item):
+        file, sha256 = item
+        return file, sha256, await provider.process(file.path, file.xmp_path)
+
+    async def write(item):
+        file, sha256, settings = item
+
+        def save():
+            rewrite_sidecar(output_path(file), settings, file.xmp_path)
+            index.record(file, "done", sha256)
+
+        await asyncio.to_thread(save)
+
+    def report(result: PipelineResult, done: int, total: int):
+        if result.error is not None:
+            index.record(result.item, "failed", error=str(result.error))
+            typer.echo(f"[{done}/{total}] {result.item.path}: failed in {result.failed_stage}: {result.error}")
+        elif done % 100 == 0 or done == total:
+            typer.echo(f"[{done}/{total}] processed")
+
+    pipeline = Pipeline(
+        [
+            PipelineStage("hash", digest, concurrency),
+            PipelineStage("inference", infer, concurrency),
+            PipelineStage("write", write, concurrency),
+        ],
+        on_result=report,
+    )
+
+    async def run():
+        try:
+            return await pipeline.run(pending)
+        finally:
+            await provider.aclose()
+
+    try:
+        asyncio.run(run())
+    finally:
+        counts = index.counts()
+        index.close()
+
+    for line in pipeline.stats.summary_lines():
+        typer.echo(line)
+    typer.echo(f"Index: {counts.get('done', 0)} done, {counts.get('failed', 0)} failed")
+    if pipeline.stats.failed:
+        raise typer.Exit(code=1)
+
+# "exposure>1.0", "Temperature <= 5000": longest operators first so "<=" is not read as "<"
+CONDITION_RE = re.compile(r"^\s*([\w.]+)\s*(%s)\s*([-+]?(?:\d+(?:\.\d*)?|\.\d+))\s*$" % "|".join(
+    re.escape(op) for op in sorted(OPERATORS, key=len, reverse=True)
+))
+
+def _parse_condition(text: str):
+    match = CONDITION_RE.match(text)
+    if not match:
+        raise typer.BadParameter(f"'{text}' is not a condition like 'exposure>1.0'.", param_hint="--where")
+    name, operator, value = match.groups()
+    return name, operator, float(value)
+
+@app.command()
+def catalog(
+    root: Path = typer.Argument(..., help="Folder to scan recursively for XMP sidecars."),
+    where: Optional[List[str]] = typer.Option(None, "--where", "-w", help="Filter such as 'exposure>1.0' or 'Temperature<=5000' (repeatable, all must match)."),
+    unprocessed: bool = typer.Option(False, "--unprocessed", help="Only sidecars whose image process-dir has not finished."),
+    index_path: Optional[Path] = typer.Option(None, "--index", help="Catalog database, shared with process-dir (default: <root>/.lightroom-index.sqlite)."),
+):
+    """
+    Refresh the sidecar catalog of a folder and list the sidecars matching the filters
+    as JSON lines. Only new or changed sidecars are read, so repeated queries are fast.
+    """
+    if not root.is_dir():
+        typer.echo(f"Error: {root} is not a directory.", err=True)
+        raise typer.Exit(code=1)
+    conditions = [_parse_condition(text) for text in where or []]
+
+    root = root.resolve()
+    with SidecarCatalog(index_path or root / ".lightroom-index.sqlite") as sidecars:
+        stats = sidecars.refresh(root)
+        try:
+            rows = sidecars.find(conditions, unprocessed=unprocessed)
+        except ValueError as e:
+            raise typer.BadParameter(str(e), param_hint="--where")
+
+    typer.echo(
+        f"Catalog: {stats.added} added, {stats.updated} updated, {stats.removed} removed, "
+        f"{len(rows)} match(es)", err=True
+    )
+    for row in rows:
+        typer.echo(json.dumps(row_to_dict(row)))
+
 if __name__ == "__main__":
     app()
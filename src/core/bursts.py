@@ -0,0 +1,231 @@
+import asyncio
+import io
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+from src.models import LightroomSettings
+from .inputs import InputFile
+from .preprocess import extract_raw_preview
+from .scoring import CullThresholds, FrameScore, score_frames
+
+if TYPE_CHECKING:
+    from src.providers.base import ProviderBase
+
+logger = logging.getLogger(__name__)
+
+# Max Hamming distance (of 64 bits) between consecutive frames of one burst
+DEFAULT_BURST_THRESHOLD = 10
+# Max seconds between consecutive frames of one burst, when both have a capture time
+DEFAULT_BURST_GAP = 2.0
+
+_EXIF_IFD = 0x8769
+_DATETIME = 0x0132
+_DATETIME_ORIGINAL = 0x9003
+_SUBSEC_TIME_ORIGINAL = 0x9291
+
+
+@dataclass
+class Fingerprint:
+    """Perceptual hash of an image plus its capture time (seconds), if known."""
+    hash: int
+    captured: Optional[float] = None
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.astype(np.uint8).ravel()).tobytes(), "big")
+
+
+def dhash(gray: Image.Image) -> int:
+    """64-bit difference hash: sign of the horizontal gradient on a 9x8 thumbnail."""
+    pixels = np.asarray(gray.resize((9, 8), Image.Resampling.BOX), dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    return np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def phash(gray: Image.Image) -> int:
+    """64-bit DCT hash: low 8x8 frequencies of a 32x32 thumbnail against their median."""
+    pixels = np.asarray(gray.resize((32, 32), Image.Resampling.BOX), dtype=np.float64)
+    low = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8]
+    return _bits_to_int(low > np.median(low.ravel()[1:]))
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _capture_time(img: Image.Image) -> Optional[float]:
+    exif = img.getexif()
+    sub_ifd = exif.get_ifd(_EXIF_IFD)
+    stamp = sub_ifd.get(_DATETIME_ORIGINAL) or exif.get(_DATETIME)
+    if not stamp:
+        return None
+    try:
+        captured = datetime.strptime(str(stamp).strip("\x00 "), "%Y:%m:%d %H:%M:%S").timestamp()
+    except ValueError:
+        return None
+    subsec = str(sub_ifd.get(_SUBSEC_TIME_ORIGINAL) or "").strip("\x00 ")
+    if subsec.isdigit():
+        captured += int(subsec) / 10 ** len(subsec)
+    return captured
+
+
+def fingerprint(image: Union[Path, InputFile], method: str = "dhash") -> Optional[Fingerprint]:
+    """
+    Perceptual hash (`dhash` or `phash`) and EXIF capture time of an image, decoded
+    at reduced size. RAW files are hashed from their embedded preview. Returns None
+    for files that cannot be decoded.
+    """
+    hasher = {"dhash": dhash, "phash": phash}[method]
+    source = InputFile.coerce(extract_raw_preview(image))
+    with source.buffer() as buf:
+        try:
+            with Image.open(io.BytesIO(buf)) as img:
+                captured = _capture_time(img)
+                img.draft("L", (64, 64))
+                return Fingerprint(hasher(img.convert("L")), captured)
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+            logger.warning(f"Cannot fingerprint {source.name}: {e}")
+            return None
+
+
+def cluster_bursts(
+    fingerprints: Sequence[Optional[Fingerprint]],
+    threshold: int = DEFAULT_BURST_THRESHOLD,
+    max_gap: Optional[float] = DEFAULT_BURST_GAP,
+) -> List[List[int]]:
+    """
+    Groups consecutive near-duplicate frames into bursts.
+
+    Frames are walked in capture order (input order if any capture time is
+    missing); a frame joins the current burst when its hash is within `threshold`
+    bits of the previous frame and, if both have capture times, it was taken at
+    most `max_gap` seconds later. Returns lists of input indices, ordered by their
+    first index. Frames without a fingerprint are always on their own.
+    """
+    order = list(range(len(fingerprints)))
+    if fingerprints and all(fp is not None and fp.captured is not None for fp in fingerprints):
+        order.sort(key=lambda i: fingerprints[i].captured)
+
+    clusters: List[List[int]] = []
+    previous: Optional[Fingerprint] = None
+    for i in order:
+        current = fingerprints[i]
+        joins = (
+            clusters
+            and current is not None
+            and previous is not None
+            and hamming(current.hash, previous.hash) <= threshold
+            and (
+                max_gap is None
+                or current.captured is None
+                or previous.captured is None
+                or abs(current.captured - previous.captured) <= max_gap
+            )
+        )
+        if joins:
+            clusters[-1].append(i)
+        else:
+            clusters.append([i])
+        previous = current
+
+    for cluster in clusters:
+        cluster.sort()
+    clusters.sort(key=lambda cluster: cluster[0])
+    return clusters
+
+
+def cluster_images(
+    images: Sequence[Union[Path, InputFile]],
+    threshold: int = DEFAULT_BURST_THRESHOLD,
+    max_gap: Optional[float] = DEFAULT_BURST_GAP,
+    method: str = "dhash",
+) -> List[List[int]]:
+    """Fingerprints `images` and groups them with `cluster_bursts`."""
+    clusters = cluster_bursts([fingerprint(image, method) for image in images], threshold, max_gap)
+    logger.info(f"Grouped {len(images)} image(s) into {len(clusters)} burst(s)")
+    return clusters
+
+
+def representative(cluster: Sequence[int]) -> int:
+    """The frame of a burst that is sent to the model (the middle one)."""
+    return cluster[len(cluster) // 2]
+
+
+async def plan_batch(
+    images: Sequence[Union[Path, InputFile]],
+    cull: Optional[CullThresholds] = None,
+    burst_threshold: Optional[int] = None,
+    burst_gap: Optional[float] = DEFAULT_BURST_GAP,
+) -> Tuple[List[Optional[FrameScore]], List[List[int]]]:
+    """
+    Decides which images go to the model. With `cull`, every image is scored and
+    rejects are left out; with `burst_threshold`, the rest are grouped into bursts.
+    Returns the score per image (None without `cull`) and the clusters of input
+    indices still to analyze, one model call each.
+    """
+    scores: List[Optional[FrameScore]] = [None] * len(images)
+    if cull is not None:
+        scores = await score_frames(images, cull)
+    keep = [i for i, score in enumerate(scores) if score is None or not score.rejected]
+
+    if burst_threshold is None:
+        return scores, [[i] for i in keep]
+    clusters = await asyncio.to_thread(cluster_images, [images[i] for i in keep], burst_threshold, burst_gap)
+    return scores, [[keep[i] for i in cluster] for cluster in clusters]
+
+
+async def process_clusters(
+    provider: "ProviderBase",
+    image_paths: Sequence[Union[Path, InputFile]],
+    xmp_paths: Optional[Sequence[Optional[Union[Path, InputFile]]]],
+    clusters: Sequence[Sequence[int]],
+    concurrency: int = 4,
+    batch_size: int = 1,
+) -> List[Optional[LightroomSettings]]:
+    """
+    Analyzes the representative frame of every cluster, `batch_size` frames per
+    provider request (see `ProviderBase.process_batch`), and returns the resulting
+    settings for every input image, in input order; images in no cluster get None.
+    A failed request raises, like `ProviderBase.process_batch`.
+    """
+    if xmp_paths is None:
+        xmp_paths = [None] * len(image_paths)
+    leads = [representative(cluster) for cluster in clusters]
+    outcomes = await provider.process_batch(
+        [image_paths[i] for i in leads], [xmp_paths[i] for i in leads], batch_size, concurrency
+    )
+    results: List[Optional[LightroomSettings]] = [None] * len(image_paths)
+    for cluster, settings in zip(clusters, outcomes):
+        for i in cluster:
+            results[i] = settings.model_copy()
+    return results
+
+
+async def process_bursts(
+    provider: "ProviderBase",
+    image_paths: Sequence[Union[Path, InputFile]],
+    xmp_paths: Optional[Sequence[Optional[Union[Path, InputFile]]]] = None,
+    threshold: int = DEFAULT_BURST_THRESHOLD,
+    max_gap: Optional[float] = DEFAULT_BURST_GAP,
+    concurrency: int = 4,
+) -> List[LightroomSettings]:
+    """
+    Runs `provider` once per burst (on its representative frame) and returns the
+    resulting settings for every input image, in input order.
+    """
+    clusters = await asyncio.to_thread(cluster_images, image_paths, threshold, max_gap)
+    return await process_clusters(provider, image_paths, xmp_paths, clusters, concurrency)
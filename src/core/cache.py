@@ -0,0 +1,258 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(
+    image_hash: str,
+    crs_values: Optional[Dict[str, str]],
+    provider_name: str,
+    model: Optional[str],
+    prompt_version: str,
+) -> str:
+    """
+    Content-addressed identity of a provider request.
+
+    Two requests with the same image bytes, the same (normalized) crs values, and the
+    same provider/model/prompt produce the same key regardless of file names or paths.
+    """
+    payload = json.dumps(
+        {
+            "image": image_hash,
+            "crs": sorted((crs_values or {}).items()),
+            "provider": provider_name,
+            "model": model or "",
+            "prompt": prompt_version,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier key/value cache for provider results.
+
+    - Memory tier: a small LRU of hot entries.
+    - Disk tier: one JSON file per key under `cache_dir`, evicted least-recently-used
+      first once the store exceeds `max_bytes`, and dropped once older than `max_age`.
+
+    Values are JSON-serializable dicts. The cache is safe to share between asyncio
+    tasks and worker threads.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_bytes: int = 256 * 1024 * 1024,
+        max_age: Optional[float] = 30 * 24 * 3600,
+        memory_entries: int = 512,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.memory_entries = memory_entries
+
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = sum(p.stat().st_size for p in self.cache_dir.glob("*/*.json"))
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _remember(self, key: str, value: Dict[str, Any]):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+            path = self._entry_path(key)
+            try:
+                entry = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+
+            if self.max_age is not None and time.time() - entry.get("created", 0) > self.max_age:
+                self._remove(path)
+                self.misses += 1
+                return None
+
+            # Bump mtime so disk eviction sees this entry as recently used
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+            value = entry["value"]
+            self._remember(key, value)
+            self.disk_hits += 1
+            return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        data = json.dumps({"created": time.time(), "value": value}).encode("utf-8")
+        with self._lock:
+            self._remember(key, value)
+
+            path = self._entry_path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            previous = path.stat().st_size if path.exists() else 0
+
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+
+            self._disk_bytes += len(data) - previous
+            if self._disk_bytes > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path: Path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+            self._disk_bytes -= size
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Drop expired entries, then least-recently-used ones until under 90% of the budget."""
+        entries = []
+        now = time.time()
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            if self.max_age is not None and now - st.st_mtime > self.max_age:
+                self._remove(path)
+            else:
+                entries.append((st.st_mtime, path))
+
+        entries.sort()
+        target = int(self.max_bytes * 0.9)
+        for _, path in entries:
+            if self._disk_bytes <= target:
+                break
+            self._memory.pop(path.stem, None)
+            self._remove(path)
+
+        logger.info(f"Result cache evicted down to {self._disk_bytes} bytes")
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            for path in self.cache_dir.glob("*/*.json"):
+                self._remove(path)
+            self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_bytes": self._disk_bytes,
+        }
+
+
+class DerivativeCache:
+    """
+    On-disk store of preprocessed (downscaled / re-encoded) images.
+
+    Entries are raw image bytes under `cache_dir`, keyed by the source image hash
+    and the target parameters, and evicted least-recently-used first once the store
+    exceeds `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 1024 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._disk_bytes = sum(p.stat().st_size for p in self.cache_dir.glob("*/*.bin"))
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(source_hash: str, **params: Any) -> str:
+        payload = json.dumps({"source": source_hash, **params}, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.bin"
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._entry_path(key)
+        with self._lock:
+            try:
+                data = path.read_bytes()
+                os.utime(path)
+            except OSError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return data
+
+    def put(self, key: str, data: bytes):
+        with self._lock:
+            path = self._entry_path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            previous = path.stat().st_size if path.exists() else 0
+
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+
+            self._disk_bytes += len(data) - previous
+            if self._disk_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in self.cache_dir.glob("*/*.bin"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        entries.sort()
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in entries:
+            if self._disk_bytes <= target:
+                break
+            try:
+                path.unlink()
+                self._disk_bytes -= size
+            except OSError:
+                pass
+
+        logger.info(f"Derivative cache evicted down to {self._disk_bytes} bytes")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "disk_bytes": self._disk_bytes}
@@ -0,0 +1,147 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Union
+
+from .inputs import InputFile
+from .raw_preview import RAW_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".tif", ".tiff", ".webp", ".heic"} | RAW_EXTENSIONS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    updated REAL NOT NULL
+)
+"""
+
+
+@dataclass
+class ScannedFile:
+    """An image found by `scan_images`, with its stat and sidecar (if any)."""
+    path: Path
+    size: int
+    mtime_ns: int
+    xmp_path: Optional[Path] = None
+
+
+def primary_images(filenames: Iterable[str]) -> Dict[str, str]:
+    """
+    The image that owns `<stem>.xmp` for each (lower-cased) stem among `filenames`:
+    the RAW file of a RAW+JPEG pair, as in Lightroom, else the first by name.
+    Files without an image extension are ignored.
+    """
+    images: Dict[str, str] = {}
+    for name in sorted(filenames):
+        suffix = Path(name).suffix.lower()
+        if suffix not in IMAGE_EXTENSIONS:
+            continue
+        stem = Path(name).stem.lower()
+        current = images.get(stem)
+        if current is None or (suffix in RAW_EXTENSIONS and Path(current).suffix.lower() not in RAW_EXTENSIONS):
+            images[stem] = name
+    return images
+
+
+def scan_images(root: Union[str, Path]) -> Iterator[ScannedFile]:
+    """
+    Walks `root` recursively, in sorted order, and yields every image with a known
+    extension. Hidden directories are skipped; `<stem>.xmp` next to an image is
+    reported as its sidecar. Images sharing a stem would share that sidecar, so
+    only one of them is yielded (see `primary_images`).
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        sidecars = {Path(name).stem.lower(): name for name in filenames if name.lower().endswith(".xmp")}
+        images = primary_images(filenames)
+        for name in sorted(filenames):
+            path = Path(dirpath) / name
+            if path.suffix.lower() not in IMAGE_EXTENSIONS:
+                continue
+            if images[path.stem.lower()] != name:
+                logger.info(f"Skipping {path}: {images[path.stem.lower()]} owns its sidecar")
+                continue
+            try:
+                stat = path.stat()
+            except OSError as e:
+                logger.warning(f"Skipping {path}: {e}")
+                continue
+            sidecar = sidecars.get(path.stem.lower())
+            yield ScannedFile(path, stat.st_size, stat.st_mtime_ns, Path(dirpath) / sidecar if sidecar else None)
+
+
+class FileIndex:
+    """
+    SQLite index of processed files (path, size, mtime, content hash, status).
+
+    Every result is committed as soon as it is recorded, so a run that is killed
+    loses at most the files that were in flight, and the next run picks up where
+    it stopped. Safe to use from worker threads.
+    """
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self) -> "FileIndex":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get(self, path: Path) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self.conn.execute("SELECT * FROM files WHERE path = ?", (str(path),)).fetchone()
+
+    def is_done(self, file: ScannedFile) -> bool:
+        """
+        Whether `file` was already processed successfully and has not changed since.
+        A file whose mtime moved but whose size and content hash match (e.g. after a
+        copy or `touch`) still counts as done.
+        """
+        row = self.get(file.path)
+        if row is None or row["status"] != "done" or row["size"] != file.size:
+            return False
+        if row["mtime_ns"] == file.mtime_ns:
+            return True
+        if row["sha256"] and InputFile(path=file.path).sha256() == row["sha256"]:
+            with self._lock:
+                self.conn.execute("UPDATE files SET mtime_ns = ? WHERE path = ?", (file.mtime_ns, str(file.path)))
+                self.conn.commit()
+            return True
+        return False
+
+    def record(self, file: ScannedFile, status: str, sha256: Optional[str] = None, error: Optional[str] = None):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256, status, error, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(file.path), file.size, file.mtime_ns, sha256, status, error, time.time()),
+            )
+            self.conn.commit()
+
+    def counts(self) -> Dict[str, int]:
+        """Number of indexed files per status."""
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM files GROUP BY status").fetchall()
+        return {row[0]: row[1] for row in rows}
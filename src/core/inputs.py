@@ -0,0 +1,157 @@
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Union
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+
+class InputFile:
+    """
+    An input image or sidecar held either as a file path or as an in-memory /
+    memory-mapped buffer.
+
+    It mirrors the parts of the `pathlib.Path` API providers already use
+    (`name`, `suffix`, `exists`, `read_bytes`, `read_text`), so code written
+    against paths accepts buffers unchanged. `buffer()` gives a zero-copy view
+    (an mmap of the file, or the in-memory buffer itself) for consumers such as
+    hashing or base64 that accept any buffer.
+    """
+
+    def __init__(self, data: Optional[Buffer] = None, path: Optional[Path] = None, name: Optional[str] = None):
+        if (data is None) == (path is None):
+            raise ValueError("InputFile needs exactly one of `data` or `path`.")
+        self.path = Path(path) if path is not None else None
+        self._data = data
+        self.name = name or (self.path.name if self.path else "image.jpg")
+        # Set once preprocessing (RAW preview extraction, downscaling) has produced this input
+        self.prepared = False
+        # Owners of the buffer; `release` frees it once the last one lets go
+        self._refs = 1
+
+    @classmethod
+    def coerce(cls, value: Union["InputFile", Path, str, Buffer]) -> "InputFile":
+        if isinstance(value, InputFile):
+            return value
+        if isinstance(value, (str, os.PathLike)):
+            return cls(path=Path(value))
+        return cls(data=value)
+
+    @classmethod
+    def from_upload(cls, fileobj: BinaryIO, name: Optional[str] = None) -> "InputFile":
+        """
+        Wraps an uploaded file without copying it. A SpooledTemporaryFile that has
+        rolled over to disk is memory-mapped; one still in memory exposes its
+        BytesIO buffer directly.
+        """
+        inner = getattr(fileobj, "_file", fileobj)
+        if isinstance(inner, io.BytesIO):
+            return cls(data=inner.getbuffer(), name=name)
+        try:
+            fd = inner.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            fileobj.seek(0)
+            return cls(data=fileobj.read(), name=name)
+        if os.fstat(fd).st_size == 0:
+            return cls(data=b"", name=name)
+        return cls(data=mmap.mmap(fd, 0, access=mmap.ACCESS_READ), name=name)
+
+    def retain(self) -> "InputFile":
+        """
+        Adds an owner, so the buffer outlives the caller's own `release` until
+        this owner calls `release` too (e.g. a call shared between requests).
+        """
+        self._refs += 1
+        return self
+
+    def release(self):
+        """
+        Drops the view onto an upload's buffer (unmapping it if memory-mapped) so
+        the underlying file can be closed. The InputFile must not be read afterwards
+        unless other owners (see `retain`) remain: they keep the mapping, or a copy
+        of an in-memory buffer, since its BytesIO cannot be closed while viewed.
+        """
+        self._refs = max(0, self._refs - 1)
+        if self._refs:
+            if isinstance(self._data, memoryview):
+                view, self._data = self._data, bytes(self._data)
+                view.release()
+            return
+        if isinstance(self._data, memoryview):
+            self._data.release()
+        elif isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    def __enter__(self) -> "InputFile":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    @property
+    def suffix(self) -> str:
+        return Path(self.name).suffix
+
+    @property
+    def stem(self) -> str:
+        return Path(self.name).stem
+
+    def exists(self) -> bool:
+        return self.path.exists() if self.path is not None else True
+
+    def size(self) -> int:
+        if self.path is not None:
+            return self.path.stat().st_size
+        return len(self._data)
+
+    @contextmanager
+    def buffer(self) -> Iterator[Buffer]:
+        """Zero-copy read-only view of the content, valid inside the `with` block."""
+        if self._data is not None:
+            yield self._data
+            return
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b""
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    def read_bytes(self) -> bytes:
+        if self.path is not None:
+            return self.path.read_bytes()
+        return bytes(self._data)
+
+    def read_text(self, encoding: str = "utf-8") -> str:
+        if self.path is not None:
+            return self.path.read_text(encoding=encoding)
+        return bytes(self._data).decode(encoding)
+
+    def sha256(self) -> str:
+        with self.buffer() as buf:
+            return hashlib.sha256(buf).hexdigest()
+
+    @contextmanager
+    def local_path(self) -> Iterator[Path]:
+        """
+        A filesystem path to the content, for consumers that can only read files
+        (e.g. an external CLI). Buffers are written to a temporary file only here.
+        """
+        if self.path is not None:
+            yield self.path
+            return
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp_path = Path(tmpdir) / (Path(self.name).name or "image.jpg")
+            with self.buffer() as buf:
+                tmp_path.write_bytes(buf)
+            yield tmp_path
+
+    def __str__(self) -> str:
+        return str(self.path) if self.path is not None else self.name
+
+    def __repr__(self) -> str:
+        return f"InputFile({str(self)!r})"
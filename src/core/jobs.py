@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import shutil
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.models import LightroomSettings
+from .bursts import representative
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ("done", "failed", "rejected")
+
+ProcessFn = Callable[[Path, Optional[Path]], Awaitable[LightroomSettings]]
+BatchFn = Callable[[List[Path], List[Optional[Path]]], Awaitable[List[LightroomSettings]]]
+
+
+@dataclass
+class JobItem:
+    """
+    One image of a job and, once processed, its settings or error. Frames of a
+    burst are not processed themselves: they take the outcome of the burst's
+    representative (`burst_of`), which lists them as `followers`.
+    """
+    index: int
+    filename: str
+    image_path: Path
+    xmp_path: Optional[Path] = None
+    status: str = "queued"
+    settings: Optional[LightroomSettings] = None
+    error: Optional[str] = None
+    burst_of: Optional[int] = None
+    followers: List["JobItem"] = field(default_factory=list, repr=False)
+    score: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "filename": self.filename,
+            "status": self.status,
+            "settings": self.settings.model_dump() if self.settings else None,
+            "error": self.error,
+            "burst_of": self.burst_of,
+            "score": self.score,
+        }
+
+
+@dataclass
+class Job:
+    """A batch of images submitted together. `work_dir` holds their uploads until the job finishes."""
+    id: str
+    items: List[JobItem]
+    work_dir: Optional[Path] = None
+    created: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+
+    @property
+    def completed(self) -> int:
+        return sum(item.status == "done" for item in self.items)
+
+    @property
+    def failed(self) -> int:
+        return sum(item.status == "failed" for item in self.items)
+
+    @property
+    def rejected(self) -> int:
+        return sum(item.status == "rejected" for item in self.items)
+
+    @property
+    def status(self) -> str:
+        if self.finished is not None:
+            return "done"
+        if any(item.status not in ("queued", "rejected") for item in self.items):
+            return "running"
+        return "queued"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total": len(self.items),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "results": [item.to_dict() for item in self.items],
+        }
+
+
+class JobManager:
+    """
+    In-process job queue for long-running analysis batches.
+
+    Submitted jobs return immediately; a pool of `concurrency` workers drains the
+    items of all jobs through `process_fn`, or through `batch_fn` for groups of
+    items submitted with a `batch_size` above 1. Finished jobs stay retrievable
+    for `ttl` seconds and are then dropped along with their upload directory.
+    """
+
+    def __init__(
+        self,
+        process_fn: ProcessFn,
+        concurrency: int = 4,
+        ttl: float = 3600.0,
+        batch_fn: Optional[BatchFn] = None,
+    ):
+        self.process_fn = process_fn
+        self.batch_fn = batch_fn
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self.jobs: Dict[str, Job] = {}
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        """Starts the worker pool on the running event loop (idempotent)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [loop.create_task(self._worker()) for _ in range(max(1, self.concurrency))]
+        self._loop = loop
+        # Items queued on a previous loop would otherwise never run
+        for job in self.jobs.values():
+            for item in job.items:
+                if item.burst_of is None and item.status in ("queued", "running"):
+                    item.status = "queued"
+                    self._queue.put_nowait((job, [item]))
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._loop = None
+
+    def submit(
+        self,
+        items: List[JobItem],
+        work_dir: Optional[Path] = None,
+        clusters: Optional[List[List[int]]] = None,
+        batch_size: int = 1,
+    ) -> Job:
+        """
+        Queues `items` as a new job. With `clusters` (lists of item positions, see
+        `cluster_images`), only one item per cluster is processed and its outcome
+        is copied to the rest. Items already marked "rejected" (by the pre-cull)
+        are not processed. With a `batch_fn`, the items to process are sent
+        `batch_size` at a time, in order, in one call each.
+        """
+        self.start()
+        self.purge_expired()
+
+        for cluster in clusters or []:
+            lead = items[representative(cluster)]
+            for i in cluster:
+                if items[i] is not lead:
+                    items[i].burst_of = lead.index
+                    lead.followers.append(items[i])
+
+        job = Job(id=uuid.uuid4().hex, items=items, work_dir=work_dir)
+        self.jobs[job.id] = job
+        pending = [item for item in items if item.burst_of is None and item.status == "queued"]
+        step = max(1, batch_size) if self.batch_fn is not None else 1
+        for start in range(0, len(pending), step):
+            self._queue.put_nowait((job, pending[start:start + step]))
+        if all(item.status in FINAL_STATUSES for item in items):
+            job.finished = time.time()
+            self._cleanup(job)
+        logger.info(f"Queued job {job.id} with {len(items)} item(s)")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self.purge_expired()
+        return self.jobs.get(job_id)
+
+    def purge_expired(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished is not None and now - job.finished > self.ttl
+        ]
+        for job_id in expired:
+            job = self.jobs.pop(job_id)
+            self._cleanup(job)
+
+    @staticmethod
+    def _cleanup(job: Job):
+        if job.work_dir is not None:
+            shutil.rmtree(job.work_dir, ignore_errors=True)
+            job.work_dir = None
+
+    async def _process_group(self, job: Job, group: List[JobItem]):
+        if len(group) > 1:
+            try:
+                results = await self.batch_fn([i.image_path for i in group], [i.xmp_path for i in group])
+                if len(results) != len(group):
+                    raise ValueError(f"Got {len(results)} result(s) for {len(group)} image(s).")
+            except Exception as e:
+                # Retry one by one so a single bad image fails alone
+                logger.warning(f"Job {job.id} batch of {len(group)} failed, retrying per image: {e}")
+            else:
+                for item, settings in zip(group, results):
+                    item.settings = settings
+                    item.status = "done"
+                return
+        for item in group:
+            try:
+                item.settings = await self.process_fn(item.image_path, item.xmp_path)
+                item.status = "done"
+            except Exception as e:
+                logger.warning(f"Job {job.id} item {item.index} failed: {e}")
+                item.error = str(e)
+                item.status = "failed"
+
+    async def _worker(self):
+        while True:
+            job, group = await self._queue.get()
+            try:
+                for item in group:
+                    item.status = "running"
+                    for follower in item.followers:
+                        follower.status = "running"
+                await self._process_group(job, group)
+                for item in group:
+                    for follower in item.followers:
+                        follower.settings = item.settings.model_copy() if item.settings else None
+                        follower.error = item.error
+                        follower.status = item.status
+
+                if all(i.status in FINAL_STATUSES for i in job.items):
+                    job.finished = time.time()
+                    self._cleanup(job)
+            finally:
+                self._queue.task_done()
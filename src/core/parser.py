@@ -1,8 +1,40 @@
 import json
 import re
-from typing import Dict, Any
+import logging
+from typing import Dict, Any, AsyncIterator, Iterable, List, Optional, Tuple
+
+from src.models import SETTINGS_RANGES, LightroomResponse, LightroomSettings
+from src.core.settings_batch import SettingsBatch
+
+logger = logging.getLogger(__name__)
+
+class ClarificationNeeded(ValueError):
+    """The model asked a question (`clarification_needed`) instead of answering with settings."""
+
+def clarification(settings: LightroomSettings) -> Optional[str]:
+    """The question the model asked alongside `settings`, if any."""
+    return settings._clarification_needed
+
+
+def _with_clarification(settings: LightroomSettings, question: Optional[str]) -> LightroomSettings:
+    settings._clarification_needed = question or None
+    return settings
+
+
+def settings_from_answer(data: Dict[str, Any]) -> LightroomSettings:
+    """
+    LightroomSettings from a single-image JSON answer, keeping a `clarification_needed`
+    question the model put next to the values (see `clarification`).
+
+    Raises:
+        ClarificationNeeded: If the answer asks for clarification and holds no settings.
+    """
+    settings = LightroomSettings(**data)
+    question = data.get("clarification_needed")
+    if question and not settings.model_dump(exclude_none=True):
+        raise ClarificationNeeded(f"LLM requested clarification instead of settings: {question}")
+    return _with_clarification(settings, question)
 
-from src.models import LightroomResponse
 
 def extract_json_from_text(text: str) -> str:
     """
@@ -46,3 +78,158 @@ def parse_llm_response(text: str) -> LightroomResponse:
         return LightroomResponse.model_validate(data)
     except Exception as e:
         raise ValueError(f"Failed to validate data against LightroomResponse schema: {e}")
+
+
+def expand_response(response: LightroomResponse, image_count: int) -> List[LightroomSettings]:
+    """
+    Expands a multi-image LightroomResponse into one LightroomSettings per image.
+
+    Each image starts from `global_settings`; any non-null field in its
+    `per_image_adjustments` entry (1-based `image_index`) replaces the global value.
+    A `clarification_needed` question asked alongside settings is kept on each of
+    them (see `clarification`).
+
+    Raises:
+        ClarificationNeeded: If the response asks for clarification instead of giving settings.
+        ValueError: If the response carries no settings at all.
+    """
+    if response.global_settings is None and not response.per_image_adjustments:
+        if response.clarification_needed:
+            raise ClarificationNeeded(f"LLM requested clarification instead of settings: {response.clarification_needed}")
+        raise ValueError("LLM response contains neither global_settings nor per_image_adjustments.")
+
+    return [
+        _with_clarification(settings, response.clarification_needed)
+        for settings in SettingsBatch.from_response(response, image_count).to_settings()
+    ]
+
+
+def settings_problems(settings: LightroomSettings, required: Iterable[str] = ()) -> List[str]:
+    """
+    Lists what is wrong with `settings`: each field in `required` that is null, each
+    value outside its documented range (SETTINGS_RANGES), and a question the model
+    asked alongside them. Empty if usable.
+    """
+    problems = [f"missing {name}" for name in required if getattr(settings, name) is None]
+    if clarification(settings):
+        problems.append(f"clarification needed: {clarification(settings)}")
+    for name, (low, high) in SETTINGS_RANGES.items():
+        value = getattr(settings, name)
+        if value is not None and not low <= value <= high:
+            problems.append(f"{name} {value} outside {low}..{high}")
+    return problems
+
+
+class IncrementalJSONParser:
+    """
+    Parses the first JSON object in a stream of text chunks and reports each
+    top-level field as soon as its value is complete, without waiting for the
+    closing brace. Text before the object (chatter, a ```json fence) and after
+    it is ignored. Each character is looked at once, so the cost is linear in the
+    output however it is chunked.
+    """
+    def __init__(self):
+        self.depth = 0
+        self.done = False
+        self._in_string = False
+        self._escaped = False
+        self._key: Optional[str] = None
+        self._buf: List[str] = []
+
+    def _complete(self) -> Optional[Tuple[str, Any]]:
+        text = "".join(self._buf).strip()
+        self._buf = []
+        key, self._key = self._key, None
+        if key is None or not text:
+            return None
+        try:
+            return key, json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON value for '{key}': {e}")
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consumes `chunk` and returns the (key, value) pairs it completed."""
+        fields = []
+        for char in chunk:
+            if self.done:
+                break
+            if self._in_string:
+                if self.depth > 1 or self._key is not None or self._escaped or char != '"':
+                    self._buf.append(char)
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if self.depth == 0:
+                if char == "{":
+                    self.depth = 1
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self.depth > 1 or self._key is not None:
+                    self._buf.append(char)
+            elif char in "{[":
+                self.depth += 1
+                self._buf.append(char)
+            elif char in "}]" and self.depth > 1:
+                self.depth -= 1
+                self._buf.append(char)
+            elif self.depth == 1 and char == ":":
+                self._key = json.loads(f'"{"".join(self._buf).strip()}"')
+                self._buf = []
+            elif self.depth == 1 and char in ",}":
+                field = self._complete()
+                if field is not None:
+                    fields.append(field)
+                if char == "}":
+                    self.depth = 0
+                    self.done = True
+            else:
+                self._buf.append(char)
+        return fields
+
+
+async def stream_settings(chunks: AsyncIterator[str]) -> AsyncIterator[LightroomSettings]:
+    """
+    Turns streamed model output into a series of partial LightroomSettings, one
+    per completed field; the last one yielded is the full result. A
+    `clarification_needed` question is kept on the settings (see `clarification`).
+
+    Raises:
+        ClarificationNeeded: If the output asks for clarification and holds no settings.
+        ValueError: If the output holds no settings or a value fails validation.
+    """
+    parser = IncrementalJSONParser()
+    values: Dict[str, Any] = {}
+    question: Optional[str] = None
+    try:
+        async for chunk in chunks:
+            for key, value in parser.feed(chunk):
+                if key == "clarification_needed":
+                    question = value if isinstance(value, str) else None
+                    if not values:
+                        continue
+                elif key in LightroomSettings.model_fields:
+                    values[key] = value
+                else:
+                    continue
+                try:
+                    settings = LightroomSettings(**values)
+                except Exception as e:
+                    raise ValueError(f"Failed to validate streamed settings: {e}")
+                yield _with_clarification(settings, question)
+            if parser.done:
+                break
+    finally:
+        # Stop the upstream stream (and free what it holds) as soon as the object is complete
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    if not values:
+        if question:
+            raise ClarificationNeeded(f"LLM requested clarification instead of settings: {question}")
+        raise ValueError("Model output contains no settings.")
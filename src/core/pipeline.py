@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of `values` (pct in 0..100). Returns 0.0 for an empty sequence.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+@dataclass
+class PipelineStage:
+    """
+    A single pipeline stage. `func` receives the output of the previous stage
+    (or the original item for the first stage) and returns the input of the next one.
+    """
+    name: str
+    func: Callable[[Any], Awaitable[Any]]
+    concurrency: int = 1
+
+
+@dataclass
+class PipelineResult:
+    """Outcome of one item after it left the pipeline (successfully or not)."""
+    index: int
+    item: Any
+    value: Any = None
+    error: Optional[BaseException] = None
+    failed_stage: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class PipelineStats:
+    """Wall-clock and per-stage latency figures collected during a run."""
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    stage_latencies: Dict[str, List[float]] = field(default_factory=dict)
+
+    @property
+    def items_per_minute(self) -> float:
+        if self.elapsed <= 0:
+            return 0.0
+        return self.total * 60.0 / self.elapsed
+
+    def summary_lines(self) -> List[str]:
+        lines = [
+            f"Processed {self.total} item(s) in {self.elapsed:.1f}s "
+            f"({self.succeeded} ok, {self.failed} failed, {self.items_per_minute:.1f}/min)"
+        ]
+        for name, latencies in self.stage_latencies.items():
+            lines.append(
+                f"  {name}: n={len(latencies)} "
+                f"p50={percentile(latencies, 50):.2f}s p95={percentile(latencies, 95):.2f}s"
+            )
+        return lines
+
+
+ProgressCallback = Callable[[PipelineResult, int, int], None]
+
+
+class Pipeline:
+    """
+    Bounded-concurrency async pipeline.
+
+    Each stage owns a pool of `concurrency` workers reading from a bounded queue, so
+    stages overlap (item N can be in inference while item N+1 is being fetched) and
+    no stage holds more than `concurrency` items in flight. A failure in any stage is
+    recorded against that item and does not stop the rest of the batch.
+    """
+
+    def __init__(self, stages: List[PipelineStage], on_result: Optional[ProgressCallback] = None):
+        if not stages:
+            raise ValueError("Pipeline requires at least one stage.")
+        self.stages = stages
+        self.on_result = on_result
+        self.stats = PipelineStats()
+
+    async def run(self, items: Sequence[Any]) -> List[PipelineResult]:
+        self.stats = PipelineStats(
+            total=len(items),
+            stage_latencies={stage.name: [] for stage in self.stages},
+        )
+        results: List[Optional[PipelineResult]] = [None] * len(items)
+        queues = [asyncio.Queue(maxsize=max(1, stage.concurrency) * 2) for stage in self.stages]
+        started = time.perf_counter()
+
+        def finish(result: PipelineResult):
+            results[result.index] = result
+            if result.ok:
+                self.stats.succeeded += 1
+            else:
+                self.stats.failed += 1
+            if self.on_result:
+                self.on_result(result, self.stats.succeeded + self.stats.failed, self.stats.total)
+
+        async def worker(stage_idx: int):
+            stage = self.stages[stage_idx]
+            queue = queues[stage_idx]
+            while True:
+                index, payload = await queue.get()
+                try:
+                    t0 = time.perf_counter()
+                    try:
+                        value = await stage.func(payload)
+                    except Exception as e:
+                        logger.warning(f"Stage '{stage.name}' failed for item {index}: {e}")
+                        finish(PipelineResult(index, items[index], error=e, failed_stage=stage.name))
+                        continue
+                    finally:
+                        self.stats.stage_latencies[stage.name].append(time.perf_counter() - t0)
+
+                    if stage_idx + 1 < len(self.stages):
+                        await queues[stage_idx + 1].put((index, value))
+                    else:
+                        finish(PipelineResult(index, items[index], value=value))
+                finally:
+                    queue.task_done()
+
+        workers = [
+            [asyncio.create_task(worker(i)) for _ in range(max(1, stage.concurrency))]
+            for i, stage in enumerate(self.stages)
+        ]
+
+        try:
+            for index, item in enumerate(items):
+                await queues[0].put((index, item))
+            # A stage's queue can only be fully drained once everything upstream has
+            # been handed over, so joining in order guarantees every item is finished.
+            for queue in queues:
+                await queue.join()
+        finally:
+            for stage_workers in workers:
+                for task in stage_workers:
+                    task.cancel()
+            await asyncio.gather(*(t for sw in workers for t in sw), return_exceptions=True)
+
+        self.stats.elapsed = time.perf_counter() - started
+        return [r for r in results if r is not None]
+
+
+class MicroBatcher:
+    """
+    Collects single items submitted from many tasks and hands them to `func` in
+    lists of up to `max_size`, waiting at most `max_delay` seconds after the first
+    item of a batch for more to arrive. `func` returns one result per item, in
+    order; each `submit` call gets its own result (or the batch's exception).
+    At most `concurrency` batches are in flight.
+    """
+    def __init__(
+        self,
+        func: Callable[[List[Any]], Awaitable[Sequence[Any]]],
+        max_size: int = 50,
+        max_delay: float = 0.2,
+        concurrency: int = 1,
+    ):
+        self.func = func
+        self.max_size = max(1, max_size)
+        self.max_delay = max_delay
+        self.batches = 0
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    async def submit(self, item: Any) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        async with self._semaphore:
+            self.batches += 1
+            try:
+                results = await self.func([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise ValueError(f"Batch function returned {len(results)} result(s) for {len(batch)} item(s).")
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+async def iter_completed(
+    func: Callable[[Any], Awaitable[Any]],
+    items: Sequence[Any],
+    concurrency: int = 4,
+) -> AsyncIterator[Tuple[int, Any, Optional[BaseException]]]:
+    """
+    Runs `func` over `items` with at most `concurrency` calls in flight and yields
+    `(index, value, error)` in completion order. Exceptions are yielded, not raised.
+    Closing the iterator early cancels any calls still pending.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(index: int, item: Any):
+        async with semaphore:
+            try:
+                return index, await func(item), None
+            except Exception as e:
+                return index, None, e
+
+    tasks = [asyncio.ensure_future(run(i, item)) for i, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,135 @@
+import io
+import logging
+import mimetypes
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Union
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .cache import DerivativeCache
+from .inputs import InputFile
+from .raw_preview import RAW_EXTENSIONS, extract_largest_jpeg
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ImageSpec:
+    """Target size and encoding of the images a provider uploads."""
+    max_edge: int = 1024
+    quality: int = 85
+
+
+DEFAULT_IMAGE_SPEC = ImageSpec()
+
+
+def make_image_spec(max_edge: int, quality: int = ImageSpec.quality) -> Optional[ImageSpec]:
+    """The ImageSpec for a max-edge / JPEG-quality setting; `max_edge` 0 uploads images as-is."""
+    return ImageSpec(max_edge, quality) if max_edge > 0 else None
+
+
+def image_mime_type(image: Union[Path, InputFile]) -> str:
+    """MIME type to upload an image as, from its (possibly derived) file name."""
+    if image.suffix.lower() in (".jpg", ".jpeg"):
+        return "image/jpeg"
+    guessed, _ = mimetypes.guess_type(image.name)
+    return guessed if guessed and guessed.startswith("image/") else "image/jpeg"
+
+
+def extract_raw_preview(image: Union[Path, InputFile]) -> Union[Path, InputFile]:
+    """
+    TIFF-based RAW files (NEF, CR2, ARW, DNG, ...) are replaced by their largest
+    embedded JPEG preview, read through a memory map so the sensor data is never
+    touched. Anything else, and RAW files without a usable preview, is returned
+    unchanged.
+    """
+    if image.suffix.lower() not in RAW_EXTENSIONS:
+        return image
+
+    source = InputFile.coerce(image)
+    with source.buffer() as buf:
+        jpeg = extract_largest_jpeg(buf)
+        size = len(buf)
+
+    if jpeg is None:
+        logger.warning(f"No embedded JPEG preview found in {source.name}; sending the file as-is")
+        return image
+
+    logger.info(f"Using {len(jpeg)}-byte embedded preview of {source.name} ({size} bytes)")
+    return InputFile(data=jpeg, name=f"{source.stem}.jpg")
+
+
+def _encode(buf, spec: ImageSpec) -> Optional[bytes]:
+    """
+    Downscales and re-encodes an image to a JPEG within `spec`, or returns None
+    if it is already a JPEG that fits (re-encoding it would only lose quality).
+    """
+    with Image.open(io.BytesIO(buf)) as img:
+        if img.format == "JPEG" and max(img.size) <= spec.max_edge:
+            return None
+        # Let the JPEG decoder scale by 1/2..1/8 while decoding instead of decoding full size
+        img.draft("RGB", (spec.max_edge, spec.max_edge))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((spec.max_edge, spec.max_edge), Image.Resampling.LANCZOS)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=spec.quality, optimize=True)
+        return out.getvalue()
+
+
+def downscale_image(
+    image: Union[Path, InputFile],
+    spec: ImageSpec,
+    cache: Optional[DerivativeCache] = None,
+) -> Union[Path, InputFile]:
+    """
+    Returns `image` resized to fit `spec.max_edge` and re-encoded as JPEG at
+    `spec.quality`. Images that already fit, and files Pillow cannot read, are
+    returned unchanged. With a `cache`, derivatives are stored on disk keyed by
+    the source hash and `spec`, so repeated runs skip the decode entirely.
+    """
+    source = InputFile.coerce(image)
+    key = None
+    if cache is not None:
+        key = DerivativeCache.key(source.sha256(), max_edge=spec.max_edge, quality=spec.quality)
+        cached = cache.get(key)
+        if cached is not None:
+            return image if not cached else InputFile(data=cached, name=f"{source.stem}.jpg")
+
+    with source.buffer() as buf:
+        size = len(buf)
+        try:
+            derivative = _encode(buf, spec)
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+            logger.debug(f"Not downscaling {source.name}: {e}")
+            return image
+
+    if cache is not None:
+        # An empty entry records "already fits" so the next run doesn't decode it again
+        cache.put(key, derivative or b"")
+    if derivative is None:
+        return image
+
+    logger.info(f"Downscaled {source.name} from {size} to {len(derivative)} bytes")
+    return InputFile(data=derivative, name=f"{source.stem}.jpg")
+
+
+def prepare_image(
+    image: Union[Path, InputFile],
+    spec: Optional[ImageSpec] = None,
+    cache: Optional[DerivativeCache] = None,
+) -> Union[Path, InputFile]:
+    """
+    Turns an input image into what providers actually upload: the embedded
+    preview of a RAW file, then (with a `spec`) a downscaled derivative.
+    """
+    if isinstance(image, InputFile) and image.prepared:
+        return image
+    prepared = extract_raw_preview(image)
+    if spec is not None:
+        prepared = downscale_image(prepared, spec, cache)
+    if isinstance(prepared, InputFile) and prepared is not image:
+        prepared.prepared = True
+    return prepared
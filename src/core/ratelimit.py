@@ -0,0 +1,277 @@
+import asyncio
+import email.utils
+import logging
+import random
+import re
+import time
+from collections import deque
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+# Statuses that mean "slow down" rather than "this request is broken"
+THROTTLE_STATUSES = (429, 503)
+# A throttled call in errors that carry no status code (e.g. CLI stderr). 429 must stand
+# on its own, so file names like IMG_0429.jpg or IMG-429.jpg do not count
+THROTTLE_PATTERN = re.compile(
+    r"(?<![\w./\\-])429(?![\w./\\-])|\bRESOURCE_EXHAUSTED\b|\brate[ -]?limit(?:ed)?\b"
+    r"|\bquota exceeded\b|\bexceeded (?:your |the )?(?:current )?quota\b",
+    re.IGNORECASE,
+)
+
+T = TypeVar("T")
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class ThrottledError(RuntimeError):
+    """An upstream failure without a status code that was recognised as throttling."""
+    code = 429
+
+
+def is_throttle_message(message: str) -> bool:
+    """Whether an error message (e.g. CLI stderr) reports a rate limit or exhausted quota."""
+    return THROTTLE_PATTERN.search(message) is not None
+
+
+def throttle_info(error: BaseException) -> Tuple[bool, Optional[float]]:
+    """
+    Whether `error` is a rate-limit / overload response and, if the server said
+    so, how long to wait. Understands the status/headers of google-genai, OpenAI
+    and httpx errors, and falls back to the error message.
+    """
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if not isinstance(status, int):
+        return is_throttle_message(str(error)), None
+    if status not in THROTTLE_STATUSES:
+        return False, None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    return True, parse_retry_after(headers.get("retry-after"))
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter with an optional token bucket, shared by every call
+    to one upstream quota.
+
+    The allowed concurrency grows by about one per window of successful calls and
+    is multiplied by `decrease` on a throttled call (once per congestion event:
+    only calls sent after the last decrease can shrink it again). A throttled call
+    also pauses new calls for its Retry-After, or an exponential backoff, and is
+    retried up to `max_attempts` times. `requests_per_minute` additionally caps
+    the start rate.
+    """
+    def __init__(
+        self,
+        name: str,
+        max_limit: int = 8,
+        min_limit: int = 1,
+        requests_per_minute: Optional[float] = None,
+        decrease: float = 0.5,
+        max_attempts: int = 5,
+        base_delay: float = 2.0,
+        max_delay: float = 60.0,
+    ):
+        self.name = name
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.requests_per_minute = requests_per_minute
+        self.decrease = decrease
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._limit = float(max_limit)
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._resume_at = 0.0
+        self._decreased_at = 0.0
+        self._tokens = 1.0
+        self._refilled_at = time.monotonic()
+
+        self.succeeded = 0
+        self.throttled = 0
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, min(self.max_limit, int(self._limit)))
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "paused_for": round(max(0.0, self._resume_at - time.monotonic()), 3),
+            "succeeded": self.succeeded,
+            "throttled": self.throttled,
+        }
+
+    def _bind(self):
+        # asyncio futures belong to one loop; a new loop (asyncio.run per call) starts clean
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._waiters = deque()
+            self.in_flight = 0
+
+    def _wake(self):
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            # The slot is taken on the waiter's behalf so no newcomer can jump the queue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    async def acquire(self):
+        self._bind()
+        if self.in_flight < self.limit and not self.queue_depth:
+            self.in_flight += 1
+        else:
+            waiter = self._loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self.release()
+                raise
+        try:
+            await self._pace()
+        except asyncio.CancelledError:
+            self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    async def _pace(self):
+        # Holding a slot while paused keeps the rest of the queue paused as well
+        while True:
+            now = time.monotonic()
+            wait = self._resume_at - now
+            if wait <= 0 and self.requests_per_minute:
+                rate = self.requests_per_minute / 60.0
+                self._tokens = min(1.0, self._tokens + (now - self._refilled_at) * rate)
+                self._refilled_at = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / rate
+            elif wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def _on_success(self):
+        self.succeeded += 1
+        self._limit = min(float(self.max_limit), self._limit + 1.0 / max(self._limit, 1.0))
+        self._wake()
+
+    def _on_throttle(self, sent_at: float, attempt: int, retry_after: Optional[float]):
+        self.throttled += 1
+        if sent_at >= self._decreased_at:
+            self._limit = max(float(self.min_limit), self._limit * self.decrease)
+            self._decreased_at = time.monotonic()
+            logger.warning(f"{self.name} throttled, concurrency limit now {self.limit}")
+        if retry_after is None:
+            retry_after = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+        self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+
+    async def call(self, func: Callable[[], Awaitable[T]]) -> T:
+        """Runs `func()` within the limit, retrying it while it is throttled."""
+        attempt = 0
+        while True:
+            await self.acquire()
+            sent_at = time.monotonic()
+            try:
+                result = await func()
+            except Exception as e:
+                throttled, retry_after = throttle_info(e)
+                if not throttled:
+                    raise
+                self._on_throttle(sent_at, attempt, retry_after)
+                attempt += 1
+                if attempt >= self.max_attempts:
+                    raise
+                continue
+            finally:
+                self.release()
+            self._on_success()
+            return result
+
+    async def stream(self, open_stream: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Like `call` for a response stream: iterates `open_stream()` within the limit
+        and opens it again while it is throttled before its first item. Items that
+        were passed on cannot be taken back, so later errors are raised. A stream
+        closed by its consumer after the first item (e.g. once the answer is
+        complete) counts as a success.
+        """
+        attempt = 0
+        while True:
+            await self.acquire()
+            sent_at = time.monotonic()
+            started = False
+            try:
+                async with aclosing(open_stream()) as items:
+                    async for item in items:
+                        started = True
+                        yield item
+            except GeneratorExit:
+                if started:
+                    self._on_success()
+                raise
+            except Exception as e:
+                throttled, retry_after = throttle_info(e)
+                if not throttled:
+                    raise
+                self._on_throttle(sent_at, attempt, retry_after)
+                attempt += 1
+                if started or attempt >= self.max_attempts:
+                    raise
+                continue
+            finally:
+                self.release()
+            self._on_success()
+            return
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+def shared_limiter(name: str, max_limit: Optional[int] = None, **kwargs) -> AdaptiveLimiter:
+    """
+    The process-wide limiter for `name` (one per upstream quota), created on
+    first use. A `max_limit` given later replaces the configured ceiling.
+    """
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limiter = _limiters[name] = AdaptiveLimiter(name, max_limit=max_limit or 8, **kwargs)
+    elif max_limit:
+        limiter.max_limit = max_limit
+    return limiter
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Current limit, in-flight calls and queue depth of every shared limiter."""
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
@@ -0,0 +1,162 @@
+import logging
+import struct
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# TIFF-based RAW formats whose IFDs carry embedded JPEG previews
+RAW_EXTENSIONS = {".nef", ".nrw", ".cr2", ".arw", ".srf", ".sr2", ".dng", ".pef"}
+
+# TIFF tags we care about
+_TAG_COMPRESSION = 0x0103
+_TAG_STRIP_OFFSETS = 0x0111
+_TAG_STRIP_BYTE_COUNTS = 0x0117
+_TAG_SUB_IFDS = 0x014A
+_TAG_JPEG_OFFSET = 0x0201
+_TAG_JPEG_LENGTH = 0x0202
+_TAG_EXIF_IFD = 0x8769
+_WANTED_TAGS = {
+    _TAG_COMPRESSION, _TAG_STRIP_OFFSETS, _TAG_STRIP_BYTE_COUNTS,
+    _TAG_SUB_IFDS, _TAG_JPEG_OFFSET, _TAG_JPEG_LENGTH, _TAG_EXIF_IFD,
+}
+
+# TIFF field type -> (struct code, size in bytes)
+_TYPE_FORMATS = {1: ("B", 1), 3: ("H", 2), 4: ("I", 4), 7: ("B", 1), 9: ("i", 4), 13: ("I", 4)}
+
+# Baseline / extended / progressive DCT. Lossless JPEG (SOF3), as used for the raw
+# sensor data in CR2/DNG/NEF, is not a viewable preview.
+_VIEWABLE_SOF = {0xC0, 0xC1, 0xC2}
+_MAX_IFDS = 64
+
+
+class _TiffReader:
+    """Bounds-checked reads over a mapped TIFF file."""
+
+    def __init__(self, buf, byte_order: str):
+        self.buf = buf
+        self.byte_order = byte_order
+        self.size = len(buf)
+
+    def unpack(self, fmt: str, offset: int, count: int = 1) -> Tuple:
+        code = f"{self.byte_order}{count}{fmt}"
+        if offset < 0 or offset + struct.calcsize(code) > self.size:
+            raise ValueError("TIFF read out of bounds")
+        return struct.unpack_from(code, self.buf, offset)
+
+    def read_ifd(self, offset: int) -> Tuple[Dict[int, List[int]], int]:
+        """Returns the wanted tags of the IFD at `offset` and the offset of the next IFD."""
+        (entry_count,) = self.unpack("H", offset)
+        tags: Dict[int, List[int]] = {}
+        for i in range(entry_count):
+            entry = offset + 2 + i * 12
+            tag, field_type, count = self.unpack("HHI", entry)
+            if tag not in _WANTED_TAGS or field_type not in _TYPE_FORMATS or count == 0:
+                continue
+            fmt, size = _TYPE_FORMATS[field_type]
+            if count > 4096:
+                continue
+            value_offset = entry + 8
+            if size * count > 4:
+                (value_offset,) = self.unpack("I", entry + 8)
+            try:
+                tags[tag] = list(self.unpack(fmt, value_offset, count))
+            except ValueError:
+                continue
+        (next_offset,) = self.unpack("I", offset + 2 + entry_count * 12)
+        return tags, next_offset
+
+
+def _jpeg_dimensions(buf, offset: int, length: int) -> Optional[Tuple[int, int]]:
+    """
+    Returns (width, height) of a viewable JPEG at buf[offset:offset+length], or
+    None if it is not a JPEG or uses a non-viewable (e.g. lossless) encoding.
+    Only marker headers are read, not the image data.
+    """
+    end = offset + length
+    if length < 4 or end > len(buf) or buf[offset:offset + 2] != b"\xff\xd8":
+        return None
+    pos = offset + 2
+    while pos + 4 <= end:
+        if buf[pos] != 0xFF:
+            return None
+        marker = buf[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        (seg_len,) = struct.unpack_from(">H", buf, pos + 2)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if marker not in _VIEWABLE_SOF or pos + 9 > end:
+                return None
+            height, width = struct.unpack_from(">HH", buf, pos + 5)
+            return width, height
+        if marker in (0xDA, 0xD9):
+            return None
+        pos += 2 + seg_len
+    return None
+
+
+def find_embedded_jpegs(buf) -> List[Tuple[int, int, int, int]]:
+    """
+    Walks the IFD chain, SubIFDs and EXIF IFD of a TIFF-based RAW file and returns
+    every viewable embedded JPEG as (offset, length, width, height).
+    """
+    if len(buf) < 8:
+        return []
+    header = bytes(buf[:4])
+    if header == b"II*\x00":
+        reader = _TiffReader(buf, "<")
+    elif header == b"MM\x00*":
+        reader = _TiffReader(buf, ">")
+    else:
+        return []
+
+    (first_ifd,) = reader.unpack("I", 4)
+    pending = [first_ifd]
+    visited = set()
+    found = []
+
+    while pending and len(visited) < _MAX_IFDS:
+        offset = pending.pop()
+        if offset == 0 or offset in visited:
+            continue
+        visited.add(offset)
+        try:
+            tags, next_offset = reader.read_ifd(offset)
+        except ValueError:
+            continue
+
+        pending.append(next_offset)
+        pending.extend(tags.get(_TAG_SUB_IFDS, []))
+        pending.extend(tags.get(_TAG_EXIF_IFD, []))
+
+        candidates = []
+        if _TAG_JPEG_OFFSET in tags and _TAG_JPEG_LENGTH in tags:
+            candidates.append((tags[_TAG_JPEG_OFFSET][0], tags[_TAG_JPEG_LENGTH][0]))
+        strips = tags.get(_TAG_STRIP_OFFSETS, [])
+        counts = tags.get(_TAG_STRIP_BYTE_COUNTS, [])
+        if tags.get(_TAG_COMPRESSION, [0])[0] in (6, 7) and len(strips) == 1 and len(counts) == 1:
+            candidates.append((strips[0], counts[0]))
+
+        for jpeg_offset, jpeg_length in candidates:
+            dims = _jpeg_dimensions(buf, jpeg_offset, jpeg_length)
+            if dims:
+                found.append((jpeg_offset, jpeg_length, dims[0], dims[1]))
+
+    return found
+
+
+def extract_largest_jpeg(buf) -> Optional[bytes]:
+    """
+    Returns the largest (by pixel count) viewable JPEG preview embedded in a
+    TIFF-based RAW file, or None if there is none. Pass a memory-mapped file so
+    only the IFDs and the chosen preview are actually read from disk.
+    """
+    previews = find_embedded_jpegs(buf)
+    if not previews:
+        return None
+    offset, length, width, height = max(previews, key=lambda p: (p[2] * p[3], p[1]))
+    logger.debug(f"Using embedded {width}x{height} JPEG preview ({length} bytes)")
+    return bytes(buf[offset:offset + length])
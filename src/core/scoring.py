@@ -0,0 +1,160 @@
+import asyncio
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+from .inputs import InputFile
+from .preprocess import extract_raw_preview
+
+logger = logging.getLogger(__name__)
+
+# Longest edge frames are scored at, so focus scores are comparable across sizes
+SCORING_EDGE = 512
+# Batches up to this size are scored in threads; larger ones go to the process pool
+INLINE_BATCH = 4
+
+ImageLike = Union[Path, InputFile]
+
+
+@dataclass
+class CullThresholds:
+    """Limits beyond which a frame is rejected. A limit of None is not checked."""
+    min_focus: Optional[float] = 20.0
+    max_motion_blur: Optional[float] = 0.5
+    max_clipped_highlights: Optional[float] = 0.25
+    max_clipped_shadows: Optional[float] = 0.5
+
+
+@dataclass
+class FrameScore:
+    """
+    Local quality measurements of one frame.
+
+    - focus: variance of the Laplacian of the luma (higher is sharper)
+    - motion_blur: gradient anisotropy, 0 (isotropic) to 1 (smeared in one direction)
+    - clipped_highlights / clipped_shadows: share of pixels at pure white / black
+    """
+    focus: float = 0.0
+    motion_blur: float = 0.0
+    clipped_highlights: float = 0.0
+    clipped_shadows: float = 0.0
+    rejected: bool = False
+    reasons: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def measure(luma: np.ndarray) -> FrameScore:
+    """Scores a 2-D luma array with values in 0..255."""
+    luma = luma.astype(np.float32)
+    center = luma[1:-1, 1:-1]
+    laplacian = luma[:-2, 1:-1] + luma[2:, 1:-1] + luma[1:-1, :-2] + luma[1:-1, 2:] - 4 * center
+
+    # Structure tensor of the whole frame: blur along one direction removes the
+    # gradients along it, so the two eigenvalues drift apart
+    gx = luma[1:-1, 2:] - luma[1:-1, :-2]
+    gy = luma[2:, 1:-1] - luma[:-2, 1:-1]
+    jxx, jyy, jxy = float(np.sum(gx * gx)), float(np.sum(gy * gy)), float(np.sum(gx * gy))
+    spread = float(np.hypot((jxx - jyy) / 2, jxy))
+    total = jxx + jyy
+
+    return FrameScore(
+        focus=round(float(laplacian.var()), 2),
+        motion_blur=round(2 * spread / total, 4) if total > 0 else 0.0,
+        clipped_highlights=round(float(np.mean(luma >= 254)), 4),
+        clipped_shadows=round(float(np.mean(luma <= 1)), 4),
+    )
+
+
+def judge(score: FrameScore, thresholds: Optional[CullThresholds]) -> FrameScore:
+    """Sets `rejected` / `reasons` on `score` according to `thresholds`."""
+    if thresholds is None:
+        return score
+    checks = [
+        (thresholds.min_focus is not None and score.focus < thresholds.min_focus, "out of focus"),
+        (thresholds.max_motion_blur is not None and score.motion_blur > thresholds.max_motion_blur, "motion blur"),
+        (
+            thresholds.max_clipped_highlights is not None
+            and score.clipped_highlights > thresholds.max_clipped_highlights,
+            "clipped highlights",
+        ),
+        (
+            thresholds.max_clipped_shadows is not None and score.clipped_shadows > thresholds.max_clipped_shadows,
+            "clipped shadows",
+        ),
+    ]
+    score.reasons = [reason for failed, reason in checks if failed]
+    score.rejected = bool(score.reasons)
+    return score
+
+
+def score_image(image: ImageLike, thresholds: Optional[CullThresholds] = None) -> FrameScore:
+    """
+    Decodes `image` (RAW files via their embedded preview) at `SCORING_EDGE` and
+    scores it. Frames that cannot be decoded are rejected.
+    """
+    source = InputFile.coerce(extract_raw_preview(image))
+    try:
+        with source.buffer() as buf:
+            with Image.open(io.BytesIO(buf)) as img:
+                img.draft("L", (SCORING_EDGE, SCORING_EDGE))
+                img = img.convert("L")
+                img.thumbnail((SCORING_EDGE, SCORING_EDGE), Image.Resampling.BOX)
+                luma = np.asarray(img)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        logger.warning(f"Cannot score {source.name}: {e}")
+        return FrameScore(rejected=True, reasons=["unreadable"])
+    return judge(measure(luma), thresholds)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=int(os.environ.get("LIGHTROOM_SCORING_WORKERS", "0")) or None)
+    return _pool
+
+
+def shutdown_pool():
+    """Stops the scoring worker processes, if any were started."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def _picklable(image: ImageLike) -> ImageLike:
+    # Paths go to the workers as-is; in-memory / memory-mapped buffers are copied
+    if isinstance(image, InputFile) and image.path is None:
+        return InputFile(data=image.read_bytes(), name=image.name)
+    return image
+
+
+async def score_frame(
+    image: ImageLike, thresholds: Optional[CullThresholds] = None, use_pool: bool = True
+) -> FrameScore:
+    """Scores one frame in the shared process pool (or a thread with `use_pool=False`)."""
+    if not use_pool:
+        return await asyncio.to_thread(score_image, image, thresholds)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), score_image, _picklable(image), thresholds)
+
+
+async def score_frames(images: Sequence[ImageLike], thresholds: Optional[CullThresholds] = None) -> List[FrameScore]:
+    """Scores many frames, in input order, using the process pool for larger batches."""
+    use_pool = len(images) > INLINE_BATCH
+    scores = list(await asyncio.gather(*(score_frame(image, thresholds, use_pool) for image in images)))
+    rejected = sum(score.rejected for score in scores)
+    if rejected:
+        logger.info(f"Pre-cull rejected {rejected} of {len(scores)} frame(s)")
+    return scores
@@ -0,0 +1,198 @@
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+from pydantic import TypeAdapter
+
+from ..models import CRS_FIELD_MAPPING, SETTINGS_RANGES, LightroomResponse, LightroomSettings
+
+logger = logging.getLogger(__name__)
+
+# Column order of every SettingsBatch
+FIELDS = list(CRS_FIELD_MAPPING)
+FIELD_INDEX = {field: i for i, field in enumerate(FIELDS)}
+CRS_NAMES = [CRS_FIELD_MAPPING[field] for field in FIELDS]
+# Fields stored as floats; the rest are rounded back to int on the way out
+FLOAT_FIELDS = {"exposure"}
+_INT_COLUMNS = np.array([field not in FLOAT_FIELDS for field in FIELDS])
+_LOW = np.array([SETTINGS_RANGES[field][0] for field in FIELDS], dtype=np.float64)
+_HIGH = np.array([SETTINGS_RANGES[field][1] for field in FIELDS], dtype=np.float64)
+_SETTINGS_LIST = TypeAdapter(List[LightroomSettings])
+
+
+class SettingsBatch:
+    """
+    Many LightroomSettings as two (images x fields) arrays: `values` (float64, one
+    column per field in FIELDS order) and `mask` (True where the field is set).
+    Values under a False mask are meaningless and kept at 0.
+
+    Clamping, merging, diffing and statistics run column-wise in NumPy; building
+    LightroomSettings, dicts, JSON or crs payloads happens only at the edges.
+    """
+    def __init__(self, values: np.ndarray, mask: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        mask = np.asarray(mask, dtype=bool)
+        if values.ndim != 2 or values.shape[1] != len(FIELDS) or mask.shape != values.shape:
+            raise ValueError(f"Expected values and mask of shape (n, {len(FIELDS)}), got {values.shape} and {mask.shape}.")
+        self.values = np.where(mask, values, 0.0)
+        self.mask = mask
+
+    @classmethod
+    def empty(cls, count: int) -> "SettingsBatch":
+        """`count` images with no field set."""
+        shape = (count, len(FIELDS))
+        return cls(np.zeros(shape), np.zeros(shape, dtype=bool))
+
+    @classmethod
+    def from_dicts(cls, records: Iterable[Mapping[str, Any]], names: Sequence[str] = FIELDS) -> "SettingsBatch":
+        """
+        Builds a batch from dicts keyed by field name (or by `names`, one key per
+        column, e.g. CRS_NAMES). Missing and None values are unset, numeric strings
+        are accepted and other keys are ignored.
+        """
+        # One list per record and a single conversion; None becomes NaN, i.e. unset
+        rows = [[record.get(name) for name in names] for record in records]
+        values = np.array(rows, dtype=np.float64).reshape(len(rows), len(FIELDS))
+        mask = ~np.isnan(values)
+        return cls(values, mask)
+
+    @classmethod
+    def from_settings(cls, settings: Sequence[LightroomSettings]) -> "SettingsBatch":
+        # Attribute reads straight from the models, no model_dump per image
+        return cls.from_dicts(s.__dict__ for s in settings)
+
+    @classmethod
+    def from_crs(cls, payloads: Iterable[Mapping[str, Any]]) -> "SettingsBatch":
+        """Builds a batch from crs payloads (e.g. `settings_to_crs` output)."""
+        return cls.from_dicts(payloads, names=CRS_NAMES)
+
+    @classmethod
+    def from_json(cls, text: Union[str, bytes]) -> "SettingsBatch":
+        """Parses a JSON array of settings objects (as written by `to_json`)."""
+        return cls.from_dicts(json.loads(text))
+
+    @classmethod
+    def from_response(cls, response: LightroomResponse, image_count: int) -> "SettingsBatch":
+        """
+        One row per image of a multi-image response: `global_settings` broadcast to
+        every row, with the non-null fields of each `per_image_adjustments` entry
+        (1-based `image_index`) replacing them. Out-of-range indices are skipped.
+        """
+        base = cls.from_settings([response.global_settings] if response.global_settings else [])
+        if not len(base):
+            base = cls.empty(1)
+        batch = base.repeat(image_count)
+
+        adjustments = []
+        for adjustment in response.per_image_adjustments or []:
+            if not 1 <= adjustment.image_index <= image_count:
+                logger.warning(f"Ignoring per-image adjustment for out-of-range image_index {adjustment.image_index}")
+                continue
+            adjustments.append(adjustment)
+        if not adjustments:
+            return batch
+        overrides = cls.empty(image_count)
+        rows = np.array([adjustment.image_index - 1 for adjustment in adjustments])
+        given = cls.from_settings([adjustment.settings for adjustment in adjustments])
+        # Later entries for the same image win, like successive dict updates
+        for row, values, mask in zip(rows, given.values, given.mask):
+            overrides.values[row, mask] = values[mask]
+            overrides.mask[row] |= mask
+        return batch.merge(overrides)
+
+    def __len__(self) -> int:
+        return self.values.shape[0]
+
+    def __getitem__(self, rows) -> "SettingsBatch":
+        if isinstance(rows, (int, np.integer)):
+            rows = slice(rows, rows + 1 or None)
+        return SettingsBatch(self.values[rows], self.mask[rows])
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, SettingsBatch):
+            return NotImplemented
+        return np.array_equal(self.mask, other.mask) and np.array_equal(self.values, other.values)
+
+    def __repr__(self) -> str:
+        return f"SettingsBatch({len(self)} images, {int(self.mask.sum())} values set)"
+
+    def column(self, field: str) -> np.ma.MaskedArray:
+        """One field across the batch, with unset entries masked out."""
+        i = FIELD_INDEX[field]
+        return np.ma.MaskedArray(self.values[:, i], mask=~self.mask[:, i])
+
+    def repeat(self, count: int) -> "SettingsBatch":
+        """A single-image batch broadcast to `count` rows."""
+        if len(self) != 1:
+            raise ValueError(f"Only a single-image batch can be repeated, this one has {len(self)}.")
+        return SettingsBatch(np.repeat(self.values, count, axis=0), np.repeat(self.mask, count, axis=0))
+
+    def concat(self, *others: "SettingsBatch") -> "SettingsBatch":
+        batches = (self,) + others
+        return SettingsBatch(np.vstack([b.values for b in batches]), np.vstack([b.mask for b in batches]))
+
+    def out_of_range(self) -> np.ndarray:
+        """Boolean (images x fields) array of set values outside SETTINGS_RANGES."""
+        return self.mask & ((self.values < _LOW) | (self.values > _HIGH))
+
+    def clamp(self) -> "SettingsBatch":
+        """Set values clipped to their documented range (SETTINGS_RANGES), integer fields rounded."""
+        values = np.clip(self.values, _LOW, _HIGH)
+        values[:, _INT_COLUMNS] = np.round(values[:, _INT_COLUMNS])
+        return SettingsBatch(values, self.mask)
+
+    def merge(self, overrides: "SettingsBatch") -> "SettingsBatch":
+        """
+        This batch with every set value of `overrides` replacing its own. A
+        single-image `overrides` applies to every row.
+        """
+        mask = np.broadcast_to(overrides.mask, self.mask.shape)
+        values = np.where(mask, np.broadcast_to(overrides.values, self.values.shape), self.values)
+        return SettingsBatch(values, self.mask | mask)
+
+    def diff(self, current: "SettingsBatch", tolerance: float = 1e-6) -> "SettingsBatch":
+        """
+        The set values of this batch that differ from `current` by more than
+        `tolerance` or are unset there, row by row (like `crs_delta`).
+        """
+        changed = self.mask & (~current.mask | (np.abs(self.values - current.values) > tolerance))
+        return SettingsBatch(self.values, changed)
+
+    def mean(self) -> Dict[str, Optional[float]]:
+        """Mean of each field over the images that set it (None if none does)."""
+        counts = self.mask.sum(axis=0)
+        sums = self.values.sum(axis=0)
+        return {
+            field: float(sums[i] / counts[i]) if counts[i] else None
+            for i, field in enumerate(FIELDS)
+        }
+
+    def _records(self, names: Sequence[str]) -> List[Dict[str, Any]]:
+        # Plain Python numbers, ints for integer fields, built from two tolist() calls
+        values = np.where(_INT_COLUMNS, np.round(self.values), self.values).tolist()
+        ints = _INT_COLUMNS.tolist()
+        return [
+            {
+                name: (int(value) if is_int else value)
+                for name, value, is_set, is_int in zip(names, row, set_row, ints)
+                if is_set
+            }
+            for row, set_row in zip(values, self.mask.tolist())
+        ]
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """The set values of each image keyed by field name (like `model_dump(exclude_none=True)`)."""
+        return self._records(FIELDS)
+
+    def to_crs(self) -> List[Dict[str, Any]]:
+        """The set values of each image keyed by crs name (like `settings_to_crs`)."""
+        return self._records(CRS_NAMES)
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dicts(), separators=(",", ":"))
+
+    def to_settings(self) -> List[LightroomSettings]:
+        """One LightroomSettings per image, validated as one list in pydantic-core."""
+        return _SETTINGS_LIST.validate_python(self.to_dicts())
+
@@ -0,0 +1,237 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .file_index import SCHEMA as FILES_SCHEMA, primary_images
+from ..models import CRS_FIELD_MAPPING, LightroomSettings
+from ..xmp_utils import read_xmp_settings
+
+logger = logging.getLogger(__name__)
+
+# Settings fields stored as columns, queryable by field or crs name
+FIELDS = list(CRS_FIELD_MAPPING)
+_FIELD_NAMES = {**{field: field for field in FIELDS}, **{crs: field for field, crs in CRS_FIELD_MAPPING.items()}}
+OPERATORS = ("=", "!=", "<", "<=", ">", ">=")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sidecars (
+    path TEXT PRIMARY KEY,
+    image_path TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    readable INTEGER NOT NULL,
+    %s,
+    updated REAL NOT NULL
+)
+""" % ",\n    ".join(f"{field} {'REAL' if field == 'exposure' else 'INTEGER'}" for field in FIELDS)
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS sidecars_sha256 ON sidecars (sha256)",
+    "CREATE INDEX IF NOT EXISTS sidecars_image_path ON sidecars (image_path)",
+] + [f"CREATE INDEX IF NOT EXISTS sidecars_{field} ON sidecars ({field})" for field in FIELDS]
+
+Condition = Tuple[str, str, Any]
+
+
+@dataclass
+class ScannedSidecar:
+    """An XMP sidecar found by `scan_sidecars`, with its stat and image (if any)."""
+    path: Path
+    size: int
+    mtime_ns: int
+    image_path: Optional[Path] = None
+
+
+@dataclass
+class RefreshStats:
+    """What `SidecarCatalog.refresh` did: sidecars parsed, re-stamped, skipped, dropped."""
+    added: int = 0
+    updated: int = 0
+    touched: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    elapsed: float = 0.0
+
+
+def scan_sidecars(root: Union[str, Path]) -> Iterator[ScannedSidecar]:
+    """
+    Walks `root` recursively, in sorted order, and yields every `.xmp` file, paired
+    with the image of the same stem next to it (the RAW file of a RAW+JPEG pair,
+    as in `scan_images`). Hidden directories are skipped, like in `scan_images`.
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        images = primary_images(filenames)
+        for name in sorted(filenames):
+            if not name.lower().endswith(".xmp"):
+                continue
+            path = Path(dirpath) / name
+            try:
+                stat = path.stat()
+            except OSError as e:
+                logger.warning(f"Skipping {path}: {e}")
+                continue
+            image = images.get(path.stem.lower())
+            yield ScannedSidecar(path, stat.st_size, stat.st_mtime_ns, Path(dirpath) / image if image else None)
+
+
+def _column(name: str) -> str:
+    field = _FIELD_NAMES.get(name) or _FIELD_NAMES.get(name.lower())
+    if field is None:
+        raise ValueError(f"Unknown setting '{name}'; expected one of {', '.join(FIELDS)}.")
+    return field
+
+
+class SidecarCatalog:
+    """
+    SQLite catalog of XMP sidecars: path, stat, content hash and the parsed develop
+    values (one indexed column per LightroomSettings field).
+
+    `refresh` only reads files whose size or mtime changed and only parses those
+    whose hash changed, so keeping a large tree in sync is cheap and queries never
+    touch the sidecars themselves. It can share its database with the `process-dir`
+    FileIndex, which is what `unprocessed` joins against. Safe to use from worker
+    threads.
+    """
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(SCHEMA)
+        self.conn.execute(FILES_SCHEMA)
+        for statement in INDEXES:
+            self.conn.execute(statement)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self) -> "SidecarCatalog":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def refresh(self, root: Union[str, Path]) -> RefreshStats:
+        """
+        Brings the catalog in line with the sidecars under `root`: new and changed
+        files are (re)parsed, files whose mtime moved but whose hash did not are
+        re-stamped, and rows of deleted sidecars are dropped. All in one transaction.
+        """
+        root = Path(root).resolve()
+        prefix = os.path.join(str(root), "")
+        stats = RefreshStats()
+        started = time.perf_counter()
+
+        with self._lock:
+            known = {
+                row["path"]: row
+                for row in self.conn.execute("SELECT path, size, mtime_ns, sha256, image_path FROM sidecars")
+                if row["path"].startswith(prefix)
+            }
+            upserts, stamps = [], []
+            for sidecar in scan_sidecars(root):
+                path = str(sidecar.path)
+                image_path = str(sidecar.image_path) if sidecar.image_path else None
+                row = known.pop(path, None)
+                if row is not None and (row["size"], row["mtime_ns"], row["image_path"]) == \
+                        (sidecar.size, sidecar.mtime_ns, image_path):
+                    stats.unchanged += 1
+                    continue
+                try:
+                    data = sidecar.path.read_bytes()
+                except OSError as e:
+                    logger.warning(f"Skipping {path}: {e}")
+                    continue
+                sha256 = hashlib.sha256(data).hexdigest()
+                if row is not None and row["sha256"] == sha256:
+                    stamps.append((sidecar.size, sidecar.mtime_ns, image_path, time.time(), path))
+                    stats.touched += 1
+                    continue
+                settings = read_xmp_settings(data)
+                if settings is None:
+                    logger.warning(f"Could not read develop settings from {path}")
+                values = [getattr(settings, field) if settings else None for field in FIELDS]
+                upserts.append((path, image_path, sidecar.size, sidecar.mtime_ns, sha256,
+                                settings is not None, *values, time.time()))
+                if row is None:
+                    stats.added += 1
+                else:
+                    stats.updated += 1
+
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO sidecars (path, image_path, size, mtime_ns, sha256, readable, "
+                f"{', '.join(FIELDS)}, updated) VALUES ({', '.join('?' * (len(FIELDS) + 7))})",
+                upserts,
+            )
+            self.conn.executemany(
+                "UPDATE sidecars SET size = ?, mtime_ns = ?, image_path = ?, updated = ? WHERE path = ?", stamps
+            )
+            self.conn.executemany("DELETE FROM sidecars WHERE path = ?", [(path,) for path in known])
+            self.conn.commit()
+        stats.removed = len(known)
+        stats.elapsed = time.perf_counter() - started
+        logger.info(
+            f"Catalog refreshed in {stats.elapsed:.2f}s: {stats.added} added, {stats.updated} updated, "
+            f"{stats.touched} touched, {stats.unchanged} unchanged, {stats.removed} removed"
+        )
+        return stats
+
+    def find(self, conditions: Sequence[Condition] = (), unprocessed: bool = False) -> List[sqlite3.Row]:
+        """
+        Sidecars matching every `(setting, operator, value)` condition, e.g.
+        `("exposure", ">", 1.0)` or `("Exposure2012", ">", 1.0)`, ordered by path.
+        A condition on a setting never matches sidecars that leave it unset.
+        With `unprocessed`, only sidecars whose image is not marked done in the
+        FileIndex kept in the same database are returned.
+        """
+        clauses, params = [], []
+        for name, operator, value in conditions:
+            if operator not in OPERATORS:
+                raise ValueError(f"Unknown operator '{operator}'; expected one of {' '.join(OPERATORS)}.")
+            clauses.append(f"s.{_column(name)} {operator} ?")
+            params.append(value)
+        query = "SELECT s.* FROM sidecars s"
+        if unprocessed:
+            query += " LEFT JOIN files f ON f.path = s.image_path AND f.status = 'done'"
+            clauses.append("f.path IS NULL")
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            return self.conn.execute(query + " ORDER BY s.path", params).fetchall()
+
+    def unprocessed(self) -> List[sqlite3.Row]:
+        """Sidecars whose image `process-dir` has not finished (or that have no image)."""
+        return self.find(unprocessed=True)
+
+    def get(self, path: Union[str, Path]) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self.conn.execute("SELECT * FROM sidecars WHERE path = ?", (str(path),)).fetchone()
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM sidecars").fetchone()[0]
+
+
+def row_settings(row: sqlite3.Row) -> LightroomSettings:
+    """The LightroomSettings stored in a catalog row."""
+    return LightroomSettings(**{field: row[field] for field in FIELDS if row[field] is not None})
+
+
+def row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "path": row["path"],
+        "image": row["image_path"],
+        "settings": row_settings(row).model_dump(exclude_none=True),
+    }
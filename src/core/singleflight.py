@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Flight:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one.
+
+    The first caller of a key starts `func()` as a task; callers arriving while
+    it runs await the same task and get its result or exception. A caller that
+    is cancelled only stops waiting; the call itself is cancelled once its last
+    waiter has left. Nothing is kept after the call finishes.
+    """
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._flights), "started": self.started, "coalesced": self.coalesced}
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(func()))
+            flight.task.add_done_callback(lambda _, flight=flight: self._forget(key, flight))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            logger.info(f"Joining in-flight request {key[:12]} ({flight.waiters} waiting)")
+
+        flight.waiters += 1
+        try:
+            # Shielded so one waiter's cancellation does not cancel the shared call
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                logger.info(f"Last waiter left, cancelling request {key[:12]}")
+                self._forget(key, flight)
+                flight.task.cancel()
@@ -0,0 +1,105 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from ..models import LightroomSettings
+from ..xmp_utils import generate_xmp, splice_xmp, write_xmp
+
+logger = logging.getLogger(__name__)
+
+# Sidecars handed to a worker per task, so inter-process overhead is paid per chunk
+CHUNK_SIZE = 64
+
+PathLike = Union[str, Path]
+# (sidecar to write, settings, sidecar to start from if not the target itself)
+WriteJob = Tuple[PathLike, LightroomSettings, Optional[PathLike]]
+
+
+def rewrite_sidecar(target: PathLike, settings: LightroomSettings, source: Optional[PathLike] = None) -> bool:
+    """
+    Applies `settings` to the sidecar at `source` (default: `target`) with an
+    in-place crs splice and writes the result atomically to `target`. A missing
+    sidecar is generated from scratch. Returns False if nothing had to change.
+    """
+    target = Path(target)
+    source = Path(source) if source is not None else target
+    if source.exists():
+        original = source.read_text(encoding="utf-8")
+        content = splice_xmp(original, settings)
+        if content is None:
+            content = generate_xmp(settings, original)
+        if content == original and source == target:
+            return False
+    else:
+        content = generate_xmp(settings)
+    write_xmp(target, content)
+    return True
+
+
+def _rewrite_chunk(jobs: Sequence[Tuple[str, Dict[str, Any], Optional[str]]]) -> List[Tuple[str, Optional[str]]]:
+    # Runs in a worker process: settings travel as plain dicts, outcomes come back per file
+    outcomes = []
+    for target, values, source in jobs:
+        try:
+            changed = rewrite_sidecar(target, LightroomSettings(**values), source)
+            outcomes.append(("written" if changed else "unchanged", None))
+        except Exception as e:
+            outcomes.append(("failed", f"{type(e).__name__}: {e}"))
+    return outcomes
+
+
+@dataclass
+class BulkWriteResult:
+    """Outcome of `bulk_write_xmp`: counts, per-file errors and throughput."""
+    written: int = 0
+    unchanged: int = 0
+    errors: Dict[str, str] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        total = self.written + self.unchanged + len(self.errors)
+        return total / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def bulk_write_xmp(
+    jobs: Iterable[WriteJob], workers: Optional[int] = None, chunk_size: int = CHUNK_SIZE
+) -> BulkWriteResult:
+    """
+    Applies many settings to many sidecars (see `rewrite_sidecar`) across a process
+    pool of `workers` (default: one per CPU). Small batches and `workers=1` run in
+    this process. A failing file is reported in `errors` and does not stop the rest.
+    """
+    items = [
+        (str(target), settings.model_dump(exclude_none=True), str(source) if source is not None else None)
+        for target, settings, source in jobs
+    ]
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+
+    started = time.perf_counter()
+    if workers == 1 or len(chunks) <= 1:
+        outcomes = [_rewrite_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            outcomes = list(pool.map(_rewrite_chunk, chunks))
+
+    result = BulkWriteResult(elapsed=time.perf_counter() - started)
+    for chunk, chunk_outcomes in zip(chunks, outcomes):
+        for (target, _, _), (status, error) in zip(chunk, chunk_outcomes):
+            if status == "written":
+                result.written += 1
+            elif status == "unchanged":
+                result.unchanged += 1
+            else:
+                result.errors[target] = error
+                logger.warning(f"Failed to write {target}: {error}")
+    logger.info(
+        f"Wrote {result.written} sidecar(s), {result.unchanged} unchanged, {len(result.errors)} failed "
+        f"in {result.elapsed:.2f}s ({result.files_per_second:.0f} files/s)"
+    )
+    return result
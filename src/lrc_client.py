@@ -1,37 +1,80 @@
 import os
 import time
 import base64
+import asyncio
 import httpx
 import logging
-from typing import Any, Dict, Optional, List
+from typing import Any, AsyncIterator, Dict, Optional, List, Tuple
 from pathlib import Path
 
-from .models import LightroomSettings
+from .models import LightroomSettings, settings_to_crs
 
 logger = logging.getLogger(__name__)
 
 BROKER_URL = os.environ.get("LRC_BROKER_URL", "http://127.0.0.1:8085")
+# Prefix of the per-photo outcome of a write the broker rejected or never answered
+APPLY_FAILED = "failed: "
+
+def crs_delta(desired: Dict[str, Any], current: Dict[str, Any], tolerance: float = 1e-6) -> Dict[str, Any]:
+    """
+    Returns the entries of `desired` that differ from `current`.
+    Numeric values are compared as floats within `tolerance`, so "0.50" == 0.5
+    and Lightroom's float-typed sliders match our integer fields.
+    """
+    delta = {}
+    for key, val in desired.items():
+        cur = current.get(key)
+        if cur is None:
+            delta[key] = val
+            continue
+        try:
+            if abs(float(val) - float(cur)) <= tolerance:
+                continue
+        except (TypeError, ValueError):
+            if str(val) == str(cur):
+                continue
+        delta[key] = val
+    return delta
 
 class LightroomMCPClient:
     """
     Client for interacting with the Lightroom MCP Broker.
     Provides methods to fetch current selection, get image previews,
     and apply new develop settings.
+
+    Connections to the broker are kept alive in a bounded pool; use the client
+    as an async context manager (or call `aclose`) to release them.
     """
     
-    def __init__(self, broker_url: str = BROKER_URL):
+    def __init__(self, broker_url: str = BROKER_URL, max_connections: int = 8, timeout: float = 30.0):
         self.broker_url = broker_url
         self._request_id = 0
-        self.client = httpx.AsyncClient(timeout=30.0)
-        
-    async def send_command(self, method: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        self._batch_supported = True
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def __aenter__(self) -> "LightroomMCPClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def _make_request(self, method: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         self._request_id += 1
-        request = {
+        return {
             "jsonrpc": "2.0",
             "method": method,
             "params": params or {},
             "id": self._request_id
         }
+        
+    async def send_command(self, method: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        request = self._make_request(method, params)
 
         try:
             response = await self.client.post(
@@ -44,6 +87,40 @@ class LightroomMCPClient:
             logger.error(f"Failed to communicate with Lightroom Broker: {e}")
             raise e
 
+    async def send_batch(self, calls: List[Tuple[str, Optional[Dict[str, Any]]]]) -> List[Any]:
+        """
+        Send several commands in one round-trip as a JSON-RPC 2.0 batch array.
+        Returns one response object per call, in call order. Brokers that do not
+        accept batch arrays are detected on first use; calls are then sent
+        individually (concurrently) over the pooled connection.
+        """
+        if not calls:
+            return []
+
+        if self._batch_supported:
+            requests = [self._make_request(method, params) for method, params in calls]
+            try:
+                response = await self.client.post(f"{self.broker_url}/request", json=requests)
+                if response.status_code >= 500:
+                    response.raise_for_status()
+                # A broker without batch support rejects the array (4xx) or answers with a single error object
+                body = response.json() if response.is_success else None
+            except Exception as e:
+                logger.error(f"Failed to communicate with Lightroom Broker: {e}")
+                raise e
+
+            if isinstance(body, list):
+                by_id = {item.get("id"): item for item in body if isinstance(item, dict)}
+                return [
+                    by_id.get(req["id"], {"error": {"message": "Missing response in batch"}})
+                    for req in requests
+                ]
+
+            logger.info("Lightroom Broker does not support JSON-RPC batches; falling back to single calls")
+            self._batch_supported = False
+
+        return list(await asyncio.gather(*(self.send_command(method, params) for method, params in calls)))
+
     async def get_selected_photos(self) -> List[Dict[str, Any]]:
         """Return metadata for currently selected photos."""
         res = await self.send_command("get_selection")
@@ -52,6 +129,15 @@ class LightroomMCPClient:
             return result["photos"]
         return []
 
+    @staticmethod
+    def _decode_preview(res: Dict[str, Any]) -> Optional[bytes]:
+        result = res.get("result") or {}
+        if "photos" in result and len(result["photos"]) > 0:
+            b64_str = result["photos"][0].get("jpegBase64")
+            if b64_str:
+                return base64.b64decode(b64_str)
+        return None
+
     async def get_photo_preview(self, photo_id: Optional[str] = None) -> Optional[bytes]:
         """Fetch a JPEG preview of a photo. Defaults to current selection."""
         params = {"width": 1024, "height": 1024}
@@ -59,40 +145,124 @@ class LightroomMCPClient:
             params["photo_id"] = photo_id
             
         res = await self.send_command("get_photo_preview", params)
-        result = res.get("result", {})
-        if "photos" in result and len(result["photos"]) > 0:
-            b64_str = result["photos"][0].get("jpegBase64")
-            if b64_str:
-                return base64.b64decode(b64_str)
-        return None
+        return self._decode_preview(res)
+
+    async def iter_photo_previews(
+        self,
+        photo_ids: List[str],
+        chunk_size: int = 8,
+        concurrency: int = 4,
+    ) -> AsyncIterator[Tuple[str, Optional[bytes]]]:
+        """
+        Fetch JPEG previews for many photos, yielding `(photo_id, jpeg_bytes)` as
+        responses arrive (not in input order). Ids are sent `chunk_size` at a time
+        as JSON-RPC batches with up to `concurrency` batches in flight. A photo
+        whose preview is unavailable yields None.
+        """
+        chunks = [photo_ids[i:i + chunk_size] for i in range(0, len(photo_ids), chunk_size)]
+        semaphore = asyncio.Semaphore(max(1, concurrency))
 
-    async def apply_develop_settings(self, settings: LightroomSettings) -> str:
-        """Apply a LightroomSettings object directly to Lightroom."""
+        async def fetch(chunk: List[str]) -> List[Tuple[str, Optional[bytes]]]:
+            async with semaphore:
+                responses = await self.send_batch([
+                    ("get_photo_preview", {"width": 1024, "height": 1024, "photo_id": photo_id})
+                    for photo_id in chunk
+                ])
+            return [(photo_id, self._decode_preview(res)) for photo_id, res in zip(chunk, responses)]
+
+        tasks = [asyncio.ensure_future(fetch(chunk)) for chunk in chunks]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                for item in await next_done:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def apply_develop_settings(self, settings: LightroomSettings, photo_id: Optional[str] = None) -> str:
+        """Apply a LightroomSettings object directly to Lightroom. Defaults to current selection."""
         # Convert our model names to Lightroom SDK parameter names
-        mapping = {
-            "exposure": "Exposure2012",
-            "contrast": "Contrast2012",
-            "highlights": "Highlights2012",
-            "shadows": "Shadows2012",
-            "whites": "Whites2012",
-            "blacks": "Blacks2012",
-            "texture": "Texture",
-            "clarity": "Clarity2012",
-            "dehaze": "Dehaze",
-            "vibrance": "Vibrance",
-            "saturation": "Saturation",
-            "color_temp": "Temperature",
-            "tint": "Tint",
-        }
-        
-        lrc_settings = {}
-        for field, crs_attr in mapping.items():
-            val = getattr(settings, field)
-            if val is not None:
-                lrc_settings[crs_attr] = val
+        lrc_settings = settings_to_crs(settings)
                 
         if not lrc_settings:
             return "No settings to apply"
 
-        res = await self.send_command("set_develop_settings", {"settings": lrc_settings})
+        params: Dict[str, Any] = {"settings": lrc_settings}
+        if photo_id:
+            params["photo_id"] = photo_id
+
+        res = await self.send_command("set_develop_settings", params)
         return str(res.get("result", res))
+
+    @staticmethod
+    def _extract_develop_settings(res: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        result = res.get("result") or {}
+        if isinstance(result.get("settings"), dict):
+            return result["settings"]
+        photos = result.get("photos") or []
+        if photos:
+            return photos[0].get("settings") or photos[0].get("developSettings")
+        return None
+
+    async def get_develop_settings_bulk(self, photo_ids: List[str], chunk_size: int = 50) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch the current develop settings of many photos, `chunk_size` per JSON-RPC batch.
+        Photos the broker returns nothing for are omitted from the result.
+        """
+        current: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(photo_ids), chunk_size):
+            chunk = photo_ids[start:start + chunk_size]
+            responses = await self.send_batch([("get_develop_settings", {"photo_id": photo_id}) for photo_id in chunk])
+            for photo_id, res in zip(chunk, responses):
+                settings = self._extract_develop_settings(res)
+                if settings is not None:
+                    current[photo_id] = settings
+        return current
+
+    async def apply_develop_settings_bulk(
+        self,
+        items: List[Tuple[str, LightroomSettings]],
+        current: Optional[Dict[str, Dict[str, Any]]] = None,
+        chunk_size: int = 50,
+    ) -> Dict[str, str]:
+        """
+        Apply settings to many photos, sending only the crs keys that change.
+
+        Args:
+            items: (photo_id, settings) pairs.
+            current: Current develop values per photo id. Fetched in bulk if omitted.
+            chunk_size: Max set_develop_settings calls per JSON-RPC batch.
+
+        Returns:
+            Per photo id: "unchanged" when already up to date, "failed: <message>"
+            (APPLY_FAILED) when the broker returned an error or no response for
+            that photo, otherwise the broker's result.
+        """
+        if current is None:
+            current = await self.get_develop_settings_bulk([photo_id for photo_id, _ in items], chunk_size)
+
+        outcome: Dict[str, str] = {}
+        calls: List[Tuple[str, Dict[str, Any]]] = []
+        call_ids: List[str] = []
+        for photo_id, settings in items:
+            delta = crs_delta(settings_to_crs(settings), current.get(photo_id) or {})
+            if not delta:
+                outcome[photo_id] = "unchanged"
+                continue
+            calls.append(("set_develop_settings", {"settings": delta, "photo_id": photo_id}))
+            call_ids.append(photo_id)
+
+        logger.info(f"Applying develop settings to {len(calls)} photo(s); {len(items) - len(calls)} already up to date")
+
+        for start in range(0, len(calls), chunk_size):
+            responses = await self.send_batch(calls[start:start + chunk_size])
+            for photo_id, res in zip(call_ids[start:start + chunk_size], responses):
+                if "error" in res or "result" not in res:
+                    error = res.get("error") or "no result in response"
+                    message = error.get("message", error) if isinstance(error, dict) else error
+                    logger.error(f"Failed to apply develop settings to photo {photo_id}: {message}")
+                    outcome[photo_id] = f"{APPLY_FAILED}{message}"
+                else:
+                    outcome[photo_id] = str(res["result"])
+
+        return outcome
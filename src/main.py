@@ -1,21 +1,148 @@
 import os
+import json
+import asyncio
 import shutil
 import tempfile
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Header, Form
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Header, Form, Query
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from pydantic import BaseModel
 
 from .models import LightroomSettings
+from .core.bursts import DEFAULT_BURST_GAP, plan_batch, representative
+from .core.inputs import InputFile
+from .core.jobs import JobItem, JobManager
+from .core.pipeline import iter_completed
+from .core.preprocess import ImageSpec, make_image_spec
+from .core.ratelimit import limiter_stats
+from .core.scoring import CullThresholds, shutdown_pool
+from .xmp_utils import generate_xmp
 from .providers.gemini_cli import GeminiCLIProvider
-
-app = FastAPI(title="Lightroom AI Settings Service")
+from .providers.cached_provider import with_cache
+from .providers.coalescing_provider import with_coalescing
+from .providers.prompts import MAX_BATCH_SIZE
 
 # Currently hardcoded to use Gemini CLI
 # This can be made dynamic via injection or configuration
-provider = GeminiCLIProvider(cli_path=os.environ.get("GEMINI_CLI_PATH", "gemini"))
+# GEMINI_CLI_POOL_SIZE > 0 keeps that many pre-spawned CLI workers fed over stdin
+# LIGHTROOM_MAX_EDGE / LIGHTROOM_JPEG_QUALITY set the upload size (max edge 0 sends images as-is)
+provider = GeminiCLIProvider(
+    cli_path=os.environ.get("GEMINI_CLI_PATH", "gemini"),
+    pool_size=int(os.environ.get("GEMINI_CLI_POOL_SIZE", "0")),
+    image_spec=make_image_spec(
+        int(os.environ.get("LIGHTROOM_MAX_EDGE", ImageSpec.max_edge)),
+        int(os.environ.get("LIGHTROOM_JPEG_QUALITY", ImageSpec.quality)),
+    ),
+)
+# Set LIGHTROOM_CACHE_DIR to reuse results for identical image + XMP requests
+provider = with_cache(provider, os.environ.get("LIGHTROOM_CACHE_DIR"))
+# Identical requests in flight at the same time (plugin retries, duplicate uploads) share one call
+provider = with_coalescing(provider)
+
+async def _process(image_path: Path, xmp_path: Optional[Path] = None) -> LightroomSettings:
+    # Resolve the module-level provider at call time so it can be swapped (e.g. in tests)
+    return await provider.process(image_path, xmp_path)
+
+async def _process_batch(image_paths: List[Path], xmp_paths: List[Optional[Path]]) -> List[LightroomSettings]:
+    # One provider request for the whole group (JobManager sizes the groups)
+    return await provider.process_batch(image_paths, xmp_paths, batch_size=len(image_paths), concurrency=1)
+
+# Accept values for which /analyze answers with an XMP sidecar instead of JSON
+XMP_MEDIA_TYPES = ("application/rdf+xml", "text/xml", "application/xmp")
+
+# Requests with a larger body are rejected with 413 before the upload is read
+MAX_UPLOAD_BYTES = int(float(os.environ.get("LIGHTROOM_MAX_UPLOAD_MB", "100")) * 1024 * 1024)
+
+# Max provider calls in flight per /analyze/stream request
+STREAM_CONCURRENCY = int(os.environ.get("LIGHTROOM_STREAM_CONCURRENCY", "4"))
+
+# Background workers for POST /jobs
+job_manager = JobManager(
+    _process,
+    concurrency=int(os.environ.get("LIGHTROOM_JOB_CONCURRENCY", "4")),
+    ttl=float(os.environ.get("LIGHTROOM_JOB_TTL", "3600")),
+    batch_fn=_process_batch,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_manager.start()
+    yield
+    await job_manager.stop()
+    await provider.aclose()
+    shutdown_pool()
+
+app = FastAPI(title="Lightroom AI Settings Service", lifespan=lifespan)
+
+class _BodyTooLarge(Exception):
+    pass
+
+class MaxBodySizeMiddleware:
+    """
+    Rejects request bodies over `max_bytes` with 413. The Content-Length header is
+    checked before anything is read; bodies without one (chunked) are counted as
+    they stream in and cut off once over the limit.
+    """
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            return await self._reject(send)
+
+        received = 0
+        too_large = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, too_large
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    too_large = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            # The app may catch _BodyTooLarge (form parsing turns it into a 400);
+            # whatever it answers then is replaced by the 413
+            if too_large and not response_started:
+                response_started = True
+                await self._reject(send)
+            if too_large:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except _BodyTooLarge:
+            pass
+        if too_large and not response_started:
+            await self._reject(send)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": f"Upload exceeds the {self.max_bytes} byte limit"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+app.add_middleware(MaxBodySizeMiddleware, max_bytes=MAX_UPLOAD_BYTES)
 
 @app.post("/analyze", response_model=LightroomSettings)
 async def analyze_image(
@@ -27,43 +154,266 @@ async def analyze_image(
     Analyze an uploaded image (and optional XMP sidecar), returning suggested Lightroom settings.
     By default returns JSON, but can return `.xmp` if Accept header is 'application/rdf+xml'.
     """
-    # Create temp directory for incoming files
-    with tempfile.TemporaryDirectory() as tempdir:
-        temp_dir_path = Path(tempdir)
+    # Hand the spooled uploads to the provider as-is (in-memory or memory-mapped),
+    # without copying them into temp files
+    image_input = InputFile.from_upload(image.file, image.filename or "image.jpg")
+    xmp_input = InputFile.from_upload(xmp.file, xmp.filename or "settings.xmp") if xmp else None
+    xmp_content = xmp_input.read_text() if xmp_input else None
+
+    try:
+        settings: LightroomSettings = await provider.process(image_input, xmp_input)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Provider failed: {str(e)}")
+    finally:
+        # Release the views so the spooled files can be closed after the response
+        image_input.release()
+        if xmp_input:
+            xmp_input.release()
+        
+    # Handle content negotiation
+    if accept in XMP_MEDIA_TYPES:
+        # Generate XMP output
+        xmp_str = generate_xmp(settings, xmp_content)
         
-        # Save image
-        image_ext = Path(image.filename).suffix if image.filename else ".jpg"
-        image_path = temp_dir_path / f"image{image_ext}"
+        from fastapi.responses import Response
+        return Response(
+            content=xmp_str,
+            media_type="application/rdf+xml",
+            headers={"Content-Disposition": "attachment; filename=suggested_settings.xmp"}
+        )
+        
+    # Default behavior is JSON response
+    return JSONResponse(content=settings.model_dump())
+
+def _save_uploads(
+    images: List[UploadFile], xmps: Optional[List[UploadFile]], target_dir: Path
+) -> List[Tuple[str, Path, Optional[Path]]]:
+    """
+    Writes uploaded images and sidecars to `target_dir` and pairs them up.
+    A sidecar belongs to the image with the same file stem; if no names match
+    and the counts are equal, they are paired by position.
+    Returns (original filename, image path, xmp path or None) per image.
+    """
+    xmp_paths = {}
+    ordered_xmps = []
+    for i, xmp in enumerate(xmps or []):
+        xmp_path = target_dir / f"{i}.xmp"
+        with xmp_path.open("wb") as buffer:
+            shutil.copyfileobj(xmp.file, buffer)
+        if xmp.filename:
+            xmp_paths[Path(xmp.filename).stem] = xmp_path
+        ordered_xmps.append(xmp_path)
+
+    by_position = len(ordered_xmps) == len(images) and not any(
+        Path(image.filename or "").stem in xmp_paths for image in images
+    )
+
+    saved = []
+    for i, image in enumerate(images):
+        filename = image.filename or f"image{i}.jpg"
+        image_path = target_dir / f"{i}{Path(filename).suffix or '.jpg'}"
         with image_path.open("wb") as buffer:
             shutil.copyfileobj(image.file, buffer)
-            
-        # Save XMP if provided
-        xmp_path = None
-        if xmp:
-            xmp_path = temp_dir_path / "settings.xmp"
-            with xmp_path.open("wb") as buffer:
-                shutil.copyfileobj(xmp.file, buffer)
-                
+        xmp_path = ordered_xmps[i] if by_position else xmp_paths.get(Path(filename).stem)
+        saved.append((filename, image_path, xmp_path))
+    return saved
+
+def _cull_thresholds(
+    cull: bool,
+    min_focus: Optional[float],
+    max_motion_blur: Optional[float],
+    max_clipped_highlights: Optional[float],
+    max_clipped_shadows: Optional[float],
+) -> Optional[CullThresholds]:
+    """Pre-cull limits for a batch request: None unless `cull`, defaults for unset limits."""
+    if not cull:
+        return None
+    overrides = {
+        "min_focus": min_focus,
+        "max_motion_blur": max_motion_blur,
+        "max_clipped_highlights": max_clipped_highlights,
+        "max_clipped_shadows": max_clipped_shadows,
+    }
+    return CullThresholds(**{name: value for name, value in overrides.items() if value is not None})
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    images: List[UploadFile] = File(...),
+    xmps: Optional[List[UploadFile]] = File(None),
+    burst_threshold: Optional[int] = Form(None),
+    burst_gap: float = Form(DEFAULT_BURST_GAP),
+    cull: bool = Form(False),
+    min_focus: Optional[float] = Form(None),
+    max_motion_blur: Optional[float] = Form(None),
+    max_clipped_highlights: Optional[float] = Form(None),
+    max_clipped_shadows: Optional[float] = Form(None),
+    batch_size: int = Form(MAX_BATCH_SIZE),
+):
+    """
+    Queue one or many images (with optional XMP sidecars) for background analysis.
+    Returns a job id immediately; poll `GET /jobs/{job_id}` for progress and results.
+    With `burst_threshold`, near-identical frames are analyzed once per burst.
+    With `cull`, frames are scored locally first and rejects are not analyzed.
+    Images are sent `batch_size` (1-4) at a time in one provider request each.
+    """
+    if not 1 <= batch_size <= MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"batch_size must be between 1 and {MAX_BATCH_SIZE}")
+    work_dir = Path(tempfile.mkdtemp(prefix="lightroom_job_"))
+    try:
+        # Copying large uploads to disk must not stall other requests on the event loop
+        saved = await asyncio.to_thread(_save_uploads, images, xmps, work_dir)
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+    items = [
+        JobItem(index=i, filename=filename, image_path=image_path, xmp_path=xmp_path)
+        for i, (filename, image_path, xmp_path) in enumerate(saved)
+    ]
+    thresholds = _cull_thresholds(cull, min_focus, max_motion_blur, max_clipped_highlights, max_clipped_shadows)
+    scores, clusters = await plan_batch(
+        [image_path for _, image_path, _ in saved], thresholds, burst_threshold, burst_gap
+    )
+    for item, score in zip(items, scores):
+        if score is not None:
+            item.score = score.to_dict()
+            if score.rejected:
+                item.status = "rejected"
+    job = job_manager.submit(items, work_dir, clusters, batch_size)
+    return {"job_id": job.id, "status": job.status, "total": len(items)}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status of a job and the settings (or error) of each finished image."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found or expired")
+    return job.to_dict()
+
+@app.post("/analyze/partial")
+async def analyze_partial(
+    image: UploadFile = File(...),
+    xmp: Optional[UploadFile] = File(None),
+    accept: str = Header(default="application/x-ndjson")
+):
+    """
+    Analyze one image and stream its settings while the model is still answering.
+
+    Each event carries the `settings` received so far (null fields omitted) and the
+    names of the `fields` it added; the last event has `done: true` and the full
+    settings, or an `error`. Sent as NDJSON, or as Server-Sent Events if Accept is
+    'text/event-stream'.
+    """
+    # Read up front: the upload is closed once this handler returns, before the stream ends
+    image_input = InputFile(data=await image.read(), name=image.filename or "image.jpg")
+    xmp_input = InputFile(data=await xmp.read(), name=xmp.filename or "settings.xmp") if xmp else None
+    use_sse = "text/event-stream" in accept
+
+    def encode(event: dict, kind: str) -> str:
+        data = json.dumps(event)
+        return f"event: {kind}\ndata: {data}\n\n" if use_sse else data + "\n"
+
+    async def events():
+        seen: set = set()
+        settings = None
         try:
-            settings: LightroomSettings = await provider.process(image_path, xmp_path)
+            async for settings in provider.stream(image_input, xmp_input):
+                values = settings.model_dump(exclude_none=True)
+                yield encode({"settings": values, "fields": [f for f in values if f not in seen]}, "partial")
+                seen.update(values)
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Provider failed: {str(e)}")
-            
-        # Handle content negotiation
-        if accept == "application/rdf+xml" or accept == "text/xml" or accept == "application/xmp":
-            # Generate XMP output
-            from .xmp_utils import generate_xmp
-            xmp_str = generate_xmp(settings, xmp_path.read_text() if xmp_path else None)
-            
-            from fastapi.responses import Response
-            return Response(
-                content=xmp_str,
-                media_type="application/rdf+xml",
-                headers={"Content-Disposition": "attachment; filename=suggested_settings.xmp"}
+            yield encode({"done": True, "error": f"Provider failed: {e}"}, "error")
+            return
+        yield encode({"done": True, "settings": settings.model_dump()}, "result")
+
+    media_type = "text/event-stream" if use_sse else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type)
+
+@app.get("/limits")
+async def get_limits():
+    """Current concurrency limit, in-flight calls and queue depth of each upstream quota."""
+    return limiter_stats()
+
+@app.post("/analyze/stream")
+async def analyze_stream(
+    images: List[UploadFile] = File(...),
+    xmps: Optional[List[UploadFile]] = File(None),
+    output_format: str = Query("json", alias="format", pattern="^(json|xmp)$"),
+    burst_threshold: Optional[int] = Query(None),
+    burst_gap: float = Query(DEFAULT_BURST_GAP),
+    cull: bool = Query(False),
+    min_focus: Optional[float] = Query(None),
+    max_motion_blur: Optional[float] = Query(None),
+    max_clipped_highlights: Optional[float] = Query(None),
+    max_clipped_shadows: Optional[float] = Query(None),
+    accept: str = Header(default="application/x-ndjson")
+):
+    """
+    Analyze a batch of images and stream one result per image as soon as it is ready.
+
+    Results arrive in completion order, each tagged with the image `index` and
+    `filename`, and carry `settings` (JSON), `xmp` (with `?format=xmp`) or `error`.
+    Sent as NDJSON by default, or as Server-Sent Events if Accept is 'text/event-stream'.
+    With `burst_threshold`, near-identical frames are analyzed once per burst and
+    each frame's result names the frame that was analyzed (`burst_of`).
+    With `cull`, frames are scored locally first; every result carries its `score`
+    and rejects are reported right away (`rejected: true`) without being analyzed.
+    """
+    work_dir = Path(tempfile.mkdtemp(prefix="lightroom_stream_"))
+    try:
+        saved = await asyncio.to_thread(_save_uploads, images, xmps, work_dir)
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+    use_sse = "text/event-stream" in accept
+    thresholds = _cull_thresholds(cull, min_focus, max_motion_blur, max_clipped_highlights, max_clipped_shadows)
+
+    async def analyze_cluster(cluster: List[int]) -> LightroomSettings:
+        _, image_path, xmp_path = saved[representative(cluster)]
+        return await _process(image_path, xmp_path)
+
+    def encode(event: dict, kind: str) -> str:
+        data = json.dumps(event)
+        return f"event: {kind}\ndata: {data}\n\n" if use_sse else data + "\n"
+
+    async def events():
+        try:
+            scores, clusters = await plan_batch(
+                [image_path for _, image_path, _ in saved], thresholds, burst_threshold, burst_gap
             )
-            
-        # Default behavior is JSON response
-        return JSONResponse(content=settings.model_dump())
+            for index, score in enumerate(scores):
+                if score is not None and score.rejected:
+                    event = {"index": index, "filename": saved[index][0], "rejected": True, "score": score.to_dict()}
+                    yield encode(event, "result")
+
+            async for cluster_index, settings, error in iter_completed(analyze_cluster, clusters, STREAM_CONCURRENCY):
+                cluster = clusters[cluster_index]
+                for index in cluster:
+                    filename, _, xmp_path = saved[index]
+                    event = {"index": index, "filename": filename}
+                    if len(cluster) > 1:
+                        event["burst_of"] = representative(cluster)
+                    if scores[index] is not None:
+                        event["score"] = scores[index].to_dict()
+                    if error is not None:
+                        event["error"] = f"Provider failed: {error}"
+                    elif output_format == "xmp":
+                        event["xmp"] = generate_xmp(settings, xmp_path.read_text() if xmp_path else None)
+                    else:
+                        event["settings"] = settings.model_dump()
+
+                    yield encode(event, "error" if error is not None else "result")
+
+            if use_sse:
+                yield "event: done\ndata: {}\n\n"
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if use_sse else "application/x-ndjson",
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -5,22 +5,40 @@ from typing import Optional
 # Add project root to sys.path to allow importing from src
 sys.path.append(str(Path(__file__).parent.parent))
 
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
+
+import json
+import os
 
 from src.providers.gemini_api_provider import GeminiAPIProvider
+from src.providers.cached_provider import with_cache
+from src.providers.coalescing_provider import with_coalescing
 from src.models import LightroomSettings
+from src.core.preprocess import ImageSpec, make_image_spec
+from src.core.ratelimit import limiter_stats
 
 # Initialize FastMCP server
 mcp = FastMCP("Lightroom Settings MCP Server")
 
 # Initialize provider
 # Default model is gemini-2.0-flash (cheapest/fastest)
-provider = GeminiAPIProvider()
+provider = GeminiAPIProvider(
+    max_concurrency=int(os.environ.get("GEMINI_MAX_CONCURRENCY", "8")),
+    image_spec=make_image_spec(
+        int(os.environ.get("LIGHTROOM_MAX_EDGE", ImageSpec.max_edge)),
+        int(os.environ.get("LIGHTROOM_JPEG_QUALITY", ImageSpec.quality)),
+    ),
+)
+# Set LIGHTROOM_CACHE_DIR to reuse results for identical image + XMP requests
+provider = with_cache(provider, os.environ.get("LIGHTROOM_CACHE_DIR"))
+# Identical requests in flight at the same time share one model call
+provider = with_coalescing(provider)
 
 @mcp.tool()
-async def analyze_image(image_path: str, xmp_path: Optional[str] = None) -> str:
+async def analyze_image(image_path: str, xmp_path: Optional[str] = None, ctx: Optional[Context] = None) -> str:
     """
     Analyze an image and return suggested Lightroom Develop settings as a JSON string.
+    Settings received so far are reported as progress while the model answers.
 
     Args:
         image_path: Absolute path to the original image file.
@@ -36,10 +54,23 @@ async def analyze_image(image_path: str, xmp_path: Optional[str] = None) -> str:
         return f"Error: XMP path {xmp_path} does not exist."
 
     try:
-        settings: LightroomSettings = await provider.process(img_p, xmp_p)
+        settings: Optional[LightroomSettings] = None
+        async for settings in provider.stream(img_p, xmp_p):
+            if ctx is not None:
+                partial = settings.model_dump(exclude_none=True)
+                await ctx.report_progress(len(partial), len(LightroomSettings.model_fields))
+                await ctx.info(f"Partial settings: {json.dumps(partial)}")
         return settings.model_dump_json(indent=2)
     except Exception as e:
         return f"Error analyzing image: {str(e)}"
 
+@mcp.tool()
+async def rate_limits() -> str:
+    """
+    Report the adaptive rate limiter of each model quota as a JSON string:
+    current concurrency limit, calls in flight, queue depth and throttle count.
+    """
+    return json.dumps(limiter_stats(), indent=2)
+
 if __name__ == "__main__":
     mcp.run()
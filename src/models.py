@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, PrivateAttr
+from typing import Any, Dict, Optional
 
 class LightroomSettings(BaseModel):
     # Basic Tone
@@ -21,6 +21,10 @@ class LightroomSettings(BaseModel):
     color_temp: Optional[int] = Field(None, description="Temperature (e.g. 2000 to 50000)")
     tint: Optional[int] = Field(None, description="Tint (e.g. -150 to 150)")
 
+    # A question the model asked next to its values (`clarification_needed`); set by
+    # the parser, read through `clarification()`, and never serialized
+    _clarification_needed: Optional[str] = PrivateAttr(None)
+
     model_config = {
         "json_schema_extra": {
             "example": {
@@ -36,6 +40,49 @@ class LightroomSettings(BaseModel):
         }
     }
 
+# LightroomSettings field -> Lightroom develop / XMP `crs:` parameter name
+CRS_FIELD_MAPPING = {
+    "exposure": "Exposure2012",
+    "contrast": "Contrast2012",
+    "highlights": "Highlights2012",
+    "shadows": "Shadows2012",
+    "whites": "Whites2012",
+    "blacks": "Blacks2012",
+    "texture": "Texture",
+    "clarity": "Clarity2012",
+    "dehaze": "Dehaze",
+    "vibrance": "Vibrance",
+    "saturation": "Saturation",
+    "color_temp": "Temperature",
+    "tint": "Tint",
+}
+
+# Documented (inclusive) range of each LightroomSettings field, matching the Field descriptions
+SETTINGS_RANGES = {
+    "exposure": (-5.0, 5.0),
+    "contrast": (-100, 100),
+    "highlights": (-100, 100),
+    "shadows": (-100, 100),
+    "whites": (-100, 100),
+    "blacks": (-100, 100),
+    "texture": (-100, 100),
+    "clarity": (-100, 100),
+    "dehaze": (-100, 100),
+    "vibrance": (-100, 100),
+    "saturation": (-100, 100),
+    "color_temp": (2000, 50000),
+    "tint": (-150, 150),
+}
+
+def settings_to_crs(settings: LightroomSettings) -> Dict[str, Any]:
+    """Returns the non-null fields of `settings` keyed by their crs parameter name."""
+    crs = {}
+    for field, crs_attr in CRS_FIELD_MAPPING.items():
+        val = getattr(settings, field)
+        if val is not None:
+            crs[crs_attr] = val
+    return crs
+
 class MaskSettings(BaseModel):
     exposure: Optional[float] = None
     contrast: Optional[int] = None
@@ -1,27 +1,124 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import AsyncIterator, List, Optional, Union
 from pathlib import Path
 
+from ..core.inputs import InputFile
+from ..core.cache import DerivativeCache
+from ..core.preprocess import DEFAULT_IMAGE_SPEC, ImageSpec, prepare_image
 from ..models import LightroomSettings
+from .prompts import MAX_BATCH_SIZE
+
+# Providers accept plain paths or InputFile buffers (in-memory / memory-mapped uploads)
+ImageInput = Union[Path, InputFile]
 
 class ProviderBase(ABC):
     """
     Abstract base class for all AI providers.
     A provider takes an image path and optional XMP path,
     and returns suggested Lightroom settings.
+    Either may also be an InputFile wrapping an in-memory or memory-mapped buffer.
     """
+
+    # Bump whenever a provider's prompt changes in a way that affects its output,
+    # so cached results from the old prompt are no longer reused.
+    prompt_version: str = "2"
+
+    # Target size/quality of uploaded images (None uploads them as-is; providers
+    # take an `image_spec` argument), and an optional on-disk cache of the
+    # downscaled derivatives.
+    image_spec: Optional[ImageSpec] = DEFAULT_IMAGE_SPEC
+    derivative_cache: Optional[DerivativeCache] = None
     
     @abstractmethod
-    async def process(self, image_path: Path, xmp_path: Optional[Path] = None) -> LightroomSettings:
+    async def process(self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None) -> LightroomSettings:
         """
         Analyze the image and optionally its current XMP settings,
         and return suggested new settings.
         
         Args:
-            image_path: Path to the image file.
-            xmp_path: Path to the existing XMP sidecar file (if any).
+            image_path: Path to (or InputFile buffer of) the image file.
+            xmp_path: Path to (or InputFile buffer of) the existing XMP sidecar file (if any).
         
         Returns:
             A LightroomSettings object with the suggested values.
         """
         pass
+
+    async def stream(
+        self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None
+    ) -> AsyncIterator[LightroomSettings]:
+        """
+        Like `process`, but yields partial LightroomSettings as the model's answer
+        comes in, each holding every field received so far; the last one is the
+        full result. Providers that can stream override this; the default yields
+        the result of `process` once.
+        """
+        yield await self.process(image_path, xmp_path)
+
+    async def aclose(self):
+        """Releases long-lived resources (worker processes, connections). No-op by default."""
+        pass
+
+    async def prepare(self, image_path: ImageInput) -> ImageInput:
+        """
+        Returns the image as it should be uploaded: the embedded JPEG preview of a
+        RAW file, downscaled to `image_spec`. Implementations call this before
+        reading the image.
+        """
+        return await asyncio.to_thread(prepare_image, image_path, self.image_spec, self.derivative_cache)
+
+    async def process_group(
+        self, image_paths: List[ImageInput], xmp_paths: List[Optional[ImageInput]]
+    ) -> List[LightroomSettings]:
+        """
+        Analyze a group of 1-4 related images (e.g. a burst) and return settings
+        for each, in order. Providers that can send several images in one request
+        override this; the default falls back to one `process` call per image.
+        """
+        return list(await asyncio.gather(
+            *(self.process(image_path, xmp_path) for image_path, xmp_path in zip(image_paths, xmp_paths))
+        ))
+
+    async def process_batch(
+        self,
+        image_paths: List[ImageInput],
+        xmp_paths: Optional[List[Optional[ImageInput]]] = None,
+        batch_size: int = MAX_BATCH_SIZE,
+        concurrency: int = 4,
+    ) -> List[LightroomSettings]:
+        """
+        Analyze many images by splitting them, in order, into groups of up to
+        `batch_size` and sending each group as a single request.
+
+        Args:
+            image_paths: Paths to the image files, ideally consecutive frames.
+            xmp_paths: Optional XMP sidecar per image (same length as image_paths).
+            batch_size: Images per request (1-4).
+            concurrency: Max number of group requests in flight.
+
+        Returns:
+            One LightroomSettings per input image, in input order.
+        """
+        if not 1 <= batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(f"batch_size must be between 1 and {MAX_BATCH_SIZE}.")
+        if xmp_paths is None:
+            xmp_paths = [None] * len(image_paths)
+        if len(xmp_paths) != len(image_paths):
+            raise ValueError("xmp_paths must have the same length as image_paths.")
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run_group(start: int) -> List[LightroomSettings]:
+            group = image_paths[start:start + batch_size]
+            group_xmps = xmp_paths[start:start + batch_size]
+            async with semaphore:
+                if len(group) == 1:
+                    return [await self.process(group[0], group_xmps[0])]
+                results = await self.process_group(group, group_xmps)
+            if len(results) != len(group):
+                raise ValueError(f"Provider returned {len(results)} result(s) for {len(group)} image(s).")
+            return results
+
+        groups = await asyncio.gather(*(run_group(i) for i in range(0, len(image_paths), batch_size)))
+        return [settings for group in groups for settings in group]
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Union
+
+from .base import ImageInput, ProviderBase
+from ..core.cache import DerivativeCache, ResultCache, request_key
+from ..core.inputs import InputFile
+from ..models import LightroomSettings
+from ..xmp_utils import read_crs_values
+
+logger = logging.getLogger(__name__)
+
+def provider_request_key(provider: ProviderBase, image_path: ImageInput, xmp_path: Optional[ImageInput] = None) -> str:
+    """
+    Identity of a request to `provider`: image bytes, the crs values of the XMP
+    (if any), and the provider's class, model and prompt version.
+    """
+    crs_values = None
+    if xmp_path and xmp_path.exists():
+        crs_values = read_crs_values(xmp_path.read_text(encoding="utf-8"))
+    return request_key(
+        InputFile.coerce(image_path).sha256(),
+        crs_values,
+        provider.__class__.__name__,
+        getattr(provider, "model", None),
+        provider.prompt_version,
+    )
+
+class CachedProvider(ProviderBase):
+    """
+    Wraps any ProviderBase with a content-addressed result cache.
+    Requests are keyed by image bytes, the crs values of the XMP (if any),
+    the wrapped provider's class, model and prompt version, so re-running the
+    same image with the same sidecar skips the model round-trip entirely.
+    """
+    def __init__(self, provider: ProviderBase, cache: ResultCache):
+        self.provider = provider
+        self.cache = cache
+        self.prompt_version = provider.prompt_version
+
+    async def aclose(self):
+        await self.provider.aclose()
+
+    @property
+    def model(self) -> Optional[str]:
+        return getattr(self.provider, "model", None)
+
+    def cache_key(self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None) -> str:
+        return provider_request_key(self.provider, image_path, xmp_path)
+
+    async def prepare(self, image_path: ImageInput) -> ImageInput:
+        return await self.provider.prepare(image_path)
+
+    async def process(self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None) -> LightroomSettings:
+        # Key on what is actually uploaded; the wrapped provider's own prepare() is then a no-op
+        image_path = await self.prepare(image_path)
+        key = await asyncio.to_thread(self.cache_key, image_path, xmp_path)
+
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            logger.info(f"Result cache hit for {image_path.name} ({key[:12]})")
+            return LightroomSettings.model_validate(cached)
+
+        settings = await self.provider.process(image_path, xmp_path)
+        await asyncio.to_thread(self.cache.put, key, settings.model_dump())
+        return settings
+
+    async def stream(
+        self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None
+    ) -> AsyncIterator[LightroomSettings]:
+        image_path = await self.prepare(image_path)
+        key = await asyncio.to_thread(self.cache_key, image_path, xmp_path)
+
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            logger.info(f"Result cache hit for {image_path.name} ({key[:12]})")
+            yield LightroomSettings.model_validate(cached)
+            return
+
+        settings = None
+        async for settings in self.provider.stream(image_path, xmp_path):
+            yield settings
+        # Only a stream that ran to the end is cached
+        if settings is not None:
+            await asyncio.to_thread(self.cache.put, key, settings.model_dump())
+
+    async def process_group(
+        self, image_paths: List[ImageInput], xmp_paths: List[Optional[ImageInput]]
+    ) -> List[LightroomSettings]:
+        image_paths = [await self.prepare(image_path) for image_path in image_paths]
+        keys = [await asyncio.to_thread(self.cache_key, p, x) for p, x in zip(image_paths, xmp_paths)]
+        results: List[Optional[LightroomSettings]] = []
+        for key in keys:
+            cached = await asyncio.to_thread(self.cache.get, key)
+            results.append(LightroomSettings.model_validate(cached) if cached is not None else None)
+
+        # Only the images that missed go to the wrapped provider, still as one group
+        missing = [i for i, settings in enumerate(results) if settings is None]
+        if missing:
+            if len(missing) == 1:
+                fresh = [await self.provider.process(image_paths[missing[0]], xmp_paths[missing[0]])]
+            else:
+                fresh = await self.provider.process_group(
+                    [image_paths[i] for i in missing], [xmp_paths[i] for i in missing]
+                )
+            for i, settings in zip(missing, fresh):
+                results[i] = settings
+                await asyncio.to_thread(self.cache.put, keys[i], settings.model_dump())
+
+        return results
+
+def with_cache(provider: ProviderBase, cache_dir: Optional[Union[str, Path]]) -> ProviderBase:
+    """
+    Returns `provider` wrapped in a CachedProvider if `cache_dir` is set, else
+    unchanged. Its downscaled upload derivatives are cached under the same directory.
+    """
+    if not cache_dir:
+        return provider
+    provider.derivative_cache = DerivativeCache(Path(cache_dir) / "derivatives")
+    return CachedProvider(provider, ResultCache(Path(cache_dir)))
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from typing import List, Optional
+
+from ..core.ratelimit import ThrottledError, is_throttle_message
+
+logger = logging.getLogger(__name__)
+
+
+def cli_error(error_msg: str) -> RuntimeError:
+    """The exception for a failed CLI run, a ThrottledError if stderr reports throttling."""
+    if is_throttle_message(error_msg):
+        return ThrottledError(f"Gemini CLI throttled: {error_msg}")
+    return RuntimeError(f"Gemini CLI failed: {error_msg}")
+
+class CLIWorkerPool:
+    """
+    Fixed-size pool of pre-spawned CLI processes that receive their prompt on stdin.
+
+    Each worker keeps one process started and idle, waiting on stdin, so process
+    startup overlaps with the previous job instead of adding to its latency. A job
+    writes its prompt to the waiting process, collects stdout, and the worker
+    immediately spawns the next process. Jobs that exceed `job_timeout` (spawn
+    included) are killed and the worker respawns. A process that cannot be spawned
+    fails the job it was needed for, and the worker backs off before retrying.
+    Submissions beyond `queue_size` wait for room.
+    """
+
+    def __init__(
+        self,
+        cmd: List[str],
+        size: int = 2,
+        queue_size: int = 32,
+        job_timeout: Optional[float] = 300.0,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+    ):
+        if size < 1:
+            raise ValueError("CLIWorkerPool size must be at least 1.")
+        self.cmd = cmd
+        self.size = size
+        self.queue_size = queue_size
+        self.job_timeout = job_timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        # A previous event loop (e.g. an earlier asyncio.run) owned the old workers
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [loop.create_task(self._worker(i)) for i in range(self.size)]
+        self._loop = loop
+
+    async def _spawn(self) -> asyncio.subprocess.Process:
+        return await asyncio.create_subprocess_exec(
+            *self.cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+    @staticmethod
+    async def _kill(proc: asyncio.subprocess.Process):
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+
+    async def _worker(self, worker_id: int):
+        proc: Optional[asyncio.subprocess.Process] = None
+        spawn_failures = 0
+
+        async def run(prompt: str):
+            nonlocal proc
+            if proc is None or proc.returncode is not None:
+                # Left at None if the spawn fails, which is how a spawn failure is told apart
+                proc = None
+                proc = await self._spawn()
+            return await proc.communicate(prompt.encode("utf-8"))
+
+        try:
+            while True:
+                if (proc is None or proc.returncode is not None) and not spawn_failures:
+                    try:
+                        proc = await self._spawn()
+                    except Exception as e:
+                        # Retried, and reported, by the next job
+                        logger.warning(f"CLI worker {worker_id} could not spawn {self.cmd[0]}: {e}")
+                        proc = None
+
+                prompt, future = await self._queue.get()
+                try:
+                    if future.cancelled():
+                        continue
+                    try:
+                        stdout, stderr = await asyncio.wait_for(run(prompt), timeout=self.job_timeout)
+                    except asyncio.TimeoutError:
+                        logger.warning(f"CLI worker {worker_id} timed out after {self.job_timeout}s; respawning")
+                        if proc is not None:
+                            await self._kill(proc)
+                        if not future.done():
+                            future.set_exception(TimeoutError(f"CLI job timed out after {self.job_timeout}s"))
+                        continue
+                    except Exception as e:
+                        if proc is not None:
+                            await self._kill(proc)
+                        if not future.done():
+                            future.set_exception(e)
+                        if proc is None:
+                            # The CLI could not be started; wait before trying again
+                            delay = min(self.max_delay, self.base_delay * 2 ** spawn_failures)
+                            spawn_failures += 1
+                            logger.error(f"CLI worker {worker_id} could not spawn {self.cmd[0]}: {e}; retrying in {delay:.1f}s")
+                            await asyncio.sleep(delay)
+                        continue
+                    spawn_failures = 0
+
+                    if future.done():
+                        continue
+                    if proc.returncode != 0:
+                        error_msg = stderr.decode().strip()
+                        logger.error(f"Gemini CLI error: {error_msg}")
+                        future.set_exception(cli_error(error_msg))
+                    else:
+                        future.set_result(stdout.decode().strip())
+                finally:
+                    self._queue.task_done()
+        finally:
+            if proc is not None:
+                await self._kill(proc)
+
+    async def submit(self, prompt: str) -> str:
+        """Queues `prompt` for the next free worker and returns the CLI's stdout."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((prompt, future))
+        return await future
+
+    async def close(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._loop = None
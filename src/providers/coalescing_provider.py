@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from .base import ImageInput, ProviderBase
+from .cached_provider import provider_request_key
+from ..core.inputs import InputFile
+from ..core.singleflight import SingleFlight
+from ..models import LightroomSettings
+
+T = TypeVar("T")
+
+def _holding(inputs: List[Optional[ImageInput]], func: Callable[[], Awaitable[T]]) -> "asyncio.Task[T]":
+    """
+    Starts `func()` as a task that keeps the InputFile buffers among `inputs`
+    readable until it finishes. The request that started a shared call may be
+    cancelled and release its upload while other requests still wait on it.
+    """
+    held = [i.retain() for i in inputs if isinstance(i, InputFile)]
+    task = asyncio.ensure_future(func())
+    task.add_done_callback(lambda _: [i.release() for i in held])
+    return task
+
+class _SharedStream:
+    """The partial results of one upstream stream so far, replayed to every consumer."""
+    def __init__(self):
+        self.partials: List[LightroomSettings] = []
+        self.started = False
+        self.changed = asyncio.Event()
+
+    def publish(self, settings: LightroomSettings):
+        self.partials.append(settings)
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+class CoalescingProvider(ProviderBase):
+    """
+    Wraps any ProviderBase so that identical requests in flight at the same time
+    (same image bytes, XMP crs values, provider, model and prompt version) share
+    one call to the wrapped provider. Unlike CachedProvider nothing is stored:
+    once the call finishes, the next identical request runs again.
+
+    Streams take part too: every identical stream replays the partial results of
+    the one upstream stream, and a `process` call joins a stream in flight (or a
+    stream joins a `process` call, and then only yields the final result).
+    """
+    def __init__(self, provider: ProviderBase, flights: Optional[SingleFlight] = None):
+        self.provider = provider
+        self.flights = flights or SingleFlight()
+        self.prompt_version = provider.prompt_version
+        self._streams: Dict[str, _SharedStream] = {}
+
+    async def aclose(self):
+        await self.provider.aclose()
+
+    @property
+    def model(self) -> Optional[str]:
+        return getattr(self.provider, "model", None)
+
+    async def prepare(self, image_path: ImageInput) -> ImageInput:
+        return await self.provider.prepare(image_path)
+
+    async def process(self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None) -> LightroomSettings:
+        image_path = await self.prepare(image_path)
+        key = await asyncio.to_thread(provider_request_key, self.provider, image_path, xmp_path)
+        settings = await self.flights.do(
+            key, lambda: _holding([image_path, xmp_path], lambda: self.provider.process(image_path, xmp_path))
+        )
+        # Every waiter gets its own copy of the shared result
+        return settings.model_copy()
+
+    async def _run_stream(
+        self, key: str, shared: _SharedStream, image_path: ImageInput, xmp_path: Optional[ImageInput]
+    ) -> LightroomSettings:
+        shared.started = True
+        try:
+            settings = None
+            async for settings in self.provider.stream(image_path, xmp_path):
+                shared.publish(settings)
+            return settings
+        finally:
+            if self._streams.get(key) is shared:
+                del self._streams[key]
+
+    async def stream(
+        self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None
+    ) -> AsyncIterator[LightroomSettings]:
+        image_path = await self.prepare(image_path)
+        key = await asyncio.to_thread(provider_request_key, self.provider, image_path, xmp_path)
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = self._streams[key] = _SharedStream()
+        # Runs the upstream stream unless an identical stream or process call is in flight
+        result = asyncio.ensure_future(
+            self.flights.do(key, lambda: _holding(
+                [image_path, xmp_path], lambda: self._run_stream(key, shared, image_path, xmp_path)
+            ))
+        )
+        sent = 0
+        try:
+            while True:
+                while sent < len(shared.partials):
+                    yield shared.partials[sent].model_copy()
+                    sent += 1
+                if result.done():
+                    break
+                changed = asyncio.ensure_future(shared.changed.wait())
+                try:
+                    await asyncio.wait({result, changed}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    changed.cancel()
+            settings = result.result()
+            if not shared.partials or shared.partials[-1] is not settings:
+                # Joined a process call: there is only the final result
+                yield settings.model_copy()
+        finally:
+            # Leaving early only stops waiting; the last waiter to leave cancels the call
+            result.cancel()
+            if not shared.started and self._streams.get(key) is shared:
+                del self._streams[key]
+
+    async def process_group(
+        self, image_paths: List[ImageInput], xmp_paths: List[Optional[ImageInput]]
+    ) -> List[LightroomSettings]:
+        image_paths = [await self.prepare(image_path) for image_path in image_paths]
+        keys = [
+            await asyncio.to_thread(provider_request_key, self.provider, image_path, xmp_path)
+            for image_path, xmp_path in zip(image_paths, xmp_paths)
+        ]
+        key = hashlib.sha256("\n".join(keys).encode()).hexdigest()
+        results = await self.flights.do(
+            key, lambda: _holding([*image_paths, *xmp_paths], lambda: self.provider.process_group(image_paths, xmp_paths))
+        )
+        return [settings.model_copy() for settings in results]
+
+def with_coalescing(provider: ProviderBase) -> ProviderBase:
+    """Returns `provider` wrapped so identical concurrent requests share one call."""
+    return CoalescingProvider(provider)
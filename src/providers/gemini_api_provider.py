@@ -1,13 +1,18 @@
+import asyncio
 import logging
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, List, Optional
 import os
 
 from google import genai
 from google.genai import types
 
-from .base import ProviderBase
-from ..models import LightroomSettings
+from .base import ImageInput, ProviderBase
+from .prompts import build_batch_prompt, estimate_tokens, load_xmp_context, xmp_prompt
+from ..models import LightroomSettings, LightroomResponse
+from ..core.parser import expand_response, parse_llm_response, stream_settings
+from ..core.preprocess import DEFAULT_IMAGE_SPEC, ImageSpec, image_mime_type
+from ..core.ratelimit import shared_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +21,15 @@ class GeminiAPIProvider(ProviderBase):
     Provider that invokes the Google Gemini API directly using the google-genai library.
     Requires GOOGLE_API_KEY environment variable or config.json.
     """
-    def __init__(self, api_key: Optional[str] = None, model: str = "gemini-2.5-flash"):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = "gemini-2.5-flash",
+        max_concurrency: int = 8,
+        timeout: Optional[float] = 120.0,
+        requests_per_minute: Optional[float] = None,
+        image_spec: Optional[ImageSpec] = DEFAULT_IMAGE_SPEC,
+    ):
         # Prioritize constructor arg, then config.json, then env var
         self.api_key = api_key
         
@@ -36,14 +49,15 @@ class GeminiAPIProvider(ProviderBase):
         if not self.api_key:
             raise ValueError("GOOGLE_API_KEY must be provided, set in config.json, or in environment.")
         
-        # Configure client with automatic retries for rate limits (429)
-        # The new SDK handles this via HttpRetryOptions
+        # The SDK only retries transient server errors; 429/503 go back to the shared
+        # limiter, which backs off every call to the model together instead of each
+        # call retrying on its own
         retry_config = types.HttpRetryOptions(
             attempts=5,
             initial_delay=2.0,
             max_delay=60.0,
             exp_base=2.0,
-            http_status_codes=[429, 500, 503]
+            http_status_codes=[500]
         )
         
         self.client = genai.Client(
@@ -51,8 +65,71 @@ class GeminiAPIProvider(ProviderBase):
             http_options=types.HttpOptions(retry_options=retry_config)
         )
         self.model = model
+        self.image_spec = image_spec
 
-    async def process(self, image_path: Path, xmp_path: Optional[Path] = None) -> LightroomSettings:
+        # Calls go through the SDK's async client (client.aio) so they never block the
+        # event loop. Every provider of the same model shares one adaptive limiter
+        # (at most `max_concurrency` in flight, fewer while throttled); `timeout`
+        # bounds each attempt, including the SDK's own retries.
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.limiter = shared_limiter(
+            f"gemini:{model}",
+            max_limit=max_concurrency,
+            requests_per_minute=requests_per_minute or float(os.environ.get("GEMINI_RPM", "0")) or None,
+        )
+
+    def _config(self, response_schema: type) -> types.GenerateContentConfig:
+        return types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=response_schema,
+        )
+
+    async def _generate(self, contents: list, response_schema: type) -> types.GenerateContentResponse:
+        async def attempt():
+            try:
+                return await asyncio.wait_for(
+                    self.client.aio.models.generate_content(
+                        model=self.model, contents=contents, config=self._config(response_schema)
+                    ),
+                    timeout=self.timeout,
+                )
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Gemini API call timed out after {self.timeout}s")
+
+        return await self.limiter.call(attempt)
+
+    def _generate_stream(self, contents: list, response_schema: type) -> AsyncIterator[str]:
+        async def attempt():
+            # `timeout` bounds the whole stream, so a stalled one cannot hold its slot forever
+            loop = asyncio.get_running_loop()
+            deadline = None if self.timeout is None else loop.time() + self.timeout
+
+            def remaining() -> Optional[float]:
+                return None if deadline is None else max(0.0, deadline - loop.time())
+
+            try:
+                response = await asyncio.wait_for(
+                    self.client.aio.models.generate_content_stream(
+                        model=self.model, contents=contents, config=self._config(response_schema)
+                    ),
+                    timeout=remaining(),
+                )
+                chunks = aiter(response)
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(anext(chunks), timeout=remaining())
+                    except StopAsyncIteration:
+                        return
+                    if chunk.text:
+                        yield chunk.text
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Gemini API call timed out after {self.timeout}s")
+
+        # Retried while throttled before the first chunk, like `_generate`
+        return self.limiter.stream(attempt)
+
+    async def _single_request(self, image_path: ImageInput, xmp_path: Optional[ImageInput]) -> list:
         prompt = (
             "You are an expert professional photographer and color grader. "
             "Analyze the provided image and suggest Adobe Lightroom develop settings to "
@@ -60,32 +137,32 @@ class GeminiAPIProvider(ProviderBase):
             "Output your highly tuned settings in JSON format.\n"
         )
         
-        if xmp_path and xmp_path.exists():
-            xmp_content = xmp_path.read_text(encoding="utf-8")
-            prompt += f"\n\nHere are the current XMP settings for reference (they may be sub-optimal or zeroed):\n```xml\n{xmp_content}\n```\n"
+        prompt += xmp_prompt(await asyncio.to_thread(load_xmp_context, xmp_path))
 
-        logger.info(f"Invoking Gemini API ({self.model}) for {image_path.name}")
-        
-        try:
-            # Load the image
-            with open(image_path, "rb") as f:
-                image_bytes = f.read()
-            
-            # Prepare image part
-            image_part = types.Part.from_bytes(
-                data=image_bytes,
-                mime_type="image/jpeg" if image_path.suffix.lower() in [".jpg", ".jpeg"] else "image/png"
-            )
+        image_path = await self.prepare(image_path)
+        logger.info(
+            f"Invoking Gemini API ({self.model}) for {image_path.name} "
+            f"(prompt {len(prompt)} chars, ~{estimate_tokens(prompt)} tokens)"
+        )
+
+        # Load the image off the event loop
+        image_bytes = await asyncio.to_thread(image_path.read_bytes)
+        image_part = types.Part.from_bytes(data=image_bytes, mime_type=image_mime_type(image_path))
+        return [prompt, image_part]
+
+    async def stream(
+        self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None
+    ) -> AsyncIterator[LightroomSettings]:
+        contents = await self._single_request(image_path, xmp_path)
+        async for settings in stream_settings(self._generate_stream(contents, LightroomSettings)):
+            yield settings
 
+    async def process(self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None) -> LightroomSettings:
+        contents = await self._single_request(image_path, xmp_path)
+
+        try:
             # Generate content with structured output
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=[prompt, image_part],
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json",
-                    response_schema=LightroomSettings,
-                )
-            )
+            response = await self._generate(contents, LightroomSettings)
 
             if not response.parsed:
                 logger.error(f"Gemini raw response text: {response.text}")
@@ -99,3 +176,39 @@ class GeminiAPIProvider(ProviderBase):
                 logger.error(f"Gemini raw response text on error: {response.text}")
             logger.exception(f"Gemini API Provider error: {e}")
             raise e
+
+    async def process_group(
+        self, image_paths: List[ImageInput], xmp_paths: List[Optional[ImageInput]]
+    ) -> List[LightroomSettings]:
+        image_paths = [await self.prepare(image_path) for image_path in image_paths]
+
+        def read_inputs():
+            xmp_contexts = [load_xmp_context(xmp_path) for xmp_path in xmp_paths]
+            return xmp_contexts, [image_path.read_bytes() for image_path in image_paths]
+
+        xmp_contexts, images = await asyncio.to_thread(read_inputs)
+        prompt = build_batch_prompt(len(image_paths), xmp_contexts)
+
+        contents = [prompt]
+        for i, (image_path, image_bytes) in enumerate(zip(image_paths, images), start=1):
+            contents.append(f"Image {i}:")
+            contents.append(types.Part.from_bytes(data=image_bytes, mime_type=image_mime_type(image_path)))
+
+        logger.info(
+            f"Invoking Gemini API ({self.model}) for a batch of {len(image_paths)} images "
+            f"(prompt {len(prompt)} chars, ~{estimate_tokens(prompt)} tokens)"
+        )
+
+        try:
+            response = await self._generate(contents, LightroomResponse)
+
+            parsed = response.parsed
+            if not parsed:
+                parsed = parse_llm_response(response.text or "")
+            return expand_response(parsed, len(image_paths))
+
+        except Exception as e:
+            if 'response' in locals() and hasattr(response, 'text'):
+                logger.error(f"Gemini raw response text on error: {response.text}")
+            logger.exception(f"Gemini API Provider batch error: {e}")
+            raise e
@@ -1,36 +1,63 @@
 import json
 import logging
 import asyncio
+from contextlib import ExitStack
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, List, Optional
 
-from .base import ProviderBase
-from ..models import LightroomSettings
+from .base import ImageInput, ProviderBase
+from .cli_pool import CLIWorkerPool, cli_error
+from .prompts import build_batch_prompt, load_xmp_context, xmp_prompt
+from ..core.inputs import InputFile
+from ..models import LightroomSettings, LightroomResponse
+from ..core.parser import expand_response, parse_llm_response, settings_from_answer, stream_settings
+from ..core.preprocess import DEFAULT_IMAGE_SPEC, ImageSpec
+from ..core.ratelimit import shared_limiter
 
 logger = logging.getLogger(__name__)
 
+# The schemas never change at runtime, so serialize them once instead of per call
+SETTINGS_SCHEMA_JSON = json.dumps(LightroomSettings.model_json_schema())
+RESPONSE_SCHEMA_JSON = json.dumps(LightroomResponse.model_json_schema())
+
 class GeminiCLIProvider(ProviderBase):
     """
     Provider that invokes the `gemini` CLI tool.
     Assumes syntax like: gemini ask "prompt" --image <file>
+
+    With `pool_size > 0` the provider keeps that many pre-spawned CLI processes
+    (see CLIWorkerPool) and delivers prompts over stdin instead of argv.
     """
-    def __init__(self, cli_path: str = "gemini"):
+    def __init__(
+        self,
+        cli_path: str = "gemini",
+        pool_size: int = 0,
+        queue_size: int = 32,
+        job_timeout: Optional[float] = 300.0,
+        image_spec: Optional[ImageSpec] = DEFAULT_IMAGE_SPEC,
+    ):
         self.cli_path = cli_path
+        self.image_spec = image_spec
+        self.pool = None
+        if pool_size > 0:
+            self.pool = CLIWorkerPool(
+                [self.cli_path, "--yolo"], size=pool_size, queue_size=queue_size, job_timeout=job_timeout
+            )
+        # The CLI draws on the same quota from every caller in the process
+        self.limiter = shared_limiter("gemini-cli", max_limit=pool_size or None)
 
-    async def process(self, image_path: Path, xmp_path: Optional[Path] = None) -> LightroomSettings:
-        prompt = (
-            "You are an expert professional photographer and color grader. "
-            "Analyze the provided image and suggest Adobe Lightroom develop settings to "
-            "make it look stunning, perfectly exposed, and beautifully color-graded. "
-            "You MUST output ONLY valid JSON matching this JSON schema:\n"
-            + json.dumps(LightroomSettings.model_json_schema())
-        )
+    async def aclose(self):
+        """Stops pooled CLI workers, if any."""
+        if self.pool:
+            await self.pool.close()
 
-        if xmp_path and xmp_path.exists():
-            xmp_content = xmp_path.read_text(encoding="utf-8")
-            prompt += f"\n\nHere are the current XMP settings for reference (they may be sub-optimal or zeroed):\n{xmp_content}"
+    async def _run_cli(self, prompt: str) -> str:
+        return await self.limiter.call(lambda: self._invoke_cli(prompt))
 
-        prompt += f"\n\nCRITICAL INSTRUCTION: You MUST evaluate the attached image and output the final JSON immediately. DO NOT use any tools to search files, do not read code. Just look at the image and output the raw JSON!\nImage file: {image_path}"
+    async def _invoke_cli(self, prompt: str) -> str:
+        if self.pool:
+            logger.info(f"Submitting prompt ({len(prompt)} chars) to Gemini CLI pool")
+            return await self.pool.submit(prompt)
 
         # We assume the CLI accepts a prompt and an image file
         # This argument structure might need to be adjusted based on the actual CLI syntax
@@ -38,20 +65,82 @@ class GeminiCLIProvider(ProviderBase):
 
         logger.info(f"Invoking Gemini CLI: {' '.join(cmd)}")
 
-        try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await proc.communicate()
+
+        if proc.returncode != 0:
+            error_msg = stderr.decode().strip()
+            logger.error(f"Gemini CLI error: {error_msg}")
+            raise cli_error(error_msg)
+
+        return stdout.decode().strip()
+
+    def _stream_cli(self, prompt: str) -> AsyncIterator[str]:
+        """Yields the CLI's stdout line by line as it is printed (all at once when pooled)."""
+        if self.pool:
+            async def output():
+                yield await self._run_cli(prompt)
+            return output()
+
+        cmd = [self.cli_path, "-p", prompt, "--yolo"]
+        logger.info(f"Streaming Gemini CLI output ({len(prompt)} chars prompt)")
+
+        async def lines():
             proc = await asyncio.create_subprocess_exec(
                 *cmd,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
-            stdout, stderr = await proc.communicate()
+            # Drained alongside stdout so a chatty stderr cannot fill its pipe and stall the CLI
+            stderr = asyncio.create_task(proc.stderr.read())
+            try:
+                async for line in proc.stdout:
+                    yield line.decode()
+                await proc.wait()
+                if proc.returncode != 0:
+                    error_msg = (await stderr).decode().strip()
+                    logger.error(f"Gemini CLI error: {error_msg}")
+                    raise cli_error(error_msg)
+            finally:
+                # Closed early once the settings object is complete; the rest is chatter
+                if proc.returncode is None:
+                    proc.kill()
+                    await proc.wait()
+                stderr.cancel()
+
+        # Retried while throttled before the first line, like `_run_cli`
+        return self.limiter.stream(lines)
 
-            if proc.returncode != 0:
-                error_msg = stderr.decode().strip()
-                logger.error(f"Gemini CLI error: {error_msg}")
-                raise RuntimeError(f"Gemini CLI failed: {error_msg}")
+    def _settings_prompt(self, xmp_path: Optional[ImageInput], local_image: Path) -> str:
+        prompt = (
+            "You are an expert professional photographer and color grader. "
+            "Analyze the provided image and suggest Adobe Lightroom develop settings to "
+            "make it look stunning, perfectly exposed, and beautifully color-graded. "
+            "You MUST output ONLY valid JSON matching this JSON schema:\n"
+            + SETTINGS_SCHEMA_JSON
+        )
+        prompt += xmp_prompt(load_xmp_context(xmp_path))
+        prompt += f"\n\nCRITICAL INSTRUCTION: You MUST evaluate the attached image and output the final JSON immediately. DO NOT use any tools to search files, do not read code. Just look at the image and output the raw JSON!\nImage file: {local_image}"
+        return prompt
 
-            raw_output = stdout.decode().strip()
+    async def stream(
+        self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None
+    ) -> AsyncIterator[LightroomSettings]:
+        image_path = await self.prepare(image_path)
+        with InputFile.coerce(image_path).local_path() as local_image:
+            async for settings in stream_settings(self._stream_cli(self._settings_prompt(xmp_path, local_image))):
+                yield settings
+
+    async def process(self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None) -> LightroomSettings:
+        image_path = await self.prepare(image_path)
+        try:
+            # The CLI reads the image from disk, so in-memory inputs get a temporary file here
+            with InputFile.coerce(image_path).local_path() as local_image:
+                raw_output = await self._run_cli(self._settings_prompt(xmp_path, local_image))
 
             # Extract JSON if the model wrapped it in markdown code blocks
             if "```json" in raw_output:
@@ -68,7 +157,7 @@ class GeminiCLIProvider(ProviderBase):
                 json_str = json_str[json_begin:json_end+1]
 
             data = json.loads(json_str)
-            return LightroomSettings(**data)
+            return settings_from_answer(data)
 
         except json.JSONDecodeError as e:
             logger.error(f"Failed to decode JSON from Gemini CLI output: {raw_output}")
@@ -76,3 +165,23 @@ class GeminiCLIProvider(ProviderBase):
         except Exception as e:
             logger.exception("Provider error")
             raise e
+
+    async def process_group(
+        self, image_paths: List[ImageInput], xmp_paths: List[Optional[ImageInput]]
+    ) -> List[LightroomSettings]:
+        xmp_contexts = [load_xmp_context(xmp_path) for xmp_path in xmp_paths]
+        image_paths = [await self.prepare(image_path) for image_path in image_paths]
+        prompt = build_batch_prompt(len(image_paths), xmp_contexts)
+        prompt += "\nYou MUST output ONLY valid JSON matching this JSON schema:\n" + RESPONSE_SCHEMA_JSON
+        prompt += "\n\nCRITICAL INSTRUCTION: You MUST evaluate the attached images and output the final JSON immediately. DO NOT use any tools to search files, do not read code. Just look at the images and output the raw JSON!\n"
+
+        try:
+            with ExitStack() as stack:
+                for i, image_path in enumerate(image_paths, start=1):
+                    local_image = stack.enter_context(InputFile.coerce(image_path).local_path())
+                    prompt += f"Image {i} file: {local_image}\n"
+                raw_output = await self._run_cli(prompt)
+            return expand_response(parse_llm_response(raw_output), len(image_paths))
+        except Exception as e:
+            logger.exception("Provider batch error")
+            raise e
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, TypeVar
+
+from .base import ImageInput, ProviderBase
+from ..core.cache import DerivativeCache
+from ..core.parser import settings_problems
+from ..core.pipeline import percentile
+from ..models import LightroomSettings
+
+logger = logging.getLogger(__name__)
+
+# Most recent primary latencies the hedge delay is computed from
+LATENCY_WINDOW = 1000
+
+T = TypeVar("T")
+
+
+def _provider_name(provider: ProviderBase) -> str:
+    return getattr(provider, "model", None) or provider.__class__.__name__
+
+
+class HedgedProvider(ProviderBase):
+    """
+    Sends each request to the first of `providers` and, if it has not answered
+    within the `hedge_percentile` of its recent latencies, the same request to the
+    next one (and so on). The first valid LightroomSettings wins and the other
+    calls are cancelled. A provider that fails is replaced by the next one
+    straight away.
+
+    Until `min_samples` latencies are recorded the hedge delay is `initial_delay`.
+    Hedge rate and per-provider win counts are available from `stats()`.
+    """
+    def __init__(
+        self,
+        providers: Sequence[ProviderBase],
+        hedge_percentile: float = 95.0,
+        initial_delay: float = 10.0,
+        min_samples: int = 20,
+        required: Sequence[str] = (),
+    ):
+        if not providers:
+            raise ValueError("HedgedProvider requires at least one provider.")
+        self.providers = list(providers)
+        self.hedge_percentile = hedge_percentile
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.required = tuple(required)
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.hedged = 0
+        self.names = [_provider_name(provider) for provider in self.providers]
+        # By position, so two providers of the same model keep separate counts
+        self.wins = [0] * len(self.providers)
+        self.prompt_version = "+".join(provider.prompt_version for provider in self.providers)
+
+    @property
+    def model(self) -> str:
+        return "|".join(self.names)
+
+    @property
+    def derivative_cache(self) -> Optional[DerivativeCache]:
+        return self.providers[0].derivative_cache
+
+    @derivative_cache.setter
+    def derivative_cache(self, cache: Optional[DerivativeCache]):
+        for provider in self.providers:
+            provider.derivative_cache = cache
+
+    async def aclose(self):
+        await asyncio.gather(*(provider.aclose() for provider in self.providers))
+
+    async def prepare(self, image_path: ImageInput) -> ImageInput:
+        # Prepared once, to the primary's spec, so a hedge does not decode the image again
+        return await self.providers[0].prepare(image_path)
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the primary before hedging."""
+        if len(self.latencies) < self.min_samples:
+            return self.initial_delay
+        return percentile(list(self.latencies), self.hedge_percentile)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = list(self.latencies)
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.requests, 4) if self.requests else 0.0,
+            "hedge_delay": round(self.hedge_delay(), 3),
+            "wins": [{"provider": name, "wins": wins} for name, wins in zip(self.names, self.wins)],
+            "latency_p50": round(percentile(latencies, 50), 3),
+            "latency_p99": round(percentile(latencies, 99), 3),
+        }
+
+    def _valid(self, settings: LightroomSettings) -> bool:
+        return not settings_problems(settings, self.required)
+
+    async def process(self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None) -> LightroomSettings:
+        image_path = await self.prepare(image_path)
+        return await self._race(lambda provider: provider.process(image_path, xmp_path), self._valid)
+
+    async def process_group(
+        self, image_paths: List[ImageInput], xmp_paths: List[Optional[ImageInput]]
+    ) -> List[LightroomSettings]:
+        image_paths = [await self.prepare(image_path) for image_path in image_paths]
+        return await self._race(
+            lambda provider: provider.process_group(image_paths, xmp_paths),
+            lambda results: len(results) == len(image_paths) and all(map(self._valid, results)),
+        )
+
+    async def _race(self, call: Callable[[ProviderBase], Awaitable[T]], valid: Callable[[T], bool]) -> T:
+        self.requests += 1
+        started = time.perf_counter()
+        running: Dict[asyncio.Task, int] = {}
+        launched = 0
+        last_launch = started
+        error: Optional[Exception] = None
+
+        def launch():
+            nonlocal launched, last_launch
+            running[asyncio.create_task(call(self.providers[launched]))] = launched
+            launched += 1
+            last_launch = time.perf_counter()
+
+        launch()
+        try:
+            while running:
+                timeout = None
+                if launched < len(self.providers):
+                    timeout = max(0.0, self.hedge_delay() - (time.perf_counter() - last_launch))
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if launched == 1:
+                        self.hedged += 1
+                    logger.info(f"No answer after {time.perf_counter() - started:.1f}s, hedging to "
+                                f"{self.names[launched]}")
+                    launch()
+                    continue
+
+                for task in done:
+                    index = running.pop(task)
+                    try:
+                        result = task.result()
+                        if not valid(result):
+                            raise ValueError("Provider returned settings outside their documented range.")
+                    except Exception as e:
+                        # A fast failure says nothing about how long an answer takes
+                        logger.warning(f"{self.names[index]} failed: {e}")
+                        error = e
+                        continue
+                    if index == 0:
+                        self.latencies.append(time.perf_counter() - started)
+                    self.wins[index] += 1
+                    return result
+
+                if not running and launched < len(self.providers):
+                    launch()
+            raise error
+        finally:
+            for task, index in running.items():
+                task.cancel()
+                if index == 0:
+                    # Censored at the time it lost, which still keeps the slow tail in the window
+                    self.latencies.append(time.perf_counter() - started)
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
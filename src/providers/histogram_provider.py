@@ -0,0 +1,103 @@
+import asyncio
+import io
+import logging
+import math
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from .base import ImageInput, ProviderBase
+from ..core.inputs import InputFile
+from ..models import LightroomSettings
+
+logger = logging.getLogger(__name__)
+
+# Longest edge the image is decoded at; histograms don't need more
+ANALYSIS_EDGE = 512
+
+# Scene-referred middle gray (linear) that the median luminance is pushed towards
+MIDDLE_GRAY = 0.18
+# Post-exposure targets for the 99.5th / 0.5th luma percentiles (display-referred)
+WHITE_POINT = 0.96
+BLACK_POINT = 0.03
+NEUTRAL_TEMP = 5500
+
+
+def _srgb_to_linear(values: np.ndarray) -> np.ndarray:
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(values: np.ndarray) -> np.ndarray:
+    return np.where(values <= 0.0031308, values * 12.92, 1.055 * np.power(values, 1 / 2.4) - 0.055)
+
+
+def _clamp(value: float, low: int, high: int) -> int:
+    return int(max(low, min(high, round(value))))
+
+
+def estimate_settings(rgb: np.ndarray) -> LightroomSettings:
+    """
+    Auto-tone from an sRGB image (H x W x 3, floats in 0..1):
+
+    - exposure: moves the median linear luminance to middle gray
+    - highlights / shadows: recover the share of pixels clipped after that exposure
+    - whites / blacks: stretch the 99.5th / 0.5th luma percentiles to the target points
+    - color_temp / tint: gray-world white balance from the mean of the midtones
+    """
+    linear = _srgb_to_linear(rgb.reshape(-1, 3))
+    luminance = linear @ np.array([0.2126, 0.7152, 0.0722])
+
+    median = max(float(np.median(luminance)), 1e-4)
+    exposure = max(-5.0, min(5.0, math.log2(MIDDLE_GRAY / median)))
+
+    luma = _linear_to_srgb(np.clip(luminance * 2.0 ** exposure, 0.0, 1.0))
+    clipped_high = float(np.mean(luma >= 254 / 255))
+    clipped_low = float(np.mean(luma <= 1 / 255))
+    low, high = np.percentile(luma, [0.5, 99.5])
+
+    # Gray world on well-exposed pixels: a neutral scene averages to R = G = B
+    midtones = linear[(luminance > 0.01) & (luminance < 0.9)]
+    if len(midtones) < 16:
+        midtones = linear
+    red, green, blue = np.maximum(midtones.mean(axis=0), 1e-4)
+
+    return LightroomSettings(
+        exposure=round(exposure, 2),
+        highlights=_clamp(-1000 * clipped_high, -100, 0),
+        shadows=_clamp(1000 * clipped_low, 0, 100),
+        whites=_clamp((WHITE_POINT - high) * 200, -100, 100),
+        blacks=_clamp((BLACK_POINT - low) * 200, -100, 100),
+        # A blue cast needs a warmer (higher) setting, a green cast a magenta (positive) tint
+        color_temp=_clamp(NEUTRAL_TEMP * blue / red, 2000, 50000),
+        tint=_clamp(100 * math.log2(green / math.sqrt(red * blue)), -150, 150),
+    )
+
+
+def load_rgb(image: ImageInput, max_edge: int = ANALYSIS_EDGE) -> np.ndarray:
+    """Decodes an image to an sRGB float array no larger than `max_edge`."""
+    with InputFile.coerce(image).buffer() as buf:
+        with Image.open(io.BytesIO(buf)) as img:
+            img.draft("RGB", (max_edge, max_edge))
+            img = img.convert("RGB")
+            img.thumbnail((max_edge, max_edge), Image.Resampling.BOX)
+            return np.asarray(img, dtype=np.float32) / 255.0
+
+
+class HistogramProvider(ProviderBase):
+    """
+    Local provider that derives basic tone and white balance from the image
+    histogram. It needs no network or API key and answers in milliseconds,
+    so it serves as an instant draft or a fallback for the model providers.
+    The XMP sidecar is ignored.
+    """
+    model = "histogram"
+    # Decoded straight at analysis size, so skip the upload downscale
+    image_spec = None
+
+    async def process(self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None) -> LightroomSettings:
+        image_path = await self.prepare(image_path)
+        rgb = await asyncio.to_thread(load_rgb, image_path)
+        settings = await asyncio.to_thread(estimate_settings, rgb)
+        logger.info(f"Histogram settings for {image_path.name}: {settings.model_dump(exclude_none=True)}")
+        return settings
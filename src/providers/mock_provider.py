@@ -3,7 +3,7 @@ import logging
 from pathlib import Path
 from typing import Optional
 
-from .base import ProviderBase
+from .base import ImageInput, ProviderBase
 from ..models import LightroomSettings
 
 logger = logging.getLogger(__name__)
@@ -13,7 +13,7 @@ class MockProvider(ProviderBase):
     Mock provider for testing the MCP flow without needing API keys.
     Returns hardcoded Lightroom settings.
     """
-    async def process(self, image_path: Path, xmp_path: Optional[Path] = None) -> LightroomSettings:
+    async def process(self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None) -> LightroomSettings:
         logger.info(f"Mock analyzing image: {image_path}")
         await asyncio.sleep(1) # Simulate some processing time
 
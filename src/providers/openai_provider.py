@@ -2,27 +2,50 @@ import json
 import logging
 import base64
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, List, Optional
 
 from pydantic import ValidationError
 from openai import AsyncOpenAI
 
-from .base import ProviderBase
-from ..models import LightroomSettings
+from .base import ImageInput, ProviderBase
+from ..core.inputs import InputFile
+from .prompts import build_batch_prompt, estimate_tokens, load_xmp_context, xmp_prompt
+from ..models import LightroomSettings, LightroomResponse
+from ..core.parser import expand_response, stream_settings
+from ..core.preprocess import DEFAULT_IMAGE_SPEC, ImageSpec, image_mime_type
+from ..core.ratelimit import shared_limiter
 
 logger = logging.getLogger(__name__)
 
+# Streamed responses can't use `.parse`, so the schema is passed as a plain JSON schema
+SETTINGS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "LightroomSettings", "schema": LightroomSettings.model_json_schema()},
+}
+
+def _image_url(image_path: ImageInput) -> str:
+    mime_type = image_mime_type(image_path)
+    # Encode straight from the (memory-mapped) buffer instead of reading a copy first
+    with InputFile.coerce(image_path).buffer() as buf:
+        base64_image = base64.b64encode(buf).decode('utf-8')
+    return f"data:{mime_type};base64,{base64_image}"
+
 class OpenAIProvider(ProviderBase):
     """
     Provider that invokes the OpenAI API directly (using gpt-4o for vision).
     Requires OPENAI_API_KEY environment variable.
     """
-    def __init__(self, api_key: Optional[str] = None):
-        # AsyncOpenAI falls back to OPENAI_API_KEY env var if api_key is None
-        self.client = AsyncOpenAI(api_key=api_key)
+    def __init__(self, api_key: Optional[str] = None, image_spec: Optional[ImageSpec] = DEFAULT_IMAGE_SPEC):
+        # AsyncOpenAI falls back to OPENAI_API_KEY env var if api_key is None. Its own
+        # retries are off: 429/503 go back to the shared limiter, which backs off every
+        # call to the model together instead of each call retrying underneath it
+        self.client = AsyncOpenAI(api_key=api_key, max_retries=0)
         self.model = "gpt-4o"
+        self.image_spec = image_spec
+        # Shared with every other OpenAIProvider of this model in the process
+        self.limiter = shared_limiter(f"openai:{self.model}")
 
-    async def process(self, image_path: Path, xmp_path: Optional[Path] = None) -> LightroomSettings:
+    async def _single_messages(self, image_path: ImageInput, xmp_path: Optional[ImageInput]) -> list:
         prompt = (
             "You are an expert professional photographer and color grader. "
             "Analyze the provided image and suggest Adobe Lightroom develop settings to "
@@ -30,18 +53,9 @@ class OpenAIProvider(ProviderBase):
             "Output your highly tuned settings. Focus on bringing out the best light, contrast, and color mood.\n"
         )
         
-        if xmp_path and xmp_path.exists():
-            xmp_content = xmp_path.read_text(encoding="utf-8")
-            prompt += f"\n\nHere are the current XMP settings for reference (they may be sub-optimal or zeroed):\n```xml\n{xmp_content}\n```\n"
-
-        # Read and encode image
-        with open(image_path, "rb") as image_file:
-            base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-            
-        mime_type = "image/jpeg"
-        if image_path.suffix.lower() == ".png":
-            mime_type = "image/png"
+        prompt += xmp_prompt(load_xmp_context(xmp_path))
 
+        image_path = await self.prepare(image_path)
         messages = [
             {
                 "role": "system",
@@ -57,22 +71,46 @@ class OpenAIProvider(ProviderBase):
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:{mime_type};base64,{base64_image}"
+                            "url": _image_url(image_path)
                         }
                     }
                 ]
             }
         ]
         
-        logger.info(f"Invoking OpenAI API ({self.model})")
-        
+        logger.info(f"Invoking OpenAI API ({self.model}) (prompt {len(prompt)} chars, ~{estimate_tokens(prompt)} tokens)")
+        return messages
+
+    async def stream(
+        self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None
+    ) -> AsyncIterator[LightroomSettings]:
+        messages = await self._single_messages(image_path, xmp_path)
+
+        async def chunks():
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                response_format=SETTINGS_RESPONSE_FORMAT,
+                stream=True,
+            )
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+        # Retried while throttled before the first chunk, like `process`
+        async for settings in stream_settings(self.limiter.stream(chunks)):
+            yield settings
+
+    async def process(self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None) -> LightroomSettings:
+        messages = await self._single_messages(image_path, xmp_path)
+
         try:
             # We use Structured Outputs via response_format parsing
-            completion = await self.client.beta.chat.completions.parse(
+            completion = await self.limiter.call(lambda: self.client.beta.chat.completions.parse(
                 model=self.model,
                 messages=messages,
                 response_format=LightroomSettings,
-            )
+            ))
             
             settings = completion.choices[0].message.parsed
             if not settings:
@@ -86,3 +124,44 @@ class OpenAIProvider(ProviderBase):
         except Exception as e:
             logger.exception("OpenAI Provider error")
             raise e
+
+    async def process_group(
+        self, image_paths: List[ImageInput], xmp_paths: List[Optional[ImageInput]]
+    ) -> List[LightroomSettings]:
+        xmp_contexts = [load_xmp_context(xmp_path) for xmp_path in xmp_paths]
+        image_paths = [await self.prepare(image_path) for image_path in image_paths]
+        prompt = build_batch_prompt(len(image_paths), xmp_contexts)
+        content = [{"type": "text", "text": prompt}]
+        for i, image_path in enumerate(image_paths, start=1):
+            content.append({"type": "text", "text": f"Image {i}:"})
+            content.append({"type": "image_url", "image_url": {"url": _image_url(image_path)}})
+
+        messages = [
+            {"role": "system", "content": "You are a professional Lightroom master editor."},
+            {"role": "user", "content": content},
+        ]
+
+        logger.info(
+            f"Invoking OpenAI API ({self.model}) for a batch of {len(image_paths)} images "
+            f"(prompt {len(prompt)} chars, ~{estimate_tokens(prompt)} tokens)"
+        )
+
+        try:
+            completion = await self.limiter.call(lambda: self.client.beta.chat.completions.parse(
+                model=self.model,
+                messages=messages,
+                response_format=LightroomResponse,
+            ))
+
+            response = completion.choices[0].message.parsed
+            if not response:
+                raise ValueError("OpenAI failed to return a structured batch response.")
+
+            return expand_response(response, len(image_paths))
+
+        except ValidationError as e:
+            logger.error(f"Failed to parse OpenAPI JSON structure: {e}")
+            raise e
+        except Exception as e:
+            logger.exception("OpenAI Provider batch error")
+            raise e
@@ -0,0 +1,81 @@
+import logging
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Union
+
+from ..core.inputs import InputFile
+from ..xmp_utils import xmp_context
+
+logger = logging.getLogger(__name__)
+
+PROMPTS_DIR = Path(__file__).parent.parent / "prompts"
+
+# Hard limit from the LightroomBot prompt ("analyzes up to 4 photos")
+MAX_BATCH_SIZE = 4
+
+@lru_cache(maxsize=None)
+def load_prompt(name: str) -> str:
+    """Loads a prompt template from src/prompts/<name>.md (cached after the first read)."""
+    return (PROMPTS_DIR / f"{name}.md").read_text(encoding="utf-8")
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token) for logging prompt sizes."""
+    return (len(text) + 3) // 4
+
+def _summarize_xmp(xmp_content: str, name: str) -> Optional[str]:
+    context = xmp_context(xmp_content)
+    logger.info(
+        f"XMP context for {name}: {len(xmp_content)} -> {len(context or '')} chars "
+        f"(~{estimate_tokens(xmp_content)} -> ~{estimate_tokens(context or '')} tokens)"
+    )
+    return context
+
+@lru_cache(maxsize=4096)
+def _cached_xmp_context(path: str, mtime_ns: int, size: int) -> Optional[str]:
+    # mtime and size are part of the key, so an edited sidecar is read again
+    return _summarize_xmp(Path(path).read_text(encoding="utf-8"), os.path.basename(path))
+
+def load_xmp_context(xmp_path: Optional[Union[Path, InputFile]]) -> Optional[str]:
+    """
+    The compact develop settings (see `xmp_context`) of a sidecar, or None if
+    there is none. Sidecars on disk are cached per path, mtime and size.
+    """
+    if not xmp_path or not xmp_path.exists():
+        return None
+    path = xmp_path.path if isinstance(xmp_path, InputFile) else Path(xmp_path)
+    if path is None:
+        return _summarize_xmp(xmp_path.read_text(encoding="utf-8"), xmp_path.name)
+    stat = path.stat()
+    return _cached_xmp_context(str(path), stat.st_mtime_ns, stat.st_size)
+
+def xmp_prompt(xmp_context: Optional[str]) -> str:
+    """Prompt section carrying the current settings of a single image, if any."""
+    if not xmp_context:
+        return ""
+    return f"\n\nCurrent develop settings from the XMP sidecar (they may be sub-optimal or zeroed): {xmp_context}\n"
+
+def build_batch_prompt(image_count: int, xmp_contexts: Optional[List[Optional[str]]] = None) -> str:
+    """
+    Builds the LightroomBot prompt for a single request covering `image_count` images.
+    `xmp_contexts` holds the compact current settings of each image (see
+    `load_xmp_context`, or None), in image order.
+    """
+    if not 1 <= image_count <= MAX_BATCH_SIZE:
+        raise ValueError(f"Batch prompt supports 1-{MAX_BATCH_SIZE} images, got {image_count}.")
+
+    prompt = load_prompt("lightroom_bot")
+    prompt += (
+        f"\n\nNON-INTERACTIVE BATCH MODE\n"
+        f"- {image_count} image(s) are attached, in order, labelled \"Image 1\" to \"Image {image_count}\".\n"
+        "- There is no user to answer questions. If White Balance is not provided below, estimate "
+        "Temperature and Tint from the images yourself and do NOT set `clarification_needed`.\n"
+        "- `per_image_adjustments[].image_index` refers to these labels. Values there are absolute "
+        "targets that replace the corresponding `global_settings` value for that image.\n"
+    )
+
+    for i, context in enumerate(xmp_contexts or [], start=1):
+        if context:
+            prompt += f"\nCurrent XMP settings for Image {i} (they may be sub-optimal or zeroed): {context}\n"
+
+    return prompt
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+from .base import ImageInput, ProviderBase
+from ..core.cache import DerivativeCache
+from ..core.parser import ClarificationNeeded, settings_problems
+from ..core.pipeline import percentile
+from ..models import LightroomSettings
+
+logger = logging.getLogger(__name__)
+
+# Fields a tier must fill in for its answer to be accepted
+DEFAULT_REQUIRED = ("exposure", "contrast", "highlights", "shadows", "whites", "blacks")
+# Most recent call latencies kept per tier for the percentile stats
+LATENCY_WINDOW = 1000
+
+
+@dataclass
+class TierStats:
+    """Counters of one tier: requests sent, images answered or escalated, latencies."""
+    name: str
+    requests: int = 0
+    images: int = 0
+    escalated: int = 0
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+
+    @property
+    def escalation_rate(self) -> float:
+        return self.escalated / self.images if self.images else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies = list(self.latencies)
+        return {
+            "name": self.name,
+            "requests": self.requests,
+            "images": self.images,
+            "escalated": self.escalated,
+            "escalation_rate": round(self.escalation_rate, 4),
+            "latency_p50": round(percentile(latencies, 50), 3),
+            "latency_p95": round(percentile(latencies, 95), 3),
+        }
+
+
+def _tier_name(provider: ProviderBase) -> str:
+    return getattr(provider, "model", None) or provider.__class__.__name__
+
+
+def _error_reason(error: Exception) -> str:
+    if isinstance(error, ClarificationNeeded):
+        return "clarification"
+    # pydantic's ValidationError is a ValueError too
+    return "invalid" if isinstance(error, ValueError) else "error"
+
+
+def _problem_reason(problem: str) -> str:
+    if problem.startswith("clarification needed"):
+        return "clarification"
+    return "missing" if problem.startswith("missing ") else "out of range"
+
+
+class TieredProvider(ProviderBase):
+    """
+    Routes each request through `tiers`, cheapest first. A tier's answer is kept
+    unless the call fails (errors, validation failures, clarification requests),
+    the model asks for clarification alongside its settings, or the settings miss
+    a `required` field or leave their documented range;
+    only then is the image sent to the next tier. The last tier's answer is
+    returned as-is, and its errors are raised.
+
+    Per-tier latency and escalation counts are available from `stats()`.
+    """
+    def __init__(self, tiers: Sequence[ProviderBase], required: Sequence[str] = DEFAULT_REQUIRED):
+        if not tiers:
+            raise ValueError("TieredProvider requires at least one tier.")
+        self.tiers = list(tiers)
+        self.required = tuple(required)
+        self.tier_stats = [TierStats(_tier_name(tier)) for tier in self.tiers]
+        self.escalation_reasons: Counter = Counter()
+        self.prompt_version = "+".join(tier.prompt_version for tier in self.tiers)
+
+    @property
+    def model(self) -> str:
+        return "+".join(stats.name for stats in self.tier_stats)
+
+    @property
+    def derivative_cache(self) -> Optional[DerivativeCache]:
+        return self.tiers[0].derivative_cache
+
+    @derivative_cache.setter
+    def derivative_cache(self, cache: Optional[DerivativeCache]):
+        for tier in self.tiers:
+            tier.derivative_cache = cache
+
+    async def aclose(self):
+        await asyncio.gather(*(tier.aclose() for tier in self.tiers))
+
+    async def prepare(self, image_path: ImageInput) -> ImageInput:
+        # Prepared once, to the first tier's spec, and reused by every escalation
+        return await self.tiers[0].prepare(image_path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tiers": [stats.to_dict() for stats in self.tier_stats],
+            "escalation_reasons": dict(self.escalation_reasons),
+        }
+
+    async def process(self, image_path: ImageInput, xmp_path: Optional[ImageInput] = None) -> LightroomSettings:
+        return (await self._route([image_path], [xmp_path]))[0]
+
+    async def process_group(
+        self, image_paths: List[ImageInput], xmp_paths: List[Optional[ImageInput]]
+    ) -> List[LightroomSettings]:
+        return await self._route(image_paths, xmp_paths)
+
+    def _escalate(self, level: int, image: ImageInput, reasons: List[str]):
+        self.tier_stats[level].escalated += 1
+        self.escalation_reasons.update(set(reasons))
+        logger.info(
+            f"Escalating {image.name} from {self.tier_stats[level].name} "
+            f"to {self.tier_stats[level + 1].name}: {', '.join(reasons)}"
+        )
+
+    async def _route(
+        self, image_paths: List[ImageInput], xmp_paths: List[Optional[ImageInput]]
+    ) -> List[LightroomSettings]:
+        image_paths = [await self.prepare(image_path) for image_path in image_paths]
+        results: List[Optional[LightroomSettings]] = [None] * len(image_paths)
+        pending = list(range(len(image_paths)))
+
+        for level, tier in enumerate(self.tiers):
+            final = level == len(self.tiers) - 1
+            stats = self.tier_stats[level]
+            group = [image_paths[i] for i in pending]
+            group_xmps = [xmp_paths[i] for i in pending]
+            stats.requests += 1
+            stats.images += len(pending)
+
+            started = time.perf_counter()
+            try:
+                if len(group) == 1:
+                    answers = [await tier.process(group[0], group_xmps[0])]
+                else:
+                    answers = await tier.process_group(group, group_xmps)
+                if len(answers) != len(group):
+                    raise ValueError(f"Tier returned {len(answers)} result(s) for {len(group)} image(s).")
+            except Exception as e:
+                if final:
+                    raise
+                for image in group:
+                    self._escalate(level, image, [_error_reason(e)])
+                logger.warning(f"Tier {stats.name} failed: {e}")
+                continue
+            finally:
+                stats.latencies.append(time.perf_counter() - started)
+
+            escalate = []
+            for i, settings in zip(pending, answers):
+                problems = settings_problems(settings, self.required)
+                if problems and not final:
+                    self._escalate(level, image_paths[i], [_problem_reason(p) for p in problems])
+                    escalate.append(i)
+                    continue
+                if problems:
+                    logger.warning(f"Last tier's settings for {image_paths[i].name} still have problems: {problems}")
+                results[i] = settings
+            pending = escalate
+            if not pending:
+                break
+
+        return results
@@ -1,6 +1,14 @@
+import json
+import math
+import os
+import re
+import tempfile
 import xml.etree.ElementTree as ET
-from typing import Optional
-from .models import LightroomSettings
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, Optional, TypeVar, Union
+from .models import CRS_FIELD_MAPPING, LightroomSettings, settings_to_crs
+
+T = TypeVar("T")
 
 # Namespace mapping for Lightroom XMP
 XMP_NS = {
@@ -22,9 +30,8 @@ def generate_xmp(settings: LightroomSettings, original_xmp_content: Optional[str
         try:
             # Parse the existing XMP and update the crs attributes
             root = ET.fromstring(original_xmp_content)
-            # Find the rdf:Description element which usually holds the crs namespace attributes
-            description_xpath = ".//rdf:Description"
-            desc_elem = root.find(description_xpath, XMP_NS)
+            # The rdf:Description that holds the crs attributes, as in `splice_xmp`
+            desc_elem = _crs_description(root.iter(_DESCRIPTION_TAG), _has_crs_attributes)
             
             if desc_elem is not None:
                 _apply_settings_to_element(desc_elem, settings)
@@ -51,29 +58,223 @@ def generate_xmp(settings: LightroomSettings, original_xmp_content: Optional[str
     xmp_str += '\n<?xpacket end="w"?>'
     return xmp_str
 
+# Start tag of an rdf:Description, with quoted attribute values that may contain '>'
+_DESCRIPTION_RE = re.compile(r"""<rdf:Description\b(?:[^>"']|"[^"]*"|'[^']*')*>""")
+
+def _crs_prefix(xmp_content: str) -> Optional[str]:
+    match = re.search(r"""xmlns:([\w.-]+)\s*=\s*["']%s["']""" % re.escape(XMP_NS['crs']), xmp_content)
+    return match.group(1) if match else None
+
+def _crs_description(descriptions: Iterable[T], has_crs: Callable[[T], bool]) -> Optional[T]:
+    """
+    The rdf:Description that holds a sidecar's develop values: the first one with
+    crs attributes, else the first one (where new values are added). Every reader
+    and writer picks it this way. Stops at the first match, so `descriptions` can
+    be produced while parsing.
+    """
+    first = None
+    for description in descriptions:
+        if has_crs(description):
+            return description
+        if first is None:
+            first = description
+    return first
+
+def splice_xmp(xmp_content: str, settings: LightroomSettings) -> Optional[str]:
+    """
+    Rewrites the `crs:` values of `settings` in an existing sidecar by editing the
+    text in place instead of a parse / re-serialize round-trip, so everything else
+    (the xpacket wrapper, other namespaces, history, formatting) stays byte-for-byte.
+    Existing attributes and simple elements are updated and missing ones are added
+    to the rdf:Description that carries the crs namespace. Size changes are taken
+    out of / given back to the xpacket padding where there is enough of it.
+
+    Returns None if the document has no rdf:Description to edit.
+    """
+    descriptions = list(_DESCRIPTION_RE.finditer(xmp_content))
+    if not descriptions:
+        return None
+    declared = _crs_prefix(xmp_content)
+    prefix = declared or "crs"
+    target = _crs_description(descriptions, lambda match: f"{prefix}:" in match.group(0))
+
+    tag = target.group(0)
+    # New attributes follow the layout of the last existing one
+    indents = re.findall(r"\n([ \t]*)[\w.-]+:[\w.-]+\s*=", tag)
+    separator = f"\n{indents[-1]}" if indents else " "
+    body = xmp_content[target.end():]
+
+    added = []
+    if declared is None:
+        added.append(f'xmlns:{prefix}="{XMP_NS["crs"]}"')
+    for crs_attr, val in settings_to_crs(settings).items():
+        attr = re.compile(r"""(\s%s:%s\s*=\s*)(["'])[^"']*\2""" % (re.escape(prefix), crs_attr))
+        if attr.search(tag):
+            tag = attr.sub(lambda m: f"{m.group(1)}{m.group(2)}{val}{m.group(2)}", tag, count=1)
+            continue
+        element = re.compile(r"(<%s:%s>)[^<]*(</%s:%s>)" % (re.escape(prefix), crs_attr, re.escape(prefix), crs_attr))
+        if element.search(body):
+            body = element.sub(lambda m: f"{m.group(1)}{val}{m.group(2)}", body, count=1)
+            continue
+        added.append(f'{prefix}:{crs_attr}="{val}"')
+
+    if added:
+        end = len(tag) - (2 if tag.endswith("/>") else 1)
+        tag = tag[:end].rstrip() + "".join(separator + a for a in added) + tag[end:]
+
+    spliced = xmp_content[:target.start()] + tag + body
+    delta = len(spliced) - len(xmp_content)
+    # Whitespace padding Adobe leaves before the closing xpacket for in-place edits
+    pad_end = spliced.rfind("<?xpacket end=")
+    if delta and pad_end > 0:
+        pad_start = len(spliced[:pad_end].rstrip(" \t\r\n"))
+        pad = spliced[pad_start:pad_end]
+        if pad and delta < 0:
+            pad = pad[:-1] + " " * -delta + pad[-1]
+        elif len(pad) - delta >= 2:
+            pad = pad[:-1 - delta] + pad[-1]
+        spliced = spliced[:pad_start] + pad + spliced[pad_end:]
+    return spliced
+
+def write_xmp(path: Union[str, Path], xmp_content: str):
+    """
+    Writes a sidecar atomically: the content goes to a temporary file in the same
+    directory which then replaces `path`, so a crash never leaves a truncated XMP.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(xmp_content)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
 def _apply_settings_to_element(element: ET.Element, settings: LightroomSettings):
     """
     Applies the settings to the given XML element as namespaced attributes.
     """
-    mapping = {
-        "exposure": "Exposure2012",
-        "contrast": "Contrast2012",
-        "highlights": "Highlights2012",
-        "shadows": "Shadows2012",
-        "whites": "Whites2012",
-        "blacks": "Blacks2012",
-        "texture": "Texture",
-        "clarity": "Clarity2012",
-        "dehaze": "Dehaze",
-        "vibrance": "Vibrance",
-        "saturation": "Saturation",
-        "color_temp": "Temperature",
-        "tint": "Tint",
+    for crs_attr, val in settings_to_crs(settings).items():
+        # Add or update the attribute in the crs namespace
+        attr_qname = f"{{{XMP_NS['crs']}}}{crs_attr}"
+        element.set(attr_qname, str(val))
+
+def read_crs_values(xmp_content: str) -> Dict[str, str]:
+    """
+    Returns the `crs:` values of the rdf:Description that holds them in an XMP
+    document (see `_crs_description`), keyed by local name (e.g. "Exposure2012") with whitespace-normalized string values.
+    Both attribute (`crs:Exposure2012="0.5"`) and simple element forms are read.
+    Unparseable XMP yields an empty dict.
+    """
+    try:
+        root = ET.fromstring(xmp_content)
+    except ET.ParseError:
+        return {}
+
+    desc_elem = _crs_description(root.iter(_DESCRIPTION_TAG), _has_crs_attributes)
+    if desc_elem is None:
+        return {}
+
+    crs_prefix = f"{{{XMP_NS['crs']}}}"
+    values = {}
+    for qname, val in desc_elem.attrib.items():
+        if qname.startswith(crs_prefix):
+            values[qname[len(crs_prefix):]] = " ".join(val.split())
+    for child in desc_elem:
+        if child.tag.startswith(crs_prefix) and len(child) == 0 and child.text:
+            values[child.tag[len(crs_prefix):]] = " ".join(child.text.split())
+    return values
+
+_CRS_NS = f"{{{XMP_NS['crs']}}}"
+_DESCRIPTION_TAG = f"{{{XMP_NS['rdf']}}}Description"
+_CRS_FIELDS = {crs_attr: field for field, crs_attr in CRS_FIELD_MAPPING.items()}
+# A mapped value written in element form (`<crs:Exposure2012>0.5</crs:Exposure2012>`)
+_CRS_ELEMENT_RE = re.compile(rb"<[\w.-]+:(?:%s)>" % b"|".join(name.encode() for name in _CRS_FIELDS))
+# Bytes handed to the parser at a time; a Description usually starts within the first one
+_READ_CHUNK = 4096
+
+def _settings_value(field: str, raw: str) -> Optional[Union[int, float]]:
+    try:
+        number = float(raw)
+    except ValueError:
+        return None
+    if not math.isfinite(number):
+        return None
+    return number if field == "exposure" else round(number)
+
+def _has_crs_attributes(elem: ET.Element) -> bool:
+    return any(name.startswith(_CRS_NS) for name in elem.attrib)
+
+def _iter_descriptions(data: bytes) -> Iterator[ET.Element]:
+    # rdf:Description start tags as the parser reaches them; stops at a parse error
+    parser = ET.XMLPullParser(events=("start",))
+    try:
+        for offset in range(0, len(data), _READ_CHUNK):
+            parser.feed(data[offset:offset + _READ_CHUNK])
+            for _, elem in parser.read_events():
+                if elem.tag == _DESCRIPTION_TAG:
+                    yield elem
+    except ET.ParseError:
+        return
+
+def _description_attributes(data: bytes) -> Optional[Dict[str, str]]:
+    # Parses only up to the start tag of the rdf:Description with the crs attributes
+    description = _crs_description(_iter_descriptions(data), _has_crs_attributes)
+    return dict(description.attrib) if description is not None else None
+
+def read_xmp_settings(source: Union[str, Path, bytes]) -> Optional[LightroomSettings]:
+    """
+    Reads the develop values of a sidecar back into LightroomSettings (the reverse
+    of `_apply_settings_to_element`), from a path or the XMP text/bytes.
+
+    The parser stops at the start tag of the first rdf:Description with crs
+    attributes, so history, tone curves and padding are never parsed.
+    Only a sidecar that also uses the element form is parsed in full (see
+    `read_crs_values`). Unmapped or non-numeric values are ignored. Returns None if
+    the XMP is unparseable or has no rdf:Description.
+    """
+    if isinstance(source, Path) or (isinstance(source, str) and not source.lstrip().startswith("<")):
+        data = Path(source).read_bytes()
+    else:
+        data = source.encode("utf-8") if isinstance(source, str) else source
+
+    attributes = _description_attributes(data)
+    if attributes is None:
+        return None
+    values = {
+        _CRS_FIELDS[qname[len(_CRS_NS):]]: raw
+        for qname, raw in attributes.items()
+        if qname.startswith(_CRS_NS) and qname[len(_CRS_NS):] in _CRS_FIELDS
     }
-    
-    for field, crs_attr in mapping.items():
-        val = getattr(settings, field)
-        if val is not None:
-            # Add or update the attribute in the crs namespace
-            attr_qname = f"{{{XMP_NS['crs']}}}{crs_attr}"
-            element.set(attr_qname, str(val))
+    if _CRS_ELEMENT_RE.search(data):
+        crs_values = read_crs_values(data.decode("utf-8"))
+        values.update((field, crs_values[name]) for name, field in _CRS_FIELDS.items() if name in crs_values)
+
+    settings = {}
+    for field, raw in values.items():
+        value = _settings_value(field, raw)
+        if value is not None:
+            settings[field] = value
+    return LightroomSettings(**settings)
+
+def xmp_context(xmp_content: str) -> Optional[str]:
+    """
+    Condenses an XMP sidecar to the develop values the models work with: a compact
+    JSON object keyed by LightroomSettings field name (mapped through
+    CRS_FIELD_MAPPING, like `_apply_settings_to_element`). History, masks, tone
+    curves and everything else are dropped. Returns None if no value is set.
+    """
+    crs_values = read_crs_values(xmp_content)
+    values = {}
+    for field, crs_attr in CRS_FIELD_MAPPING.items():
+        raw = crs_values.get(crs_attr)
+        if raw is None:
+            continue
+        try:
+            number = float(raw)
+        except ValueError:
+            continue
+        values[field] = int(number) if number.is_integer() and field != "exposure" else number
+    return json.dumps(values, separators=(",", ":")) if values else None
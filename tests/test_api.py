@@ -52,3 +52,106 @@ def test_analyze_endpoint_xmp(mock_provider):
     assert "application/rdf+xml" in response.headers["content-type"]
     assert b"crs:Exposure2012=\"0.5\"" in response.content
     assert b"crs:Temperature=\"6000\"" in response.content
+
+@patch('src.main.provider')
+def test_analyze_stream_ndjson_in_completion_order(mock_provider):
+    import asyncio
+    import json
+
+    async def mock_process(image_path, xmp_path=None):
+        content = image_path.read_bytes()
+        if content == b"slow":
+            await asyncio.sleep(0.2)
+        if content == b"broken":
+            raise RuntimeError("bad image")
+        return LightroomSettings(exposure=0.5)
+
+    mock_provider.process = mock_process
+
+    files = [
+        ('images', ('slow.jpg', b"slow", 'image/jpeg')),
+        ('images', ('fast.jpg', b"fast", 'image/jpeg')),
+        ('images', ('broken.jpg', b"broken", 'image/jpeg')),
+    ]
+    response = client.post("/analyze/stream", files=files)
+
+    assert response.status_code == 200
+    assert "application/x-ndjson" in response.headers["content-type"]
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert len(events) == 3
+    assert events[-1]["filename"] == "slow.jpg" and events[-1]["index"] == 0
+    by_name = {e["filename"]: e for e in events}
+    assert by_name["fast.jpg"]["settings"]["exposure"] == 0.5
+    assert "bad image" in by_name["broken.jpg"]["error"]
+
+@patch('src.main.provider')
+def test_analyze_stream_sse_with_xmp_payload(mock_provider):
+    async def mock_process(*args, **kwargs):
+        return LightroomSettings(exposure=0.5, color_temp=6000)
+
+    mock_provider.process = mock_process
+
+    files = [('images', ('a.jpg', b"a", 'image/jpeg'))]
+    response = client.post("/analyze/stream?format=xmp", files=files, headers={"Accept": "text/event-stream"})
+
+    assert response.status_code == 200
+    assert "text/event-stream" in response.headers["content-type"]
+    assert response.text.startswith("event: result\ndata: ")
+    assert 'crs:Temperature=\\"6000\\"' in response.text
+    assert response.text.endswith("event: done\ndata: {}\n\n")
+
+@patch('src.main.provider')
+def test_analyze_passes_uploads_without_temp_files(mock_provider):
+    from src.core.inputs import InputFile
+
+    received = {}
+
+    async def mock_process(image_path, xmp_path=None):
+        received["image"] = image_path
+        received["image_bytes"] = image_path.read_bytes()
+        received["xmp"] = xmp_path
+        return LightroomSettings(exposure=0.5)
+
+    mock_provider.process = mock_process
+
+    files = {
+        'image': ('photo.jpg', b"fake_image_data", 'image/jpeg'),
+        'xmp': ('photo.xmp', b"<x:xmpmeta xmlns:x='adobe:ns:meta/'/>", 'application/rdf+xml'),
+    }
+    response = client.post("/analyze", files=files)
+
+    assert response.status_code == 200
+    assert isinstance(received["image"], InputFile) and received["image"].path is None
+    assert received["image_bytes"] == b"fake_image_data"
+    assert received["xmp"].name == "photo.xmp"
+
+def test_analyze_rejects_oversize_upload():
+    from src.main import MaxBodySizeMiddleware
+
+    limited = TestClient(MaxBodySizeMiddleware(app, max_bytes=1024))
+    files = {'image': ('big.jpg', b"x" * 4096, 'image/jpeg')}
+    response = limited.post("/analyze", files=files)
+
+    assert response.status_code == 413
+
+def test_analyze_rejects_oversize_chunked_upload():
+    from src.main import MaxBodySizeMiddleware
+
+    limited = TestClient(MaxBodySizeMiddleware(app, max_bytes=1024))
+    boundary = "oversize"
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"big.jpg\"\r\n"
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + b"x" * 4096 + f"\r\n--{boundary}--\r\n".encode()
+
+    def chunks():
+        for start in range(0, len(body), 512):
+            yield body[start:start + 512]
+
+    # A generator body is sent chunked, without Content-Length
+    response = limited.post(
+        "/analyze", content=chunks(), headers={"content-type": f"multipart/form-data; boundary={boundary}"}
+    )
+
+    assert response.status_code == 413
+    assert "limit" in response.json()["detail"]
@@ -0,0 +1,96 @@
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from typer.testing import CliRunner
+
+from src import cli
+
+from src.models import LightroomResponse, LightroomSettings
+from src.providers.base import ProviderBase
+from src.providers.gemini_api_provider import GeminiAPIProvider
+from src.providers.prompts import build_batch_prompt
+
+class GroupRecordingProvider(ProviderBase):
+    def __init__(self):
+        self.groups = []
+        self.singles = []
+
+    async def process(self, image_path, xmp_path=None):
+        self.singles.append(image_path)
+        return LightroomSettings(exposure=-1.0)
+
+    async def process_group(self, image_paths, xmp_paths):
+        self.groups.append(list(image_paths))
+        return [LightroomSettings(exposure=float(p.stem)) for p in image_paths]
+
+def test_process_batch_groups_in_order():
+    provider = GroupRecordingProvider()
+    paths = [Path(f"{i}.jpg") for i in range(9)]
+
+    results = asyncio.run(provider.process_batch(paths))
+
+    assert [len(g) for g in provider.groups] == [4, 4]
+    assert provider.singles == [Path("8.jpg")]
+    assert [r.exposure for r in results] == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, -1.0]
+
+def test_process_batch_rejects_bad_batch_size():
+    with pytest.raises(ValueError):
+        asyncio.run(GroupRecordingProvider().process_batch([Path("a.jpg")], batch_size=5))
+
+def test_process_batch_command_sends_batch_size_images_per_request(tmp_path):
+    class CLIProvider(GroupRecordingProvider):
+        created = []
+
+        def __init__(self, cli_path=None, image_spec=None):
+            super().__init__()
+            CLIProvider.created.append(self)
+
+    paths = []
+    for i in range(9):
+        path = tmp_path / f"{i}.jpg"
+        path.write_bytes(b"jpeg")
+        paths.append(str(path))
+
+    with patch.object(cli, "GeminiCLIProvider", CLIProvider):
+        default = CliRunner().invoke(cli.app, ["process-batch", *paths])
+        single = CliRunner().invoke(cli.app, ["process-batch", *paths, "--batch-size", "1"])
+        invalid = CliRunner().invoke(cli.app, ["process-batch", *paths, "--batch-size", "5"])
+
+    # ceil(9 / 4) requests by default, one per image with --batch-size 1
+    assert default.exit_code == 0 and single.exit_code == 0
+    batched, unbatched = CLIProvider.created
+    assert [len(g) for g in batched.groups] == [4, 4] and len(batched.singles) == 1
+    assert unbatched.groups == [] and len(unbatched.singles) == 9
+    assert invalid.exit_code != 0
+
+def test_build_batch_prompt_labels_images_and_xmps():
+    prompt = build_batch_prompt(2, [None, '{"exposure":0.5}'])
+    assert "LightroomBot" in prompt
+    assert "Image 1\" to \"Image 2" in prompt
+    assert 'Current XMP settings for Image 2 (they may be sub-optimal or zeroed): {"exposure":0.5}' in prompt
+    assert "Current XMP settings for Image 1" not in prompt
+
+def test_gemini_process_group_sends_one_request(tmp_path):
+    provider = GeminiAPIProvider(api_key="test-key")
+    parsed = LightroomResponse.model_validate({
+        "global_settings": {"exposure": 0.3},
+        "per_image_adjustments": [{"image_index": 3, "settings": {"exposure": 0.6}}],
+    })
+    provider.client = MagicMock()
+    provider.client.aio.models.generate_content = AsyncMock(return_value=SimpleNamespace(parsed=parsed, text=""))
+
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"frame{i}.jpg"
+        path.write_bytes(b"jpeg")
+        paths.append(path)
+
+    results = asyncio.run(provider.process_batch(paths))
+
+    assert provider.client.aio.models.generate_content.await_count == 1
+    contents = provider.client.aio.models.generate_content.call_args.kwargs["contents"]
+    assert "Image 4:" in contents
+    assert [r.exposure for r in results] == [0.3, 0.3, 0.6, 0.3]
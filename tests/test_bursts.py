@@ -0,0 +1,96 @@
+import asyncio
+import io
+import json
+import time
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from src.core.bursts import Fingerprint, cluster_bursts, fingerprint, hamming, process_bursts
+from src.core.inputs import InputFile
+from src.main import app
+from src.models import LightroomSettings
+from src.providers.base import ProviderBase
+
+def frame(seed, flip=False):
+    """A 400x300 JPEG of a textured scene (or its mirror) with a little noise."""
+    y, x = np.mgrid[0:300, 0:400]
+    pixels = 90 + (x + y) * 0.15 + 60 * np.sin(x / 37.0) * np.cos(y / 23.0)
+    if flip:
+        pixels = pixels[:, ::-1]
+    pixels = pixels + np.random.default_rng(seed).normal(0, 2, pixels.shape)
+    out = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).convert("RGB").save(out, format="JPEG")
+    return out.getvalue()
+
+def test_perceptual_hashes_separate_scenes():
+    for method in ("dhash", "phash"):
+        a = fingerprint(InputFile(data=frame(1), name="a.jpg"), method)
+        b = fingerprint(InputFile(data=frame(2), name="b.jpg"), method)
+        c = fingerprint(InputFile(data=frame(3, flip=True), name="c.jpg"), method)
+        assert hamming(a.hash, b.hash) <= 10
+        assert hamming(a.hash, c.hash) > 20
+    assert fingerprint(InputFile(data=b"not an image", name="x.jpg")) is None
+
+def test_cluster_bursts_uses_hash_and_capture_time():
+    fps = [Fingerprint(0b0000, 10.0), Fingerprint(0b0001, 10.2), Fingerprint(0b0011, 10.4),
+           Fingerprint(0b0011, 30.0), Fingerprint(0xFFFF, 30.1), None]
+    # Capture time is missing for the last frame, so input order is kept
+    assert cluster_bursts(fps, threshold=1) == [[0, 1, 2], [3], [4], [5]]
+    assert cluster_bursts(fps[:5], threshold=1, max_gap=None) == [[0, 1, 2, 3], [4]]
+
+    # With capture times everywhere, frames are walked in capture order
+    shuffled = [Fingerprint(1, 2.0), Fingerprint(0xFF00, 50.0), Fingerprint(0, 1.0)]
+    assert cluster_bursts(shuffled, threshold=2) == [[0, 2], [1]]
+
+class CountingProvider(ProviderBase):
+    def __init__(self):
+        self.seen = []
+
+    async def process(self, image_path, xmp_path=None):
+        self.seen.append(image_path.name)
+        return LightroomSettings(exposure=float(len(self.seen)))
+
+def test_process_bursts_runs_once_per_burst():
+    images = [InputFile(data=frame(i), name=f"{i}.jpg") for i in range(5)]
+    images.append(InputFile(data=frame(9, flip=True), name="5.jpg"))
+    provider = CountingProvider()
+
+    results = asyncio.run(process_bursts(provider, images, threshold=10))
+
+    assert sorted(provider.seen) == ["2.jpg", "5.jpg"]
+    assert len({r.exposure for r in results[:5]}) == 1
+    assert results[5].exposure != results[0].exposure
+
+@patch('src.main.provider')
+def test_stream_and_jobs_analyze_each_burst_once(mock_provider):
+    calls = []
+
+    async def mock_process(image_path, xmp_path=None):
+        calls.append(image_path)
+        return LightroomSettings(exposure=0.5)
+
+    mock_provider.process = mock_process
+    mock_provider.aclose = AsyncMock()
+    files = [('images', (f"f{i}.jpg", frame(i), 'image/jpeg')) for i in range(3)]
+    files.append(('images', ("other.jpg", frame(7, flip=True), 'image/jpeg')))
+
+    with TestClient(app) as client:
+        response = client.post("/analyze/stream?burst_threshold=10", files=files)
+        events = sorted((json.loads(line) for line in response.text.splitlines()), key=lambda e: e["index"])
+        assert len(calls) == 2
+        assert [e.get("burst_of") for e in events] == [1, 1, 1, None]
+        assert all(e["settings"]["exposure"] == 0.5 for e in events)
+
+        calls.clear()
+        job_id = client.post("/jobs", files=files, data={"burst_threshold": "10"}).json()["job_id"]
+        for _ in range(250):
+            data = client.get(f"/jobs/{job_id}").json()
+            if data["status"] == "done":
+                break
+            time.sleep(0.02)
+
+    assert data["completed"] == 4 and len(calls) == 2
+    assert [r["burst_of"] for r in data["results"]] == [1, None, 1, None]
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import time
+
+from src.core.cache import ResultCache
+from src.models import LightroomSettings
+from src.providers.base import ProviderBase
+from src.providers.cached_provider import CachedProvider, with_cache
+
+XMP_TEMPLATE = '''<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about="" xmlns:crs="http://ns.adobe.com/camera-raw-settings/1.0/"
+   crs:Exposure2012="{exposure}" crs:Contrast2012="10"/>
+ </rdf:RDF>
+</x:xmpmeta>'''
+
+class CountingProvider(ProviderBase):
+    model = "test-model"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def process(self, image_path, xmp_path=None):
+        self.calls += 1
+        return LightroomSettings(exposure=0.1 * self.calls)
+
+def test_cached_provider_keys_on_content_not_path(tmp_path):
+    inner = CountingProvider()
+    provider = CachedProvider(inner, ResultCache(tmp_path / "cache"))
+
+    a = tmp_path / "a.jpg"
+    b = tmp_path / "b.jpg"
+    a.write_bytes(b"same-bytes")
+    b.write_bytes(b"same-bytes")
+
+    first = asyncio.run(provider.process(a))
+    second = asyncio.run(provider.process(b))
+    assert first == second
+    assert inner.calls == 1
+
+    xmp = tmp_path / "a.xmp"
+    xmp.write_text(XMP_TEMPLATE.format(exposure="0.5"))
+    asyncio.run(provider.process(a, xmp))
+    assert inner.calls == 2
+
+    # Reformatting the sidecar without changing crs values is still a hit
+    xmp.write_text(XMP_TEMPLATE.format(exposure="0.5").replace("\n", "\n   "))
+    asyncio.run(provider.process(a, xmp))
+    assert inner.calls == 2
+
+    stats = provider.cache.stats()
+    assert stats["misses"] == 2
+    assert stats["memory_hits"] == 2
+
+def test_result_cache_disk_tier_survives_restart(tmp_path):
+    cache = ResultCache(tmp_path)
+    cache.put("ab" * 32, {"exposure": 1.0})
+
+    fresh = ResultCache(tmp_path)
+    assert fresh.get("ab" * 32) == {"exposure": 1.0}
+    assert fresh.disk_hits == 1
+    assert fresh.get("cd" * 32) is None
+    assert fresh.misses == 1
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=200, memory_entries=0)
+    keys = [f"{i:02d}" * 32 for i in range(6)]
+    for i, key in enumerate(keys):
+        cache.put(key, {"i": i})
+        path = cache._entry_path(key)
+        os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+
+    assert cache._disk_bytes <= 200
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[-1]) == {"i": 5}
+
+def test_result_cache_expires_old_entries(tmp_path):
+    cache = ResultCache(tmp_path, max_age=60)
+    cache.put("ef" * 32, {"exposure": 1.0})
+    cache._memory.clear()
+
+    path = cache._entry_path("ef" * 32)
+    path.write_text('{"created": 0, "value": {"exposure": 1.0}}')
+    assert cache.get("ef" * 32) is None
+    assert not path.exists()
+
+def test_with_cache_disabled_returns_provider_unchanged():
+    inner = CountingProvider()
+    assert with_cache(inner, None) is inner
@@ -0,0 +1,91 @@
+import os
+from unittest.mock import patch
+
+from typer.testing import CliRunner
+
+from src import cli
+from src.core.file_index import FileIndex, scan_images
+from src.core.inputs import InputFile
+from src.models import LightroomSettings
+from src.providers.base import ProviderBase
+
+runner = CliRunner()
+
+def make_tree(root):
+    (root / "day1" / "raw").mkdir(parents=True)
+    (root / ".thumbs").mkdir()
+    for rel in ["a.jpg", "day1/b.JPG", "day1/raw/c.nef", ".thumbs/t.jpg", "day1/notes.txt"]:
+        (root / rel).write_bytes(rel.encode())
+    (root / "day1" / "b.xmp").write_text(
+        '<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+        '<rdf:Description rdf:about="" xmlns:crs="http://ns.adobe.com/camera-raw-settings/1.0/" crs:Exposure2012="0"/>'
+        '</rdf:RDF></x:xmpmeta>'
+    )
+
+def test_scan_and_index_detect_changes(tmp_path):
+    make_tree(tmp_path)
+    files = list(scan_images(tmp_path))
+    assert [f.path.relative_to(tmp_path).as_posix() for f in files] == ["a.jpg", "day1/b.JPG", "day1/raw/c.nef"]
+    assert files[1].xmp_path == tmp_path / "day1" / "b.xmp"
+
+    with FileIndex(tmp_path / "index.sqlite") as index:
+        index.record(files[0], "done", sha256="0" * 64)
+        index.record(files[1], "failed", error="boom")
+        assert index.is_done(files[0]) and not index.is_done(files[1]) and not index.is_done(files[2])
+
+        # Touched but identical content still counts as done once the hash matches
+        index.record(files[0], "done", sha256=InputFile(path=files[0].path).sha256())
+        os.utime(files[0].path, ns=(1, 10**9))
+        assert index.is_done(next(scan_images(tmp_path)))
+        (tmp_path / "a.jpg").write_bytes(b"edited!")
+        assert not index.is_done(next(scan_images(tmp_path)))
+        assert index.counts() == {"done": 1, "failed": 1}
+
+class FlakyProvider(ProviderBase):
+    calls = []
+    fail = {"c.nef"}
+
+    def __init__(self, cli_path="gemini", image_spec=None):
+        pass
+
+    async def process(self, image_path, xmp_path=None):
+        FlakyProvider.calls.append(image_path.name)
+        if image_path.name in FlakyProvider.fail:
+            raise RuntimeError("quota")
+        return LightroomSettings(exposure=0.5)
+
+def test_process_dir_writes_xmps_and_resumes(tmp_path):
+    make_tree(tmp_path)
+    with patch.object(cli, "GeminiCLIProvider", FlakyProvider):
+        first = runner.invoke(cli.app, ["process-dir", str(tmp_path)])
+        assert first.exit_code == 1 and "c.nef: failed" in first.output
+        assert sorted(FlakyProvider.calls) == ["a.jpg", "b.JPG", "c.nef"]
+        assert 'crs:Exposure2012="0.5"' in (tmp_path / "day1" / "b.xmp").read_text()
+        assert (tmp_path / "a.xmp").exists()
+
+        # Only the failed file is retried
+        FlakyProvider.calls.clear()
+        FlakyProvider.fail = set()
+        second = runner.invoke(cli.app, ["process-dir", str(tmp_path), "-o", str(tmp_path / "out")])
+        assert second.exit_code == 0 and "3 image(s), 1 to process" in second.output
+        assert FlakyProvider.calls == ["c.nef"]
+        assert (tmp_path / "out" / "day1" / "raw" / "c.xmp").exists()
+        assert "Index: 3 done, 0 failed" in second.output
+
+def test_raw_jpeg_pair_is_processed_once(tmp_path):
+    for name in ["IMG_1.JPG", "IMG_1.nef", "IMG_2.jpg", "IMG_3.jpg", "IMG_3.tif"]:
+        (tmp_path / name).write_bytes(name.encode())
+    files = list(scan_images(tmp_path))
+    # Both halves of a pair map to IMG_1.xmp, which belongs to the RAW file
+    assert [f.path.name for f in files] == ["IMG_1.nef", "IMG_2.jpg", "IMG_3.jpg"]
+
+    FlakyProvider.calls.clear()
+    FlakyProvider.fail = set()
+    with patch.object(cli, "GeminiCLIProvider", FlakyProvider):
+        result = runner.invoke(cli.app, ["process-dir", str(tmp_path)])
+    assert result.exit_code == 0 and "3 image(s), 3 to process" in result.output
+    assert sorted(FlakyProvider.calls) == ["IMG_1.nef", "IMG_2.jpg", "IMG_3.jpg"]
+    assert sorted(p.name for p in tmp_path.glob("*.xmp")) == ["IMG_1.xmp", "IMG_2.xmp", "IMG_3.xmp"]
+    with FileIndex(tmp_path / ".lightroom-index.sqlite") as index:
+        assert index.get(tmp_path / "IMG_1.nef")["status"] == "done"
+        assert index.get(tmp_path / "IMG_1.JPG") is None
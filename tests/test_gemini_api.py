@@ -0,0 +1,76 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.core.ratelimit import AdaptiveLimiter
+from src.models import LightroomSettings
+from src.providers.gemini_api_provider import GeminiAPIProvider
+
+def make_provider(tmp_path, delay, **kwargs):
+    provider = GeminiAPIProvider(api_key="test-key", **kwargs)
+    state = {"in_flight": 0, "peak": 0}
+
+    async def generate_content(**_):
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(delay)
+        state["in_flight"] -= 1
+        return SimpleNamespace(parsed=LightroomSettings(exposure=0.5), text="")
+
+    provider.client = MagicMock()
+    provider.client.aio.models.generate_content = generate_content
+
+    image = tmp_path / "image.jpg"
+    image.write_bytes(b"jpeg")
+    return provider, image, state
+
+def test_concurrent_calls_overlap_up_to_cap(tmp_path):
+    provider, image, state = make_provider(tmp_path, delay=0.1, max_concurrency=4)
+
+    async def run():
+        return await asyncio.gather(*(provider.process(image) for _ in range(8)))
+
+    started = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+
+    assert all(r.exposure == 0.5 for r in results)
+    assert state["peak"] == 4
+    # 8 calls at 0.1s with 4 in flight: two waves, not eight
+    assert elapsed < 0.5
+
+def test_call_timeout(tmp_path):
+    provider, image, _ = make_provider(tmp_path, delay=1.0, timeout=0.05)
+    with pytest.raises(TimeoutError, match="timed out"):
+        asyncio.run(provider.process(image))
+
+def test_stream_timeout_covers_the_whole_stream(tmp_path):
+    provider, image, _ = make_provider(tmp_path, delay=0, timeout=0.2, image_spec=None)
+    provider.limiter = AdaptiveLimiter("test")
+
+    async def generate_content_stream(**_):
+        async def chunks():
+            yield SimpleNamespace(text='{"exposure": 0.5,')
+            if stall:
+                await asyncio.sleep(10)
+            yield SimpleNamespace(text=' "tint": 3} and some chatter')
+            await asyncio.sleep(10)
+        return chunks()
+
+    provider.client.aio.models.generate_content_stream = generate_content_stream
+
+    async def run():
+        return [s async for s in provider.stream(image)]
+
+    stall = True
+    with pytest.raises(TimeoutError, match="timed out"):
+        asyncio.run(asyncio.wait_for(run(), timeout=5))
+    assert provider.limiter.in_flight == 0 and provider.limiter.succeeded == 0
+
+    # Closed as soon as the object is complete, which counts as a success
+    stall = False
+    assert asyncio.run(run())[-1].tint == 3
+    assert provider.limiter.in_flight == 0 and provider.limiter.succeeded == 1
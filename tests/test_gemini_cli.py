@@ -0,0 +1,80 @@
+import asyncio
+import stat
+import sys
+import time
+
+import pytest
+
+from src.providers.gemini_cli import GeminiCLIProvider
+
+# Stand-in for the `gemini` binary: reads the prompt from stdin and answers with JSON.
+# A prompt containing HANG never answers; one containing FAIL exits non-zero.
+FAKE_CLI = f'''#!{sys.executable}
+import json, os, sys, time
+prompt = sys.stdin.read()
+if "HANG" in prompt:
+    time.sleep(30)
+if "FAIL" in prompt:
+    sys.stderr.write("boom")
+    sys.exit(2)
+print("Sure! ```json\\n" + json.dumps({{"exposure": 0.25, "contrast": len(prompt) % 100}}) + "\\n```")
+'''
+
+@pytest.fixture
+def fake_cli(tmp_path):
+    script = tmp_path / "fake_gemini"
+    script.write_text(FAKE_CLI)
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return str(script)
+
+def test_pooled_provider_delivers_long_prompt_over_stdin(fake_cli, tmp_path):
+    provider = GeminiCLIProvider(cli_path=fake_cli, pool_size=2)
+    image = tmp_path / "image.jpg"
+    image.write_bytes(b"jpeg")
+    # Well past what a single argv entry can carry on Linux (MAX_ARG_STRLEN = 128 KiB)
+    long_prompt = "A" * 300_000
+
+    async def run():
+        try:
+            outputs = await asyncio.gather(*(provider._run_cli(long_prompt) for _ in range(3)))
+            return outputs, await provider.process(image)
+        finally:
+            await provider.aclose()
+
+    outputs, settings = asyncio.run(run())
+    assert all('"exposure": 0.25' in output for output in outputs)
+    assert settings.exposure == 0.25
+
+def test_pooled_provider_kills_and_respawns_on_timeout(fake_cli):
+    provider = GeminiCLIProvider(cli_path=fake_cli, pool_size=1, job_timeout=0.5)
+
+    async def run():
+        try:
+            with pytest.raises(TimeoutError):
+                await provider._run_cli("HANG")
+            with pytest.raises(RuntimeError, match="boom"):
+                await provider._run_cli("FAIL")
+            return await provider._run_cli("hello")
+        finally:
+            await provider.aclose()
+
+    started = time.perf_counter()
+    output = asyncio.run(run())
+    assert '"exposure": 0.25' in output
+    assert time.perf_counter() - started < 10
+
+def test_pooled_provider_fails_jobs_when_the_cli_cannot_be_spawned(tmp_path):
+    provider = GeminiCLIProvider(cli_path=str(tmp_path / "missing-gemini"), pool_size=1, job_timeout=5)
+    provider.pool.base_delay = 0.05
+
+    async def run():
+        try:
+            for _ in range(2):
+                # The worker survives the failed spawn and backs off before retrying
+                with pytest.raises(FileNotFoundError):
+                    await provider._run_cli("hello")
+            return provider.pool._workers[0].done()
+        finally:
+            await provider.aclose()
+
+    assert asyncio.run(asyncio.wait_for(run(), timeout=5)) is False
@@ -0,0 +1,66 @@
+import asyncio
+
+from src.core.inputs import InputFile
+from src.models import LightroomSettings
+from src.providers.base import ProviderBase
+from src.providers.hedged_provider import HedgedProvider
+
+class SlowProvider(ProviderBase):
+    image_spec = None
+
+    def __init__(self, model, delays, exposure, fail=False):
+        self.model = model
+        self.delays = list(delays)
+        self.exposure = exposure
+        self.fail = fail
+        self.cancelled = 0
+
+    async def process(self, image_path, xmp_path=None):
+        try:
+            await asyncio.sleep(self.delays.pop(0) if self.delays else 0.0)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError("503")
+        return LightroomSettings(exposure=self.exposure)
+
+def image():
+    return InputFile(data=b"\xff\xd8 not decoded", name="a.jpg")
+
+def test_hedges_slow_primary_and_cancels_the_loser():
+    primary = SlowProvider("primary", [0.01] * 5 + [1.0], exposure=1.0)
+    backup = SlowProvider("backup", [], exposure=2.0)
+    provider = HedgedProvider([primary, backup], hedge_percentile=90, min_samples=5)
+
+    async def run():
+        return [await provider.process(image()) for _ in range(6)]
+
+    results = asyncio.run(run())
+
+    assert [r.exposure for r in results] == [1.0] * 5 + [2.0]
+    assert primary.cancelled == 1
+    stats = provider.stats()
+    assert stats["hedged"] == 1
+    assert stats["wins"] == [{"provider": "primary", "wins": 5}, {"provider": "backup", "wins": 1}]
+    assert stats["hedge_delay"] < 1.0
+
+def test_failure_and_invalid_settings_fall_through():
+    broken = SlowProvider("broken", [], exposure=0.0, fail=True)
+    wild = SlowProvider("wild", [], exposure=12.0)
+    good = SlowProvider("good", [0.01], exposure=0.5)
+    provider = HedgedProvider([broken, wild, good], initial_delay=30.0)
+
+    assert asyncio.run(provider.process(image())).exposure == 0.5
+    assert provider.stats()["hedged"] == 0 and provider.wins == [0, 0, 1]
+    # The primary failed straight away, which must not pull the hedge delay down
+    assert len(provider.latencies) == 0
+
+def test_providers_of_the_same_model_count_wins_separately():
+    first = SlowProvider("gemini", [], exposure=0.0, fail=True)
+    second = SlowProvider("gemini", [], exposure=0.5)
+    provider = HedgedProvider([first, second])
+
+    assert asyncio.run(provider.process(image())).exposure == 0.5
+    assert provider.wins == [0, 1]
+    assert provider.stats()["wins"][1] == {"provider": "gemini", "wins": 1}
@@ -0,0 +1,48 @@
+import asyncio
+import io
+import time
+
+import numpy as np
+from PIL import Image
+
+from src.core.inputs import InputFile
+from src.providers.histogram_provider import HistogramProvider, estimate_settings
+
+def scene(scale=1.0, cast=(1.0, 1.0, 1.0)):
+    """A gray ramp (sRGB 0.05..0.75) scaled in brightness and tinted per channel."""
+    ramp = np.linspace(0.05, 0.75, 200, dtype=np.float32)
+    gray = np.tile(ramp, (100, 1))[..., None] * scale
+    return np.clip(gray * np.array(cast, dtype=np.float32), 0, 1)
+
+def test_exposure_follows_median_luminance():
+    neutral = estimate_settings(scene())
+    dark = estimate_settings(scene(scale=0.4))
+    bright = estimate_settings(scene(scale=1.6))
+
+    assert abs(neutral.exposure) < 0.5
+    assert dark.exposure > 1.0
+    assert bright.exposure < neutral.exposure
+    assert neutral.color_temp == 5500 and neutral.tint == 0
+
+def test_clipping_and_white_balance():
+    clipped = scene()
+    clipped[:, -60:] = 1.0
+    settings = estimate_settings(clipped)
+    assert settings.highlights < -50
+    assert settings.whites <= 0
+
+    assert estimate_settings(scene(cast=(0.8, 1.0, 1.2))).color_temp > 6500
+    assert estimate_settings(scene(cast=(1.2, 1.0, 0.8))).color_temp < 4500
+    assert estimate_settings(scene(cast=(0.9, 1.1, 0.9))).tint > 0
+
+def test_provider_answers_locally_and_fast():
+    out = io.BytesIO()
+    Image.fromarray((scene(scale=0.5) * 255).astype(np.uint8)).save(out, format="PNG")
+    provider = HistogramProvider()
+
+    started = time.perf_counter()
+    settings = asyncio.run(provider.process(InputFile(data=out.getvalue(), name="draft.png")))
+
+    assert time.perf_counter() - started < 1.0
+    assert settings.exposure > 0.5
+    assert settings.contrast is None
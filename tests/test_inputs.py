@@ -0,0 +1,50 @@
+import hashlib
+import mmap
+import tempfile
+
+from src.core.inputs import InputFile
+
+def test_from_upload_in_memory_is_zero_copy():
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024)
+    spooled.write(b"small-jpeg")
+    source = InputFile.from_upload(spooled, "a.JPG")
+
+    assert isinstance(source._data, memoryview)
+    assert source.suffix == ".JPG" and source.name == "a.JPG"
+    assert source.read_bytes() == b"small-jpeg"
+    assert source.sha256() == hashlib.sha256(b"small-jpeg").hexdigest()
+
+    source.release()
+    spooled.close()
+
+def test_from_upload_rolled_to_disk_is_memory_mapped():
+    payload = b"x" * 4096
+    spooled = tempfile.SpooledTemporaryFile(max_size=16)
+    spooled.write(payload)
+    assert spooled._rolled
+    source = InputFile.from_upload(spooled, "big.nef")
+
+    assert isinstance(source._data, mmap.mmap)
+    assert source.size() == 4096
+    with source.buffer() as buf:
+        assert buf[:4] == b"xxxx"
+
+    source.release()
+    spooled.close()
+
+def test_path_input_behaves_like_path(tmp_path):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(b"jpeg")
+    source = InputFile.coerce(path)
+
+    assert source.exists() and source.name == "photo.jpg"
+    assert source.sha256() == InputFile(data=b"jpeg").sha256()
+    with source.local_path() as local:
+        assert local == path
+
+def test_local_path_materializes_buffers_temporarily():
+    source = InputFile(data=b"<x:xmpmeta/>", name="settings.xmp")
+    with source.local_path() as local:
+        assert local.name == "settings.xmp"
+        assert local.read_text() == "<x:xmpmeta/>"
+    assert not local.exists()
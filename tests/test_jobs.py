@@ -0,0 +1,150 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+from src.core.jobs import JobItem, JobManager
+from src.main import app
+from src.models import LightroomSettings
+
+def wait_for_job(client, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        data = client.get(f"/jobs/{job_id}").json()
+        if data["status"] == "done":
+            return data
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+@patch('src.main.provider')
+def test_jobs_endpoint_runs_batch_in_background(mock_provider):
+    seen_xmps = {}
+
+    async def mock_process(image_path, xmp_path=None):
+        content = image_path.read_bytes()
+        seen_xmps[content] = xmp_path.read_text() if xmp_path else None
+        if content == b"broken":
+            raise RuntimeError("cannot decode")
+        return LightroomSettings(exposure=0.5)
+
+    mock_provider.process = mock_process
+    mock_provider.aclose = AsyncMock()
+
+    files = [
+        ('images', ('a.jpg', b"img-a", 'image/jpeg')),
+        ('images', ('b.jpg', b"broken", 'image/jpeg')),
+        ('images', ('c.jpg', b"img-c", 'image/jpeg')),
+        ('xmps', ('c.xmp', b"<xmp-c/>", 'application/rdf+xml')),
+    ]
+
+    with TestClient(app) as client:
+        response = client.post("/jobs", files=files)
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        assert response.json()["total"] == 3
+
+        data = wait_for_job(client, job_id)
+
+    assert data["completed"] == 2 and data["failed"] == 1
+    results = {r["filename"]: r for r in data["results"]}
+    assert results["a.jpg"]["settings"]["exposure"] == 0.5
+    assert results["b.jpg"]["status"] == "failed" and "cannot decode" in results["b.jpg"]["error"]
+    assert seen_xmps == {b"img-a": None, b"broken": None, b"img-c": "<xmp-c/>"}
+
+@patch('src.main.provider')
+def test_uploads_are_saved_off_the_event_loop(mock_provider):
+    import shutil
+    copied_on_loop = []
+    copyfileobj = shutil.copyfileobj
+
+    def tracking_copy(src, dst, *args):
+        try:
+            asyncio.get_running_loop()
+            copied_on_loop.append(True)
+        except RuntimeError:
+            copied_on_loop.append(False)
+        return copyfileobj(src, dst, *args)
+
+    mock_provider.process = AsyncMock(return_value=LightroomSettings(exposure=0.5))
+    mock_provider.aclose = AsyncMock()
+    files = [('images', ('a.jpg', b"img-a", 'image/jpeg')), ('xmps', ('a.xmp', b"<xmp/>", 'application/rdf+xml'))]
+
+    with patch('src.main.shutil.copyfileobj', tracking_copy), TestClient(app) as client:
+        job_id = client.post("/jobs", files=files).json()["job_id"]
+        wait_for_job(client, job_id)
+        client.post("/analyze/stream", files=files)
+
+    assert copied_on_loop == [False] * 4
+
+def test_unknown_job_returns_404():
+    with TestClient(app) as client:
+        assert client.get("/jobs/does-not-exist").status_code == 404
+
+def test_job_manager_limits_concurrency_and_expires_results(tmp_path):
+    state = {"in_flight": 0, "peak": 0}
+
+    async def process(image_path, xmp_path=None):
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        return LightroomSettings(exposure=1.0)
+
+    async def run():
+        manager = JobManager(process, concurrency=2, ttl=0.05)
+        work_dir = tmp_path / "job"
+        work_dir.mkdir()
+        job = manager.submit([JobItem(i, f"{i}.jpg", tmp_path / f"{i}.jpg") for i in range(6)], work_dir)
+        while job.status != "done":
+            await asyncio.sleep(0.01)
+        assert manager.get(job.id) is job
+        assert not work_dir.exists()
+        await asyncio.sleep(0.1)
+        assert manager.get(job.id) is None
+        await manager.stop()
+
+    asyncio.run(run())
+    assert state["peak"] == 2
+
+def test_job_manager_sends_items_in_batches(tmp_path):
+    calls = []
+
+    async def process(image_path, xmp_path=None):
+        calls.append([image_path.name])
+        if image_path.name == "bad.jpg":
+            raise RuntimeError("cannot decode")
+        return LightroomSettings(exposure=1.0)
+
+    async def process_batch(image_paths, xmp_paths):
+        calls.append([p.name for p in image_paths])
+        if any(p.name == "bad.jpg" for p in image_paths):
+            raise RuntimeError("batch failed")
+        return [LightroomSettings(exposure=2.0) for _ in image_paths]
+
+    async def run(names, batch_size):
+        manager = JobManager(process, concurrency=1, batch_fn=process_batch)
+        job = manager.submit([JobItem(i, name, tmp_path / name) for i, name in enumerate(names)], batch_size=batch_size)
+        while job.status != "done":
+            await asyncio.sleep(0.01)
+        await manager.stop()
+        return job
+
+    job = asyncio.run(run([f"{i}.jpg" for i in range(9)], 4))
+    assert [len(c) for c in calls] == [4, 4, 1]
+    assert job.completed == 9
+
+    calls.clear()
+    job = asyncio.run(run(["a.jpg", "bad.jpg", "c.jpg"], 4))
+    # The failed batch is retried per image so only the bad one fails
+    assert calls[1:] == [["a.jpg"], ["bad.jpg"], ["c.jpg"]]
+    assert [item.status for item in job.items] == ["done", "failed", "done"]
+
+    calls.clear()
+    asyncio.run(run([f"{i}.jpg" for i in range(3)], 1))
+    assert calls == [["0.jpg"], ["1.jpg"], ["2.jpg"]]
+
+def test_jobs_endpoint_rejects_invalid_batch_size():
+    files = [('images', ('a.jpg', b"img-a", 'image/jpeg'))]
+    with TestClient(app) as client:
+        assert client.post("/jobs", files=files, data={"batch_size": "5"}).status_code == 400
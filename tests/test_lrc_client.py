@@ -0,0 +1,149 @@
+import asyncio
+import base64
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.lrc_client import LightroomMCPClient, crs_delta
+from src.models import LightroomSettings
+
+class FakeBroker:
+    """Minimal JSON-RPC broker on 127.0.0.1 that serves previews for any photo_id."""
+
+    def __init__(self, supports_batch: bool = True):
+        self.supports_batch = supports_batch
+        self.posts = []
+        broker = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                broker.posts.append(body)
+                if isinstance(body, list):
+                    if not broker.supports_batch:
+                        return self._send(400, {"error": {"message": "batch not supported"}})
+                    return self._send(200, [broker.answer(req) for req in reversed(body)])
+                return self._send(200, broker.answer(body))
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def answer(self, req):
+        photo_id = req["params"].get("photo_id")
+        if photo_id == "missing":
+            return {"jsonrpc": "2.0", "id": req["id"], "result": {"photos": []}}
+        jpeg = base64.b64encode(f"jpeg-{photo_id}".encode()).decode()
+        return {"jsonrpc": "2.0", "id": req["id"], "result": {"photos": [{"jpegBase64": jpeg}]}}
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.mark.parametrize("supports_batch", [True, False])
+def test_iter_photo_previews_streams_all_ids(supports_batch):
+    ids = [str(i) for i in range(20)] + ["missing"]
+
+    async def run(url):
+        async with LightroomMCPClient(url) as lrc:
+            return [item async for item in lrc.iter_photo_previews(ids, chunk_size=8, concurrency=2)]
+
+    with FakeBroker(supports_batch) as broker:
+        previews = dict(asyncio.run(run(broker.url)))
+
+    assert set(previews) == set(ids)
+    assert previews["7"] == b"jpeg-7"
+    assert previews["missing"] is None
+    if supports_batch:
+        assert len(broker.posts) == 3
+        assert all(isinstance(post, list) for post in broker.posts)
+    else:
+        # At most one rejected batch per concurrent chunk, then every id individually
+        assert sum(isinstance(post, list) for post in broker.posts) <= 2
+        assert sum(isinstance(post, dict) for post in broker.posts) == len(ids)
+
+def test_send_batch_returns_responses_in_call_order():
+    async def run(url):
+        async with LightroomMCPClient(url) as lrc:
+            responses = await lrc.send_batch([("get_photo_preview", {"photo_id": str(i)}) for i in range(3)])
+            assert not lrc.client.is_closed
+            return lrc, responses
+
+    with FakeBroker() as broker:
+        lrc, responses = asyncio.run(run(broker.url))
+
+    assert [LightroomMCPClient._decode_preview(r) for r in responses] == [b"jpeg-0", b"jpeg-1", b"jpeg-2"]
+    assert lrc.client.is_closed
+
+def test_crs_delta_ignores_equal_values():
+    desired = {"Exposure2012": 0.5, "Contrast2012": 10, "Temperature": 5500}
+    current = {"Exposure2012": "0.50", "Contrast2012": 10.0, "Temperature": 5000}
+    assert crs_delta(desired, current) == {"Temperature": 5500}
+    assert crs_delta(desired, {}) == desired
+
+def test_apply_develop_settings_bulk_sends_only_changes():
+    class DevelopBroker(FakeBroker):
+        def answer(self, req):
+            if req["method"] == "get_develop_settings":
+                settings = {"Exposure2012": 0.5, "Contrast2012": 10}
+                return {"jsonrpc": "2.0", "id": req["id"], "result": {"settings": settings}}
+            return {"jsonrpc": "2.0", "id": req["id"], "result": "ok"}
+
+    items = [
+        ("1", LightroomSettings(exposure=0.5, contrast=10)),
+        ("2", LightroomSettings(exposure=0.5, contrast=25)),
+        ("3", LightroomSettings(exposure=1.0)),
+    ]
+
+    async def run(url):
+        async with LightroomMCPClient(url) as lrc:
+            return await lrc.apply_develop_settings_bulk(items)
+
+    with DevelopBroker() as broker:
+        outcome = asyncio.run(run(broker.url))
+
+    assert outcome == {"1": "unchanged", "2": "ok", "3": "ok"}
+    # One batch to read current values, one batch for both changed photos
+    assert len(broker.posts) == 2
+    sent = {req["params"]["photo_id"]: req["params"]["settings"] for req in broker.posts[1]}
+    assert sent == {"2": {"Contrast2012": 25}, "3": {"Exposure2012": 1.0}}
+
+def test_apply_develop_settings_bulk_reports_failed_writes():
+    class FailingBroker(FakeBroker):
+        def answer(self, req):
+            photo_id = req["params"].get("photo_id")
+            if photo_id == "locked":
+                return {"jsonrpc": "2.0", "id": req["id"], "error": {"code": -32000, "message": "Photo is locked"}}
+            if photo_id == "dropped":
+                return None
+            return {"jsonrpc": "2.0", "id": req["id"], "result": "ok"}
+
+    items = [(photo_id, LightroomSettings(exposure=1.0)) for photo_id in ["1", "locked", "dropped"]]
+
+    async def run(url):
+        async with LightroomMCPClient(url) as lrc:
+            return await lrc.apply_develop_settings_bulk(items, current={})
+
+    with FailingBroker() as broker:
+        outcome = asyncio.run(run(broker.url))
+
+    assert outcome == {"1": "ok", "locked": "failed: Photo is locked", "dropped": "failed: Missing response in batch"}
@@ -1,5 +1,5 @@
 import pytest
-from src.core.parser import extract_json_from_text, parse_llm_response
+from src.core.parser import ClarificationNeeded, extract_json_from_text, parse_llm_response, expand_response
 from src.models import LightroomResponse
 
 def test_extract_json_from_text_with_markdown():
@@ -70,3 +70,21 @@ def test_parse_llm_response_invalid_json():
 def test_parse_llm_response_invalid_schema():
     with pytest.raises(ValueError, match="Failed to validate data"):
         parse_llm_response('{"global_settings": "Not an object"}')
+
+def test_expand_response_applies_per_image_overrides():
+    response = LightroomResponse.model_validate({
+        "global_settings": {"exposure": 0.3, "contrast": -5, "color_temp": 5500},
+        "per_image_adjustments": [
+            {"image_index": 2, "settings": {"exposure": 0.1, "highlights": -20}},
+            {"image_index": 7, "settings": {"exposure": 2.0}},
+        ],
+    })
+    results = expand_response(response, 3)
+    assert [r.exposure for r in results] == [0.3, 0.1, 0.3]
+    assert results[1].highlights == -20 and results[0].highlights is None
+    assert all(r.color_temp == 5500 and r.contrast == -5 for r in results)
+
+def test_expand_response_clarification_raises():
+    response = LightroomResponse(clarification_needed="Please provide the White Balance.")
+    with pytest.raises(ClarificationNeeded, match="clarification"):
+        expand_response(response, 2)
@@ -0,0 +1,187 @@
+import asyncio
+from unittest.mock import patch
+
+from src.core.pipeline import MicroBatcher, Pipeline, PipelineStage, percentile
+from src.models import LightroomSettings
+from src.providers.base import ProviderBase
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 95) == 95.0
+    assert percentile([], 50) == 0.0
+
+def test_pipeline_respects_stage_concurrency_and_isolates_failures():
+    in_flight = {"a": 0, "b": 0}
+    peak = {"a": 0, "b": 0}
+
+    def tracked(name, fail_on=None):
+        async def stage(x):
+            in_flight[name] += 1
+            peak[name] = max(peak[name], in_flight[name])
+            await asyncio.sleep(0.01)
+            in_flight[name] -= 1
+            if x == fail_on:
+                raise RuntimeError("boom")
+            return x
+        return stage
+
+    progress = []
+    pipeline = Pipeline(
+        [PipelineStage("a", tracked("a"), 3), PipelineStage("b", tracked("b", fail_on=5), 2)],
+        on_result=lambda result, done, total: progress.append((done, total)),
+    )
+    results = asyncio.run(pipeline.run(list(range(20))))
+
+    assert len(results) == 20
+    assert peak["a"] <= 3 and peak["b"] <= 2
+    failed = [r for r in results if not r.ok]
+    assert len(failed) == 1 and failed[0].item == 5 and failed[0].failed_stage == "b"
+    assert pipeline.stats.succeeded == 19 and pipeline.stats.failed == 1
+    assert progress[-1] == (20, 20)
+    assert len(pipeline.stats.stage_latencies["a"]) == 20
+
+def test_micro_batcher_groups_by_size_and_delay():
+    calls = []
+
+    async def double(items):
+        calls.append(list(items))
+        if 13 in items:
+            raise RuntimeError("boom")
+        return [x * 2 for x in items]
+
+    async def run():
+        batcher = MicroBatcher(double, max_size=4, max_delay=0.01)
+        results = await asyncio.gather(*(batcher.submit(x) for x in range(10)), return_exceptions=True)
+        failed = await asyncio.gather(batcher.submit(12), batcher.submit(13), return_exceptions=True)
+        return results, failed, batcher.batches
+
+    results, failed, batches = asyncio.run(run())
+    assert results == [x * 2 for x in range(10)]
+    assert [len(c) for c in calls] == [4, 4, 2, 2] and batches == 4
+    assert all(isinstance(e, RuntimeError) for e in failed)
+
+class FakeLRC:
+    def __init__(self):
+        self.applied = []
+        self.bulk_calls = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def get_selected_photos(self):
+        return [{"localId": str(i), "filename": f"IMG_{i}.NEF"} for i in range(6)]
+
+    async def get_photo_preview(self, photo_id=None):
+        return None if photo_id == "3" else b"jpeg"
+
+    async def get_develop_settings_bulk(self, photo_ids):
+        return {"1": {"Exposure2012": 0.2}}
+
+    async def apply_develop_settings_bulk(self, items, current=None):
+        self.bulk_calls += 1
+        outcome = {}
+        for photo_id, settings in items:
+            if current.get(photo_id, {}).get("Exposure2012") == settings.exposure:
+                outcome[photo_id] = "unchanged"
+            else:
+                self.applied.append(photo_id)
+                outcome[photo_id] = "ok"
+        return outcome
+
+class FakeProvider(ProviderBase):
+    image_spec = None
+
+    async def process(self, image_path, xmp_path=None):
+        assert image_path.read_bytes() == b"jpeg"
+        return LightroomSettings(exposure=0.2)
+
+def test_batch_auto_edit_workflow_processes_whole_selection():
+    from src import auto_edit
+
+    lrc = FakeLRC()
+    with patch.object(auto_edit, "LightroomMCPClient", return_value=lrc), \
+         patch.object(auto_edit, "_build_provider", return_value=FakeProvider()):
+        # The last, partial inference batch must leave before the apply batch is sent
+        results = asyncio.run(auto_edit.batch_auto_edit_workflow("gemini", apply_batch_delay=0.5))
+
+    assert sorted(lrc.applied) == ["0", "2", "4", "5"]
+    assert [r.failed_stage for r in results if not r.ok] == ["preview"]
+    # The five photos with a preview go to Lightroom in one batched round-trip
+    assert lrc.bulk_calls == 1
+    assert {r.value["lrc_result"] for r in results if r.ok} == {"ok", "unchanged"}
+
+def test_batch_auto_edit_workflow_sends_previews_in_provider_batches():
+    from src import auto_edit
+
+    class GroupProvider(FakeProvider):
+        requests = []
+
+        async def process(self, image_path, xmp_path=None):
+            GroupProvider.requests.append(1)
+            return await super().process(image_path, xmp_path)
+
+        async def process_group(self, image_paths, xmp_paths):
+            GroupProvider.requests.append(len(image_paths))
+            return [LightroomSettings(exposure=0.2) for _ in image_paths]
+
+    lrc = FakeLRC()
+    with patch.object(auto_edit, "LightroomMCPClient", return_value=lrc), \
+         patch.object(auto_edit, "_build_provider", return_value=GroupProvider()):
+        asyncio.run(auto_edit.batch_auto_edit_workflow("gemini"))
+        # The five photos with a preview need ceil(5 / 4) requests
+        assert sorted(GroupProvider.requests, reverse=True) == [4, 1]
+        assert sorted(lrc.applied) == ["0", "2", "4", "5"]
+
+        GroupProvider.requests = []
+        asyncio.run(auto_edit.batch_auto_edit_workflow("gemini", batch_size=1))
+        assert GroupProvider.requests == [1] * 5
+
+def test_batch_auto_edit_workflow_reports_failed_writes_as_failures(capsys):
+    from src import auto_edit
+
+    class LockedLRC(FakeLRC):
+        async def apply_develop_settings_bulk(self, items, current=None):
+            outcome = await super().apply_develop_settings_bulk(items, current)
+            outcome["4"] = "failed: Photo is locked"
+            return outcome
+
+    with patch.object(auto_edit, "LightroomMCPClient", return_value=LockedLRC()), \
+         patch.object(auto_edit, "_build_provider", return_value=FakeProvider()):
+        results = asyncio.run(auto_edit.batch_auto_edit_workflow("gemini"))
+
+    failed = {r.item["localId"]: r for r in results if not r.ok}
+    assert sorted(failed) == ["3", "4"] and failed["4"].failed_stage == "apply"
+    assert "Photo is locked" in str(failed["4"].error)
+    assert "IMG_4.NEF: FAILED in apply" in capsys.readouterr().err
+
+def test_batch_auto_edit_workflow_applies_burst_settings_to_every_frame():
+    from src import auto_edit
+    from tests.test_bursts import frame
+
+    class BurstLRC(FakeLRC):
+        async def iter_photo_previews(self, photo_ids, concurrency=4):
+            for photo_id in photo_ids:
+                yield photo_id, None if photo_id == "3" else frame(int(photo_id), flip=photo_id == "5")
+
+    class RecordingProvider(ProviderBase):
+        image_spec = None
+        calls = 0
+
+        async def process(self, image_path, xmp_path=None):
+            RecordingProvider.calls += 1
+            return LightroomSettings(exposure=0.7)
+
+    lrc = BurstLRC()
+    with patch.object(auto_edit, "LightroomMCPClient", return_value=lrc), \
+         patch.object(auto_edit, "_build_provider", return_value=RecordingProvider()):
+        results = asyncio.run(auto_edit.batch_auto_edit_workflow("gemini", burst_threshold=10))
+
+    # Frames 0-4 (minus 3, which has no preview) are one burst; 5 is a different scene
+    assert RecordingProvider.calls == 2
+    assert sorted(lrc.applied) == ["0", "1", "2", "4", "5"]
+    assert lrc.bulk_calls == 1
+    assert [r.failed_stage for r in results if not r.ok] == ["preview"]
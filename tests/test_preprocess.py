@@ -0,0 +1,88 @@
+import io
+
+from PIL import Image
+
+from src.core.cache import DerivativeCache
+from src.core.inputs import InputFile
+from src.core.preprocess import ImageSpec, downscale_image, prepare_image
+
+def encode(size, fmt="PNG"):
+    out = io.BytesIO()
+    Image.new("RGB", size, (200, 120, 40)).save(out, format=fmt)
+    return out.getvalue()
+
+def test_large_images_are_downscaled_to_jpeg(tmp_path):
+    source = tmp_path / "big.png"
+    source.write_bytes(encode((3000, 2000)))
+
+    prepared = prepare_image(source, ImageSpec(max_edge=1024, quality=80))
+    assert isinstance(prepared, InputFile) and prepared.prepared
+    assert prepared.name == "big.jpg"
+    with Image.open(io.BytesIO(prepared.read_bytes())) as img:
+        assert img.format == "JPEG"
+        assert img.size == (1024, 683)
+
+    # Preparing again (e.g. by a wrapped provider) is a no-op
+    assert prepare_image(prepared, ImageSpec(max_edge=512)) is prepared
+
+def test_small_jpegs_and_non_images_pass_through(tmp_path):
+    small = tmp_path / "small.jpg"
+    small.write_bytes(encode((800, 600), "JPEG"))
+    not_an_image = tmp_path / "notes.jpg"
+    not_an_image.write_bytes(b"plain text")
+
+    assert prepare_image(small, ImageSpec()) is small
+    assert prepare_image(not_an_image, ImageSpec()) is not_an_image
+    assert prepare_image(InputFile(data=encode((3000, 2000)), name="x.png"), None).name == "x.png"
+
+def test_derivative_cache_reuses_and_evicts(tmp_path):
+    cache = DerivativeCache(tmp_path / "derivatives")
+    spec = ImageSpec(max_edge=256)
+    data = encode((2000, 1000))
+
+    first = downscale_image(InputFile(data=data, name="a.png"), spec, cache)
+    second = downscale_image(InputFile(data=data, name="b.png"), spec, cache)
+    assert second.read_bytes() == first.read_bytes()
+    assert second.name == "b.jpg"
+    assert cache.stats()["hits"] == 1
+
+    # A different target is a different derivative
+    downscale_image(InputFile(data=data, name="a.png"), ImageSpec(max_edge=128), cache)
+    assert cache.stats()["misses"] == 2
+
+    cache.max_bytes = 1
+    cache.put("ff" * 32, b"x" * 10)
+    assert cache.stats()["disk_bytes"] <= 1
+
+def test_image_spec_is_configurable_per_provider(tmp_path):
+    from unittest.mock import patch
+    from typer.testing import CliRunner
+    from src import auto_edit, cli
+    from src.core.preprocess import make_image_spec
+    from src.providers.gemini_api_provider import GeminiAPIProvider
+
+    assert make_image_spec(0) is None
+    assert make_image_spec(512, 70) == ImageSpec(max_edge=512, quality=70)
+    assert GeminiAPIProvider(api_key="k").image_spec == ImageSpec()
+    assert GeminiAPIProvider(api_key="k", image_spec=None).image_spec is None
+
+    with patch.dict("os.environ", {"GOOGLE_API_KEY": "k"}):
+        tiered = auto_edit._build_provider("tiered", image_spec=ImageSpec(max_edge=640))
+    assert [tier.image_spec.max_edge for tier in tiered.tiers] == [640, 640]
+
+    image = tmp_path / "a.png"
+    image.write_bytes(encode((2000, 1000)))
+    seen = {}
+
+    class SpyProvider:
+        def __init__(self, cli_path="gemini", image_spec=None):
+            seen["spec"] = image_spec
+
+        async def process(self, image_path, xmp_path=None):
+            from src.models import LightroomSettings
+            return LightroomSettings()
+
+    with patch.object(cli, "GeminiCLIProvider", SpyProvider):
+        result = CliRunner().invoke(cli.app, ["process", str(image), "--max-edge", "300", "--jpeg-quality", "60"])
+    assert result.exit_code == 0, result.output
+    assert seen["spec"] == ImageSpec(max_edge=300, quality=60)
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.core.ratelimit import AdaptiveLimiter, parse_retry_after, shared_limiter, throttle_info
+from src.main import app
+
+class Throttled(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__("429 RESOURCE_EXHAUSTED")
+        self.code = 429
+        self.response = SimpleNamespace(headers={"retry-after": retry_after} if retry_after else {})
+
+def test_throttle_info_reads_status_and_retry_after():
+    assert throttle_info(Throttled("1.5")) == (True, 1.5)
+    assert throttle_info(SimpleNamespace(code=400)) == (False, None)
+    assert throttle_info(RuntimeError("Gemini CLI failed: Quota exceeded")) == (True, None)
+    assert throttle_info(RuntimeError("[API Error: 429 Too Many Requests]")) == (True, None)
+    assert throttle_info(RuntimeError("boom")) == (False, None)
+    # A status-like number in a file name or a passing mention of quotas is not throttling
+    assert throttle_info(RuntimeError("Gemini CLI failed: cannot read IMG_0429.jpg")) == (False, None)
+    assert throttle_info(RuntimeError("Gemini CLI failed: cannot read /shoot/IMG-429.jpg")) == (False, None)
+    assert throttle_info(RuntimeError("Gemini CLI failed: quota project not set")) == (False, None)
+
+def test_cli_errors_are_classified_explicitly():
+    from src.providers.cli_pool import cli_error
+    from src.core.ratelimit import ThrottledError
+
+    assert isinstance(cli_error("RESOURCE_EXHAUSTED: try again later"), ThrottledError)
+    assert throttle_info(cli_error("RESOURCE_EXHAUSTED")) == (True, None)
+    assert type(cli_error("no such file IMG_0429.NEF")) is RuntimeError
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+def test_limit_halves_once_per_congestion_event_and_honors_retry_after(caplog):
+    limiter = AdaptiveLimiter("test", max_limit=8)
+    state = {"in_flight": 0, "peak": 0, "calls": 0, "throttles": 4}
+
+    async def call():
+        state["calls"] += 1
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        try:
+            await asyncio.sleep(0.01)
+            if state["throttles"]:
+                state["throttles"] -= 1
+                raise Throttled("0.2")
+            return "ok"
+        finally:
+            state["in_flight"] -= 1
+
+    async def run():
+        return await asyncio.gather(*(limiter.call(call) for _ in range(8)))
+
+    started = time.perf_counter()
+    results = asyncio.run(run())
+
+    assert results == ["ok"] * 8 and state["calls"] == 12
+    # Four simultaneous 429s are one congestion event; the retries then grow it back
+    assert limiter.throttled == 4
+    assert [r.message for r in caplog.records] == ["test throttled, concurrency limit now 4"]
+    assert 4 < limiter.limit < 8
+    assert time.perf_counter() - started >= 0.2
+    assert limiter.stats()["queue_depth"] == 0
+
+def test_gives_up_after_max_attempts_and_passes_other_errors_through():
+    limiter = AdaptiveLimiter("test", max_attempts=2, base_delay=0.01)
+
+    async def throttled():
+        raise Throttled()
+
+    async def broken():
+        raise ValueError("bad request")
+
+    with pytest.raises(Throttled):
+        asyncio.run(limiter.call(throttled))
+    with pytest.raises(ValueError):
+        asyncio.run(limiter.call(broken))
+    # Each retry was sent after the previous decrease, so both count
+    assert limiter.in_flight == 0 and limiter.limit == 2
+
+def test_stream_retries_before_first_item_and_counts_early_close_as_success():
+    limiter = AdaptiveLimiter("test", base_delay=0.01)
+    opened = []
+
+    async def open_stream():
+        opened.append(1)
+        if len(opened) == 1:
+            raise Throttled()
+        yield "first"
+        if len(opened) == 2:
+            raise Throttled()
+        yield "second"
+
+    async def first_item():
+        # Stops reading after one item, like stream_settings once the object is complete
+        items = limiter.stream(open_stream)
+        item = await anext(items)
+        await items.aclose()
+        return item
+
+    async def read_all():
+        return [item async for item in limiter.stream(open_stream)]
+
+    assert asyncio.run(first_item()) == "first"
+    assert len(opened) == 2 and limiter.succeeded == 1 and limiter.in_flight == 0
+    assert asyncio.run(read_all()) == ["first", "second"] and limiter.succeeded == 2
+
+    # Throttled after an item was passed on: raised, not replayed
+    opened.clear()
+    opened.append(1)
+    with pytest.raises(Throttled):
+        asyncio.run(read_all())
+    assert len(opened) == 2 and limiter.in_flight == 0
+
+def test_token_bucket_paces_starts_and_limits_endpoint():
+    limiter = shared_limiter("test:paced", max_limit=4, requests_per_minute=600)
+
+    async def call():
+        return time.perf_counter()
+
+    async def run():
+        return await asyncio.gather(*(limiter.call(call) for _ in range(4)))
+
+    starts = asyncio.run(run())
+    assert max(starts) - min(starts) >= 0.25
+
+    with TestClient(app) as client:
+        limits = client.get("/limits").json()
+    assert limits["test:paced"]["limit"] == 4 and limits["test:paced"]["succeeded"] == 4
@@ -0,0 +1,78 @@
+import struct
+
+from src.core.inputs import InputFile
+from src.core.preprocess import image_mime_type, prepare_image
+from src.core.raw_preview import extract_largest_jpeg, find_embedded_jpegs
+
+def make_jpeg(width, height, sof=0xC0, payload=b""):
+    """SOI, an APP1 segment, the SOF header and EOI; enough for the marker scanner."""
+    app1 = b"\xff\xe1" + struct.pack(">H", 8) + b"Exif\x00\x00"
+    sof_segment = bytes([0xFF, sof]) + struct.pack(">HBHHB", 8, 8, height, width, 0)
+    return b"\xff\xd8" + app1 + sof_segment + payload + b"\xff\xd9"
+
+def make_raw(order="<"):
+    """
+    A TIFF with a small thumbnail in IFD0 (JPEGInterchangeFormat), a large preview
+    strip in a SubIFD, and a lossless-JPEG raw strip in a second SubIFD.
+    """
+    thumb = make_jpeg(160, 120, payload=b"t" * 10)
+    preview = make_jpeg(6000, 4000, payload=b"p" * 50)
+    raw = make_jpeg(6048, 4032, sof=0xC3, payload=b"r" * 80)
+
+    def ifd(entries, next_offset=0):
+        out = struct.pack(order + "H", len(entries))
+        for tag, field_type, count, value in entries:
+            out += struct.pack(order + "HHII", tag, field_type, count, value)
+        return out + struct.pack(order + "I", next_offset)
+
+    ifd0_at = 8
+    ifd0_size = 2 + 3 * 12 + 4
+    sub_ifds_at = ifd0_at + ifd0_size          # two LONG offsets
+    sub1_at = sub_ifds_at + 8
+    sub_size = 2 + 3 * 12 + 4
+    sub2_at = sub1_at + sub_size
+    data_at = sub2_at + sub_size
+    thumb_at, preview_at = data_at, data_at + len(thumb)
+    raw_at = preview_at + len(preview)
+
+    header = (b"II*\x00" if order == "<" else b"MM\x00*") + struct.pack(order + "I", ifd0_at)
+    body = ifd([(0x014A, 4, 2, sub_ifds_at), (0x0201, 4, 1, thumb_at), (0x0202, 4, 1, len(thumb))])
+    body += struct.pack(order + "II", sub1_at, sub2_at)
+    body += ifd([(0x0103, 3, 1, 6 if order == "<" else 6 << 16), (0x0111, 4, 1, preview_at), (0x0117, 4, 1, len(preview))])
+    body += ifd([(0x0103, 3, 1, 7 if order == "<" else 7 << 16), (0x0111, 4, 1, raw_at), (0x0117, 4, 1, len(raw))])
+    return header + body + thumb + preview + raw, preview
+
+def test_extracts_largest_viewable_preview():
+    for order in ("<", ">"):
+        data, preview = make_raw(order)
+        found = find_embedded_jpegs(data)
+        # Thumbnail and preview; the lossless raw strip is skipped
+        assert sorted((w, h) for _, _, w, h in found) == [(160, 120), (6000, 4000)]
+        assert extract_largest_jpeg(data) == preview
+
+def test_garbage_and_truncated_files_have_no_preview():
+    data, _ = make_raw()
+    assert extract_largest_jpeg(b"not a tiff at all") is None
+    assert extract_largest_jpeg(data[:60]) is None
+
+def test_prepare_image_replaces_raw_with_preview(tmp_path):
+    data, preview = make_raw()
+    raw_path = tmp_path / "DSC_0001.NEF"
+    raw_path.write_bytes(data)
+
+    prepared = prepare_image(raw_path)
+    assert isinstance(prepared, InputFile)
+    assert prepared.name == "DSC_0001.jpg"
+    assert prepared.read_bytes() == preview
+    assert image_mime_type(prepared) == "image/jpeg"
+
+    # Uploads without a path work the same way; non-RAW inputs pass through
+    assert prepare_image(InputFile(data=data, name="x.dng")).read_bytes() == preview
+    jpg = tmp_path / "a.jpg"
+    assert prepare_image(jpg) is jpg
+
+def test_image_mime_type():
+    assert image_mime_type(InputFile(data=b"", name="a.JPEG")) == "image/jpeg"
+    assert image_mime_type(InputFile(data=b"", name="a.png")) == "image/png"
+    assert image_mime_type(InputFile(data=b"", name="a.webp")) == "image/webp"
+    assert image_mime_type(InputFile(data=b"", name="a.unknownraw")) == "image/jpeg"
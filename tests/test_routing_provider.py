@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from src.core.inputs import InputFile
+from src.core.parser import ClarificationNeeded, expand_response, settings_from_answer, settings_problems
+from src.models import LightroomResponse, LightroomSettings
+from src.providers.base import ProviderBase
+from src.providers.routing_provider import TieredProvider
+
+FULL = dict(exposure=0.3, contrast=10, highlights=-20, shadows=15, whites=5, blacks=-5)
+
+class StubTier(ProviderBase):
+    image_spec = None
+
+    def __init__(self, model, answers):
+        self.model = model
+        self.answers = answers
+        self.seen = []
+
+    async def process(self, image_path, xmp_path=None):
+        self.seen.append(image_path.name)
+        answer = self.answers[image_path.name]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+def image(name):
+    return InputFile(data=b"\xff\xd8 not decoded", name=name)
+
+def test_settings_problems_checks_required_and_ranges():
+    assert settings_problems(LightroomSettings(**FULL), FULL) == []
+    problems = settings_problems(LightroomSettings(exposure=7.5, tint=20, color_temp=900), ["contrast"])
+    assert problems == ["missing contrast", "exposure 7.5 outside -5.0..5.0", "color_temp 900 outside 2000..50000"]
+
+def test_escalates_only_images_the_cheap_tier_got_wrong():
+    cheap = StubTier("cheap", {
+        "ok.jpg": LightroomSettings(**FULL),
+        "partial.jpg": LightroomSettings(exposure=0.1),
+        "wild.jpg": LightroomSettings(**{**FULL, "exposure": 9.0}),
+        "unsure.jpg": ClarificationNeeded("LLM requested clarification instead of settings: white balance?"),
+    })
+    strong = StubTier("strong", {name: LightroomSettings(**{**FULL, "contrast": 50}) for name in cheap.answers})
+    provider = TieredProvider([cheap, strong])
+
+    names = ["ok.jpg", "partial.jpg", "wild.jpg", "unsure.jpg"]
+
+    async def run():
+        return await asyncio.gather(*(provider.process(image(n)) for n in names))
+
+    results = asyncio.run(run())
+
+    assert [r.contrast for r in results] == [10, 50, 50, 50]
+    assert sorted(strong.seen) == ["partial.jpg", "unsure.jpg", "wild.jpg"]
+    stats = provider.stats()
+    assert stats["tiers"][0]["escalation_rate"] == 0.75
+    assert stats["tiers"][1]["escalated"] == 0
+    assert stats["escalation_reasons"] == {"clarification": 1, "missing": 1, "out of range": 1}
+    assert provider.model == "cheap+strong"
+    # Only the dedicated error type counts as a clarification request, not the wording
+    from src.providers.routing_provider import _error_reason
+    assert _error_reason(ValueError("asked for clarification of the schema")) == "invalid"
+
+def test_escalates_when_the_model_asks_alongside_its_settings():
+    question = "Warm or cool look?"
+    asked = expand_response(LightroomResponse(global_settings=LightroomSettings(**FULL), clarification_needed=question), 2)
+    cheap = StubTier("cheap", {
+        "group.jpg": asked[0],
+        "single.jpg": settings_from_answer({**FULL, "clarification_needed": question}),
+    })
+    strong = StubTier("strong", {name: LightroomSettings(**{**FULL, "contrast": 50}) for name in cheap.answers})
+    provider = TieredProvider([cheap, strong])
+
+    assert settings_problems(asked[1]) == [f"clarification needed: {question}"]
+    assert "clarification" not in asked[0].model_dump_json()
+    results = [asyncio.run(provider.process(image(name))) for name in ["group.jpg", "single.jpg"]]
+    assert [r.contrast for r in results] == [50, 50]
+    assert provider.stats()["escalation_reasons"] == {"clarification": 2}
+
+def test_last_tier_answer_is_returned_and_its_errors_raised():
+    cheap = StubTier("cheap", {"a.jpg": RuntimeError("503"), "b.jpg": RuntimeError("503")})
+    strong = StubTier("strong", {"a.jpg": LightroomSettings(exposure=0.2), "b.jpg": RuntimeError("quota")})
+    provider = TieredProvider([cheap, strong])
+
+    # Still incomplete, but there is no tier left to ask
+    assert asyncio.run(provider.process(image("a.jpg"))).exposure == 0.2
+    with pytest.raises(RuntimeError, match="quota"):
+        asyncio.run(provider.process(image("b.jpg")))
+    assert provider.stats()["escalation_reasons"] == {"error": 2}
+
+def test_group_failure_escalates_the_whole_group():
+    cheap = StubTier("cheap", {"a.jpg": LightroomSettings(**FULL), "b.jpg": ValueError("bad JSON")})
+    strong = StubTier("strong", {"a.jpg": LightroomSettings(**FULL), "b.jpg": LightroomSettings(**FULL)})
+    provider = TieredProvider([cheap, strong])
+
+    results = asyncio.run(provider.process_group([image("a.jpg"), image("b.jpg")], [None, None]))
+
+    assert len(results) == 2 and sorted(strong.seen) == ["a.jpg", "b.jpg"]
+    assert provider.stats()["tiers"][0]["requests"] == 1
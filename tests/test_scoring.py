@@ -0,0 +1,105 @@
+import asyncio
+import io
+import json
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image, ImageFilter
+
+from src.core.inputs import InputFile
+from src.core.scoring import CullThresholds, judge, measure, score_frames, shutdown_pool
+from src.main import app
+from src.models import LightroomSettings
+from tests.test_pipeline import FakeLRC
+
+def texture(seed=0):
+    rng = np.random.default_rng(seed)
+    return Image.fromarray((rng.random((300, 400)) * 255).astype(np.uint8)).filter(ImageFilter.GaussianBlur(1))
+
+def encode(img):
+    out = io.BytesIO()
+    img.convert("RGB").save(out, format="JPEG", quality=95)
+    return out.getvalue()
+
+SHARP = encode(texture())
+BLURRY = encode(texture().filter(ImageFilter.GaussianBlur(6)))
+
+def test_measure_separates_sharp_blurred_and_smeared():
+    sharp = np.asarray(texture(), dtype=np.float32)
+    blurred = np.asarray(texture().filter(ImageFilter.GaussianBlur(6)), dtype=np.float32)
+    kernel = np.ones(25) / 25
+    smeared = np.apply_along_axis(lambda row: np.convolve(row, kernel, "same"), 1, sharp)
+
+    sharp_score, blurred_score, smeared_score = measure(sharp), measure(blurred), measure(smeared)
+    assert sharp_score.focus > 10 * blurred_score.focus
+    assert smeared_score.motion_blur > 0.3 > sharp_score.motion_blur
+
+    clipped = sharp.copy()
+    clipped[:, :200] = 255
+    score = judge(measure(clipped), CullThresholds(min_focus=None))
+    assert score.clipped_highlights >= 0.49
+    assert score.rejected and score.reasons == ["clipped highlights"]
+    assert not judge(measure(clipped), None).rejected
+
+def test_score_frames_in_process_pool_keeps_order():
+    frames = [InputFile(data=SHARP if i % 2 else BLURRY, name=f"{i}.jpg") for i in range(8)]
+    frames.append(InputFile(data=b"garbage", name="broken.jpg"))
+    try:
+        scores = asyncio.run(score_frames(frames, CullThresholds()))
+    finally:
+        shutdown_pool()
+
+    assert [s.rejected for s in scores] == [True, False] * 4 + [True]
+    assert scores[0].reasons == ["out of focus"]
+    assert scores[-1].reasons == ["unreadable"]
+
+@patch('src.main.provider')
+def test_stream_skips_rejects_and_returns_scores(mock_provider):
+    calls = []
+
+    async def mock_process(image_path, xmp_path=None):
+        calls.append(image_path)
+        return LightroomSettings(exposure=0.1)
+
+    mock_provider.process = mock_process
+    mock_provider.aclose = AsyncMock()
+    files = [('images', ("sharp.jpg", SHARP, 'image/jpeg')), ('images', ("blurry.jpg", BLURRY, 'image/jpeg'))]
+
+    with TestClient(app) as client:
+        response = client.post("/analyze/stream?cull=true&min_focus=15", files=files)
+        events = {e["filename"]: e for e in map(json.loads, response.text.splitlines())}
+        assert len(calls) == 1
+
+        job_id = client.post("/jobs", files=files, data={"cull": "true"}).json()["job_id"]
+        job = client.get(f"/jobs/{job_id}").json()
+
+    assert events["blurry.jpg"]["rejected"] and "settings" not in events["blurry.jpg"]
+    assert events["sharp.jpg"]["settings"]["exposure"] == 0.1
+    assert events["sharp.jpg"]["score"]["focus"] > 15
+    assert job["results"][1]["status"] == "rejected"
+    assert job["results"][1]["score"]["reasons"] == ["out of focus"]
+
+def test_batch_auto_edit_workflow_skips_rejects():
+    from src import auto_edit
+
+    class PreviewLRC(FakeLRC):
+        async def get_photo_preview(self, photo_id=None):
+            return None if photo_id == "3" else (BLURRY if photo_id == "4" else SHARP)
+
+    class CountingProvider:
+        calls = 0
+
+        async def process(self, image_path, xmp_path=None):
+            CountingProvider.calls += 1
+            return LightroomSettings(exposure=0.2)
+
+    lrc = PreviewLRC()
+    with patch.object(auto_edit, "LightroomMCPClient", return_value=lrc), \
+         patch.object(auto_edit, "_build_provider", return_value=CountingProvider()):
+        results = asyncio.run(auto_edit.batch_auto_edit_workflow("gemini", cull=CullThresholds()))
+
+    assert CountingProvider.calls == 4
+    assert sorted(lrc.applied) == ["0", "2", "5"]
+    rejected = [r.item["localId"] for r in results if r.ok and r.value["lrc_result"] == "rejected"]
+    assert rejected == ["4"]
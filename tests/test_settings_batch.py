@@ -0,0 +1,60 @@
+import numpy as np
+
+from src.core.parser import expand_response
+from src.core.settings_batch import SettingsBatch
+from src.models import LightroomResponse, LightroomSettings, PerImageAdjustment, settings_to_crs
+
+SETTINGS = [
+    LightroomSettings(exposure=0.5, contrast=10, color_temp=5500),
+    LightroomSettings(exposure=-6.0, highlights=-140, tint=3),
+    LightroomSettings(),
+]
+
+def test_round_trips_through_settings_json_and_crs():
+    batch = SettingsBatch.from_settings(SETTINGS)
+    assert len(batch) == 3 and batch.mask.sum() == 6
+
+    assert batch.to_settings() == SETTINGS
+    assert batch.to_dicts() == [s.model_dump(exclude_none=True) for s in SETTINGS]
+    assert batch.to_crs() == [settings_to_crs(s) for s in SETTINGS]
+    assert isinstance(batch.to_crs()[0]["Contrast2012"], int)
+    assert SettingsBatch.from_json(batch.to_json()) == batch
+    assert SettingsBatch.from_crs([{"Exposure2012": "+0.50", "Contrast2012": 10, "Temperature": 5500, "Version": "15.0"}]) \
+        == batch[0]
+
+def test_clamp_merge_diff_and_stats():
+    batch = SettingsBatch.from_settings(SETTINGS)
+    assert batch.out_of_range().sum() == 2
+
+    clamped = batch.clamp()
+    assert not clamped.out_of_range().any()
+    assert clamped.to_dicts()[1] == {"exposure": -5.0, "highlights": -100, "tint": 3}
+
+    merged = batch.merge(SettingsBatch.from_settings([LightroomSettings(contrast=-5, whites=20)]))
+    assert [d.get("contrast") for d in merged.to_dicts()] == [-5, -5, -5]
+    assert merged.to_dicts()[2] == {"contrast": -5, "whites": 20}
+
+    current = SettingsBatch.from_crs([{"Exposure2012": "0.50", "Contrast2012": 12}, {}, {}])
+    assert batch.diff(current).to_dicts() == [{"contrast": 10, "color_temp": 5500},
+                                              {"exposure": -6.0, "highlights": -140, "tint": 3}, {}]
+
+    assert batch.mean()["exposure"] == -2.75 and batch.mean()["whites"] is None
+    assert np.ma.median(batch.column("exposure")) == -2.75
+
+def test_expand_response_uses_batch_merge():
+    response = LightroomResponse(
+        global_settings=LightroomSettings(exposure=0.3, contrast=5),
+        per_image_adjustments=[
+            PerImageAdjustment(image_index=2, settings=LightroomSettings(exposure=1.0)),
+            PerImageAdjustment(image_index=2, settings=LightroomSettings(shadows=10)),
+            PerImageAdjustment(image_index=9, settings=LightroomSettings(exposure=2.0)),
+        ],
+    )
+    results = expand_response(response, 3)
+    assert results[0] == LightroomSettings(exposure=0.3, contrast=5)
+    assert results[1] == LightroomSettings(exposure=1.0, contrast=5, shadows=10)
+
+    only_adjustments = LightroomResponse(
+        per_image_adjustments=[PerImageAdjustment(image_index=1, settings=LightroomSettings(tint=4))]
+    )
+    assert expand_response(only_adjustments, 2) == [LightroomSettings(tint=4), LightroomSettings()]
@@ -0,0 +1,98 @@
+import json
+import os
+
+from typer.testing import CliRunner
+
+from src import cli
+from src.core.file_index import FileIndex, scan_images
+from src.core.sidecar_catalog import SidecarCatalog, row_settings
+from src.models import LightroomSettings
+from src.xmp_utils import read_xmp_settings, splice_xmp
+
+runner = CliRunner()
+
+def sidecar(exposure, extra=""):
+    return (
+        '<?xpacket begin="﻿" id="W5M0MpCehiHzreSzNTczkc9d"?>\n'
+        '<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+        '<rdf:Description rdf:about="" xmlns:crs="http://ns.adobe.com/camera-raw-settings/1.0/" '
+        f'crs:Exposure2012="{exposure}" crs:Contrast2012="+12.0" crs:Version="15.0">{extra}'
+        '</rdf:Description></rdf:RDF></x:xmpmeta>\n<?xpacket end="w"?>'
+    )
+
+def test_read_xmp_settings_attributes_elements_and_bad_input(tmp_path):
+    settings = read_xmp_settings(sidecar("+1.25", "<crs:Temperature>5400</crs:Temperature><crs:Tint>x</crs:Tint>"))
+    assert settings.exposure == 1.25 and settings.contrast == 12 and settings.color_temp == 5400
+    assert settings.tint is None
+
+    path = tmp_path / "a.xmp"
+    path.write_text(sidecar("-0.5"), encoding="utf-8")
+    assert read_xmp_settings(path).exposure == -0.5
+    assert read_xmp_settings(str(path)).exposure == -0.5
+    assert read_xmp_settings("<x:xmpmeta") is None
+    assert read_xmp_settings('<x:xmpmeta xmlns:x="adobe:ns:meta/"/>') is None
+
+def test_read_xmp_settings_ignores_non_finite_values(tmp_path):
+    xmp = sidecar("inf").replace('crs:Contrast2012="+12.0"', 'crs:Contrast2012="nan" crs:Temperature="-inf" crs:Tint="5"')
+    assert read_xmp_settings(xmp).model_dump(exclude_none=True) == {"tint": 5}
+
+    (tmp_path / "a.xmp").write_text(xmp, encoding="utf-8")
+    (tmp_path / "b.xmp").write_text(sidecar("+0.5"), encoding="utf-8")
+    with SidecarCatalog(tmp_path / "catalog.sqlite") as catalog:
+        assert catalog.refresh(tmp_path).added == 2
+
+def test_read_xmp_settings_finds_the_crs_description():
+    # Other tools put their own rdf:Description first; splice_xmp edits the crs one
+    xmp = sidecar("+0.75").replace(
+        '<rdf:Description rdf:about="" xmlns:crs',
+        '<rdf:Description rdf:about="" xmlns:tiff="http://ns.adobe.com/tiff/1.0/" tiff:Make="Nikon"/>'
+        '<rdf:Description rdf:about="" xmlns:crs',
+    )
+    assert read_xmp_settings(xmp).exposure == 0.75
+    assert read_xmp_settings(splice_xmp(xmp, LightroomSettings(exposure=-1.5, tint=7))).model_dump(exclude_none=True) == {
+        "exposure": -1.5, "contrast": 12, "tint": 7,
+    }
+
+def test_catalog_refreshes_incrementally_and_queries(tmp_path):
+    (tmp_path / "day1").mkdir()
+    for name, exposure in [("a", "+1.50"), ("b", "0.20"), ("day1/c", "+2.00")]:
+        (tmp_path / f"{name}.xmp").write_text(sidecar(exposure), encoding="utf-8")
+        (tmp_path / f"{name}.jpg").write_bytes(name.encode())
+    (tmp_path / "broken.xmp").write_text("<x:xmpmeta", encoding="utf-8")
+
+    with SidecarCatalog(tmp_path / "index.sqlite") as catalog:
+        stats = catalog.refresh(tmp_path)
+        assert (stats.added, stats.unchanged) == (4, 0)
+        bright = catalog.find([("Exposure2012", ">", 1.0)])
+        assert [os.path.basename(row["path"]) for row in bright] == ["a.xmp", "c.xmp"]
+        assert row_settings(bright[0]).contrast == 12
+        assert bright[0]["image_path"] == str(tmp_path / "a.jpg")
+        assert not catalog.get(tmp_path / "broken.xmp")["readable"]
+
+        os.utime(tmp_path / "a.xmp", ns=(1, 10**9))
+        (tmp_path / "b.xmp").write_text(sidecar("+3.00"), encoding="utf-8")
+        (tmp_path / "day1" / "c.xmp").unlink()
+        stats = catalog.refresh(tmp_path)
+        assert (stats.added, stats.updated, stats.touched, stats.unchanged, stats.removed) == (0, 1, 1, 1, 1)
+        assert [os.path.basename(r["path"]) for r in catalog.find([("exposure", ">=", 1.5), ("contrast", "=", 12)])] \
+            == ["a.xmp", "b.xmp"]
+
+        with FileIndex(tmp_path / "index.sqlite") as index:
+            image = next(f for f in scan_images(tmp_path) if f.path.name == "a.jpg")
+            index.record(image, "done")
+        assert [os.path.basename(r["path"]) for r in catalog.unprocessed()] == ["b.xmp", "broken.xmp"]
+
+def test_catalog_command_filters(tmp_path):
+    (tmp_path / "a.xmp").write_text(sidecar("+1.50"), encoding="utf-8")
+    (tmp_path / "b.xmp").write_text(sidecar("-1.00"), encoding="utf-8")
+
+    result = runner.invoke(cli.app, ["catalog", str(tmp_path), "--where", "exposure > 1"])
+    assert result.exit_code == 0, result.output
+    entries = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [e["settings"]["exposure"] for e in entries] == [1.5]
+
+    assert runner.invoke(cli.app, ["catalog", str(tmp_path), "--where", "exposure ~ 1"]).exit_code != 0
+    assert runner.invoke(cli.app, ["catalog", str(tmp_path), "--where", "warmth>1"]).exit_code != 0
+    malformed = runner.invoke(cli.app, ["catalog", str(tmp_path), "--where", "exposure>1.2.3"])
+    assert malformed.exit_code == 2 and not isinstance(malformed.exception, ValueError)
+    assert runner.invoke(cli.app, ["catalog", str(tmp_path), "--where", "exposure<-.5"]).exit_code == 0
@@ -0,0 +1,197 @@
+import asyncio
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.core.inputs import InputFile
+from src.core.ratelimit import AdaptiveLimiter
+from src.core.singleflight import SingleFlight
+from src.models import LightroomSettings
+from src.providers.base import ProviderBase
+from src.providers.coalescing_provider import CoalescingProvider, with_coalescing
+from src.providers.gemini_api_provider import GeminiAPIProvider
+
+class GatedProvider(ProviderBase):
+    image_spec = None
+
+    def __init__(self, error=None):
+        self.calls = 0
+        self.cancelled = 0
+        self.error = error
+
+    async def process(self, image_path, xmp_path=None):
+        self.calls += 1
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return LightroomSettings(exposure=0.4)
+
+def image(data=b"same bytes"):
+    return InputFile(data=data, name="upload.jpg")
+
+def test_identical_concurrent_requests_share_one_call():
+    inner = GatedProvider()
+    provider = CoalescingProvider(inner)
+
+    async def run():
+        return await asyncio.gather(
+            provider.process(image()), provider.process(image()), provider.process(image(b"other")),
+        )
+
+    first, second, other = asyncio.run(run())
+    assert inner.calls == 2
+    assert first == second and first is not second
+    assert provider.flights.stats() == {"in_flight": 0, "started": 2, "coalesced": 1}
+
+    # Nothing is cached once the call is over
+    asyncio.run(provider.process(image()))
+    assert inner.calls == 3
+
+def test_errors_reach_every_waiter():
+    provider = CoalescingProvider(GatedProvider(error=RuntimeError("quota")))
+
+    async def run():
+        return await asyncio.gather(provider.process(image()), provider.process(image()), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert [str(r) for r in results] == ["quota", "quota"]
+    assert provider.provider.calls == 1
+
+def test_call_is_cancelled_only_when_the_last_waiter_leaves():
+    inner = GatedProvider()
+    provider = CoalescingProvider(inner)
+
+    async def run():
+        first = asyncio.create_task(provider.process(image()))
+        second = asyncio.create_task(provider.process(image()))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        settings = await second
+        assert inner.cancelled == 0 and settings.exposure == 0.4
+
+        third = asyncio.create_task(provider.process(image()))
+        await asyncio.sleep(0.01)
+        third.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await third
+        await asyncio.sleep(0)
+        return len(provider.flights)
+
+    assert asyncio.run(run()) == 0
+    assert inner.calls == 2 and inner.cancelled == 1
+
+def test_upload_outlives_a_cancelled_leader_while_a_follower_waits():
+    class ReadingProvider(GatedProvider):
+        async def process(self, image_path, xmp_path=None):
+            await super().process(image_path, xmp_path)
+            return LightroomSettings(exposure=len(image_path.read_bytes()))
+
+    provider = CoalescingProvider(ReadingProvider())
+    uploads = []
+
+    async def analyze(max_size):
+        # Like POST /analyze: a view onto the spooled upload, which is closed when the request ends
+        spooled = tempfile.SpooledTemporaryFile(max_size=max_size)
+        spooled.write(b"same bytes")
+        upload = InputFile.from_upload(spooled, "upload.jpg")
+        uploads.append(upload)
+        try:
+            return await provider.process(upload)
+        finally:
+            upload.release()
+            spooled.close()
+
+    async def run(max_size):
+        leader = asyncio.create_task(analyze(max_size))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(analyze(max_size))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    # In memory, then rolled over to disk and memory-mapped
+    for max_size in (1024, 4):
+        uploads.clear()
+        assert asyncio.run(run(max_size)).exposure == len(b"same bytes")
+        # Nothing is left holding the uploads once the shared call is over
+        assert [upload._refs for upload in uploads] == [0, 0]
+    assert provider.provider.calls == 2
+
+def test_singleflight_runs_again_after_failure():
+    flights = SingleFlight()
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ValueError("first try")
+        return "ok"
+
+    with pytest.raises(ValueError):
+        asyncio.run(flights.do("k", flaky))
+    assert asyncio.run(flights.do("k", flaky)) == "ok"
+
+def test_identical_streams_share_one_upstream_stream():
+    # The MCP server's stack: analyze_image consumes provider.stream() of a
+    # coalesced GeminiAPIProvider and reports each partial as progress
+    class Throttled(Exception):
+        code = 429
+        response = SimpleNamespace(headers={"retry-after": "0"})
+
+    inner = GeminiAPIProvider(api_key="test-key", image_spec=None)
+    inner.limiter = AdaptiveLimiter("test")
+    opened = []
+
+    async def generate_content_stream(**_):
+        opened.append(1)
+        if len(opened) == 1:
+            raise Throttled("429 RESOURCE_EXHAUSTED")
+
+        async def chunks():
+            for text in ['{"exposure": 0.5,', ' "tint": 3}']:
+                await asyncio.sleep(0.02)
+                yield SimpleNamespace(text=text)
+        return chunks()
+
+    inner.client = MagicMock()
+    inner.client.aio.models.generate_content_stream = generate_content_stream
+    provider = with_coalescing(inner)
+
+    async def analyze(path):
+        return [settings.model_dump(exclude_none=True) async for settings in provider.stream(path)]
+
+    async def run(path):
+        first = asyncio.create_task(analyze(path))
+        await asyncio.sleep(0.03)
+        # Arrives after the first field: replays it, then follows along
+        return await asyncio.gather(first, analyze(path), provider.process(path))
+
+    path = InputFile(data=b"same bytes", name="upload.jpg")
+    first, second, final = asyncio.run(run(path))
+    # One throttled attempt, retried once, shared by all three callers
+    assert len(opened) == 2
+    assert first == second == [{"exposure": 0.5}, {"exposure": 0.5, "tint": 3}]
+    assert final.tint == 3
+    assert provider.flights.stats()["coalesced"] == 2 and not provider._streams
+
+def test_stream_joins_a_process_call_in_flight():
+    inner = GatedProvider()
+    provider = CoalescingProvider(inner)
+
+    async def run():
+        call = asyncio.create_task(provider.process(image()))
+        await asyncio.sleep(0.01)
+        partials = [settings async for settings in provider.stream(image())]
+        return await call, partials
+
+    settings, partials = asyncio.run(run())
+    assert inner.calls == 1
+    assert partials == [settings] and not provider._streams
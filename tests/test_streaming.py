@@ -0,0 +1,95 @@
+import asyncio
+import json
+import stat
+import sys
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.core.parser import ClarificationNeeded, IncrementalJSONParser, clarification, stream_settings
+from src.main import app
+from src.models import LightroomSettings
+from src.providers.gemini_cli import GeminiCLIProvider
+
+CHATTY = 'Sure thing! Here you go:\n```json\n{"exposure": 0.5, "color_temp": 5600,\n "tint": 4, "contrast": -10}\n```\nLet me know {if} you need more.'
+
+def test_incremental_parser_emits_fields_as_they_complete():
+    parser = IncrementalJSONParser()
+    emitted = []
+    for i in range(0, len(CHATTY), 3):
+        emitted.append(parser.feed(CHATTY[i:i + 3]))
+
+    fields = [field for chunk in emitted for field in chunk]
+    assert fields == [("exposure", 0.5), ("color_temp", 5600), ("tint", 4), ("contrast", -10)]
+    # exposure is reported while the object is still open
+    first = next(i for i, chunk in enumerate(emitted) if chunk)
+    assert first * 3 < CHATTY.index("color_temp")
+    assert parser.done
+
+    nested = IncrementalJSONParser()
+    assert nested.feed(r'{"a": "x\"}{", "b": {"c": [1, "}"]}}') == [("a", 'x"}{'), ("b", {"c": [1, "}"]})]
+
+def test_stream_settings_yields_partials_and_rejects_bad_values():
+    async def chunks(text):
+        for char in text:
+            yield char
+
+    async def collect(text):
+        return [s async for s in stream_settings(chunks(text))]
+
+    partials = asyncio.run(collect(CHATTY))
+    assert [s.model_dump(exclude_none=True) for s in partials[:2]] == [
+        {"exposure": 0.5}, {"exposure": 0.5, "color_temp": 5600},
+    ]
+    assert partials[-1].contrast == -10
+
+    with pytest.raises(ValueError):
+        asyncio.run(collect('{"exposure": "bright"}'))
+    with pytest.raises(ValueError):
+        asyncio.run(collect("no settings here"))
+
+    # A question is kept on the settings, or raised when there are none
+    asked = asyncio.run(collect('{"exposure": 0.5, "clarification_needed": "Warm or cool?"}'))
+    assert clarification(asked[-1]) == "Warm or cool?" and asked[-1].exposure == 0.5
+    with pytest.raises(ClarificationNeeded):
+        asyncio.run(collect('{"clarification_needed": "Warm or cool?"}'))
+
+# Prints the answer over several flushed lines, then hangs: the stream must not wait for exit
+FAKE_CLI = f'''#!{sys.executable}
+import sys, time
+for line in ['Thinking...', '{{"exposure": 0.75,', '"tint": 3}}', 'trailing chatter']:
+    print(line, flush=True)
+time.sleep(30)
+'''
+
+def test_cli_streams_stdout_lines(tmp_path):
+    script = tmp_path / "fake_gemini"
+    script.write_text(FAKE_CLI)
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    image = tmp_path / "image.jpg"
+    image.write_bytes(b"jpeg")
+    provider = GeminiCLIProvider(cli_path=str(script))
+    provider.image_spec = None
+
+    async def run():
+        return [s async for s in provider.stream(image)]
+
+    partials = asyncio.run(asyncio.wait_for(run(), timeout=10))
+    assert [s.model_dump(exclude_none=True) for s in partials] == [{"exposure": 0.75}, {"exposure": 0.75, "tint": 3}]
+
+@patch('src.main.provider')
+def test_partial_endpoint_streams_fields(mock_provider):
+    async def mock_stream(image_path, xmp_path=None):
+        yield LightroomSettings(exposure=0.3)
+        yield LightroomSettings(exposure=0.3, color_temp=5200)
+
+    mock_provider.stream = mock_stream
+    mock_provider.aclose = AsyncMock()
+
+    with TestClient(app) as client:
+        response = client.post("/analyze/partial", files={"image": ("a.jpg", b"jpeg", "image/jpeg")})
+
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [e.get("fields") for e in events] == [["exposure"], ["color_temp"], None]
+    assert events[-1]["done"] and events[-1]["settings"]["color_temp"] == 5200
@@ -1,6 +1,10 @@
+import json
+import os
 import xml.etree.ElementTree as ET
+from src.core.inputs import InputFile
 from src.models import LightroomSettings
-from src.xmp_utils import generate_xmp
+from src.providers.prompts import _cached_xmp_context, load_xmp_context
+from src.xmp_utils import generate_xmp, read_crs_values, read_xmp_settings, splice_xmp, xmp_context
 
 def test_generate_xmp_from_scratch():
     settings = LightroomSettings(
@@ -42,3 +46,48 @@ def test_generate_xmp_with_existing_content():
     assert 'crs:Exposure2012="-0.5"' in xmp_str
     assert 'crs:Highlights2012="-50"' in xmp_str
     assert 'crs:Contrast2012="10"' in xmp_str  # Maintained from original
+
+SIDECAR = '''<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about="" xmlns:crs="http://ns.adobe.com/camera-raw-settings/1.0/"
+   crs:Exposure2012="+1.00" crs:Contrast2012="-12" crs:Temperature="5600" crs:WhiteBalance="Custom">
+   <crs:ToneCurvePV2012><rdf:Seq>%s</rdf:Seq></crs:ToneCurvePV2012>
+  </rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>'''
+
+def test_xmp_context_keeps_only_mapped_crs_values():
+    sidecar = SIDECAR % ("<rdf:li>0, 0</rdf:li>" * 2000)
+    context = xmp_context(sidecar)
+    assert context == '{"exposure":1.0,"contrast":-12,"color_temp":5600}'
+    assert len(context) * 100 < len(sidecar)
+    assert xmp_context("<not xmp>") is None
+
+def test_readers_and_writers_agree_on_the_crs_description():
+    # Another tool's rdf:Description comes first; the develop values live in the second
+    sidecar = SIDECAR.replace(
+        '  <rdf:Description rdf:about="" xmlns:crs',
+        '  <rdf:Description rdf:about="" xmlns:tiff="http://ns.adobe.com/tiff/1.0/" tiff:Make="Nikon"/>\n'
+        '  <rdf:Description rdf:about="" xmlns:crs',
+    ) % ""
+    assert read_crs_values(sidecar)["Exposure2012"] == "+1.00"
+    assert json.loads(xmp_context(sidecar))["exposure"] == 1.0
+    assert read_xmp_settings(sidecar).exposure == 1.0
+
+    settings = LightroomSettings(exposure=-0.5)
+    for written in (splice_xmp(sidecar, settings), generate_xmp(settings, sidecar)):
+        assert read_crs_values(written)["Exposure2012"] == "-0.5"
+        assert read_xmp_settings(written).exposure == -0.5
+        assert '="Nikon"' in written
+
+def test_load_xmp_context_is_cached_per_mtime(tmp_path):
+    sidecar = tmp_path / "a.xmp"
+    sidecar.write_text(SIDECAR % "")
+    assert load_xmp_context(sidecar) == load_xmp_context(sidecar)
+    assert _cached_xmp_context.cache_info().hits >= 1
+
+    sidecar.write_text((SIDECAR % "").replace("+1.00", "-0.50"))
+    os.utime(sidecar, ns=(0, 10**9))
+    assert json.loads(load_xmp_context(sidecar))["exposure"] == -0.5
+    assert load_xmp_context(InputFile(data=(SIDECAR % "").encode(), name="upload.xmp")).startswith('{"exposure":1.0')
+    assert load_xmp_context(None) is None
@@ -0,0 +1,68 @@
+from src.core.xmp_writer import bulk_write_xmp, rewrite_sidecar
+from src.models import LightroomSettings
+from src.xmp_utils import read_crs_values, splice_xmp
+
+SIDECAR = '''<?xpacket begin="﻿" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about=""
+    xmlns:xmp="http://ns.adobe.com/xap/1.0/"
+    xmlns:crs="http://ns.adobe.com/camera-raw-settings/1.0/"
+   xmp:Rating="3"
+   crs:Exposure2012="+0.20"
+   crs:Contrast2012="+5">
+   <crs:Temperature>5200</crs:Temperature>
+  </rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>
+''' + " " * 200 + '''
+<?xpacket end="w"?>'''
+
+def test_splice_updates_values_and_keeps_the_rest():
+    settings = LightroomSettings(exposure=1.5, contrast=-20, color_temp=6500, shadows=30)
+    spliced = splice_xmp(SIDECAR, settings)
+
+    values = read_crs_values(spliced)
+    assert float(values["Exposure2012"]) == 1.5
+    assert int(values["Contrast2012"]) == -20
+    assert int(values["Temperature"]) == 6500
+    assert int(values["Shadows2012"]) == 30
+    assert values.get("Rating") is None and 'xmp:Rating="3"' in spliced
+    # The new attribute is indented like its neighbours and the packet keeps its size
+    assert '\n   crs:Shadows2012="30"' in spliced
+    assert len(spliced) == len(SIDECAR)
+    assert spliced.startswith('<?xpacket begin=') and spliced.endswith('<?xpacket end="w"?>')
+
+def test_splice_declares_missing_namespace_and_gives_up_without_description():
+    xmp = '<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">' \
+          '<rdf:Description rdf:about=""/></rdf:RDF></x:xmpmeta>'
+    spliced = splice_xmp(xmp, LightroomSettings(exposure=0.5))
+    assert float(read_crs_values(spliced)["Exposure2012"]) == 0.5
+    assert splice_xmp("<x:xmpmeta/>", LightroomSettings(exposure=0.5)) is None
+
+def test_rewrite_sidecar_reports_unchanged_and_creates_missing(tmp_path):
+    path = tmp_path / "a.xmp"
+    path.write_text(SIDECAR, encoding="utf-8")
+    settings = LightroomSettings(exposure=1.0)
+
+    assert rewrite_sidecar(path, settings)
+    assert not rewrite_sidecar(path, settings)
+
+    created = tmp_path / "out" / "b.xmp"
+    assert rewrite_sidecar(created, settings)
+    assert float(read_crs_values(created.read_text(encoding="utf-8"))["Exposure2012"]) == 1.0
+
+def test_bulk_write_in_process_pool(tmp_path):
+    jobs = []
+    for i in range(10):
+        path = tmp_path / f"{i}.xmp"
+        path.write_text(SIDECAR, encoding="utf-8")
+        jobs.append((path, LightroomSettings(exposure=i / 10), None))
+    (tmp_path / "dir.xmp").mkdir()
+    jobs.append((tmp_path / "dir.xmp", LightroomSettings(exposure=1.0), None))
+
+    result = bulk_write_xmp(jobs, workers=2, chunk_size=3)
+
+    assert result.written == 10 and result.unchanged == 0
+    assert list(result.errors) == [str(tmp_path / "dir.xmp")]
+    assert float(read_crs_values((tmp_path / "7.xmp").read_text(encoding="utf-8"))["Exposure2012"]) == 0.7